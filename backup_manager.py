@@ -1,104 +1,670 @@
 # backup_manager.py
 # Handles automatic backup and recovery of data.
 
+import datetime
+import hashlib
+import json
 import os
 import shutil
-import datetime
+import sqlite3
 import zipfile
+import zlib
+
+from replication import Replicator, replay_to
+from storage_engine import COLLECTIONS, PARTITIONED, SQLITE_DB_NAME, create_storage, recover_data_dir, swap_data_dir
+
+# Files larger than this are stored as fixed-size chunks, so appending to the
+# journal or to this year's sales only adds the chunks at the end
+CHUNK_SIZE = 1024 * 1024
+
+# Never backed up: write-in-progress and lock files
+SKIP_SUFFIXES = (".tmp", ".lock")
+
+# Seconds the app waits for a running backup when it is closed
+SHUTDOWN_WAIT = 15.0
+
+# Grandfather-father-son retention: the newest `keep_last` backups, plus the
+# newest backup of each of the last `daily` days, `weekly` weeks and `monthly`
+# months that have one. Anything else is pruned after each backup.
+DEFAULT_RETENTION = {"keep_last": 10, "daily": 7, "weekly": 4, "monthly": 12}
+
+# Field giving the date of a record, for the date ranges a restore reports
+RECORD_DATES = {"sales": "timestamp", "shifts": "start_time"}
+
+
+class BackupCancelled(Exception):
+    """Raised inside backup() when its `cancelled` callback returns True."""
+
+
+def select_retained(entries, retention):
+    """
+    Ids of the backups a GFS retention policy keeps.
+
+    Args:
+        entries (list): Index entries ({"id", "created", ...}), newest first.
+        retention (dict): keep_last / daily / weekly / monthly counts.
+
+    Returns:
+        set: Ids to keep.
+    """
+    keep = {e["id"] for e in entries[:retention.get("keep_last", 0)]}
+    tiers = (
+        ("daily", lambda d: d.date()),
+        ("weekly", lambda d: d.isocalendar()[:2]),
+        ("monthly", lambda d: (d.year, d.month)),
+    )
+    for tier, period_of in tiers:
+        limit = retention.get(tier, 0)
+        seen = set()
+        for e in entries:
+            if len(seen) >= limit:
+                break
+            period = period_of(datetime.datetime.fromisoformat(e["created"]))
+            if period not in seen:
+                # Newest first, so the first backup met in a period is its latest
+                seen.add(period)
+                keep.add(e["id"])
+    return keep
+
 
 class BackupManager:
-    """Manages data backup and recovery."""
+    """
+    Manages data backup and recovery.
+
+    Backups are incremental and content-addressed. Every data file is split
+    into chunks and each chunk is stored once under its SHA-256 in
+    `objects/` (zlib-compressed). A backup is a small JSON manifest in
+    `manifests/` listing the chunks of each file, so a backup only writes
+    the chunks that changed since any earlier one. Files whose size and
+    mtime match the previous manifest are not even read again.
+
+    Zip backups made by older versions are still listed and restorable.
+
+    With a `snapshot` callable (DataManager.snapshot), a backup reads a
+    point-in-time copy of the data taken while writes are held off, so it
+    can run on a background thread while the shop keeps selling.
 
-    def __init__(self, data_dir='data', backup_dir='backups'):
+    `index.json` lists every backup (newest first) with its creation time
+    and size, so listing backups is one small read. After each backup the
+    retention policy prunes old backups and the objects only they used.
+
+    A restore never touches the live data until the backup has been fully
+    extracted next to it and checked; the two directories are then swapped.
+    With a `replace` callable (DataManager.replace_data) the swap happens
+    inside the running app, which reloads without a restart.
+
+    Between backups, start_replication() ships every commit to a second
+    directory as it happens (see replication.Replicator), and
+    restore_to_time() rebuilds the data at any moment the replica covers.
+    """
+
+    def __init__(self, data_dir='data', backup_dir='backups', snapshot=None, retention=None, replace=None):
         """
         Initializes the BackupManager.
 
         Args:
             data_dir (str): The directory containing the data to be backed up.
             backup_dir (str): The directory where backups will be stored.
+            snapshot (callable, optional): snapshot(target_dir) writes a
+                consistent copy of the data files; without it the live files
+                are read directly.
+            retention (dict, optional): Overrides for DEFAULT_RETENTION.
+            replace (callable, optional): replace(swap) runs swap() while the
+                data is closed and reloads it afterwards; without it restore
+                swaps the directories directly.
         """
         self.data_dir = data_dir
         self.backup_dir = backup_dir
-        os.makedirs(self.backup_dir, exist_ok=True)
+        self.snapshot = snapshot
+        self.replace = replace
+        self.replicator = None
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.index_path = os.path.join(backup_dir, "index.json")
+        self._index = None   # index entries, newest first; loaded on first use
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.manifests_dir = os.path.join(backup_dir, "manifests")
+        self.snapshots_dir = os.path.join(backup_dir, "snapshots")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        # Snapshots left by a backup that was cut off (app killed mid-backup)
+        shutil.rmtree(self.snapshots_dir, ignore_errors=True)
 
-    def backup(self):
+    def backup(self, progress=None, cancelled=None):
         """
-        Creates a compressed backup of the data directory.
+        Records the current data as a new backup.
 
-        The backup is a zip file named with the current timestamp.
+        Only chunks not already in the object store are written; the manifest
+        is written last, so a backup interrupted half-way simply does not exist.
+        Safe to call from a worker thread (see `JobQueue`): progress(percent)
+        is called as files are stored, and a `cancelled()` that returns True
+        stops the backup before the next chunk.
+
+        Returns:
+            str: Path of the backup's manifest, or None on failure or cancel.
         """
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-        backup_filename = f'backup-{timestamp}.zip'
-        backup_path = os.path.join(self.backup_dir, backup_filename)
+        progress = progress or (lambda percent: None)
+        cancelled = cancelled or (lambda: False)
+        now = datetime.datetime.now()
+        backup_id = f"backup-{now.strftime('%Y-%m-%d-%H-%M-%S')}"
+        manifest_path = os.path.join(self.manifests_dir, f"{backup_id}.json")
+        if os.path.exists(manifest_path):
+            # Two backups in the same second (e.g. manual right before closing)
+            backup_id += now.strftime('-%f')
+            manifest_path = os.path.join(self.manifests_dir, f"{backup_id}.json")
 
+        source = self.data_dir
+        snapshot_dir = None
         try:
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(self.data_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        # Arcname is the name of the file in the archive.
-                        # This avoids storing the full 'data/' path in the zip.
-                        arcname = os.path.relpath(file_path, self.data_dir)
-                        zipf.write(file_path, arcname)
-            print(f"Successfully created backup: {backup_path}")
-            return backup_path
+            if cancelled():
+                raise BackupCancelled()
+            if self.snapshot:
+                snapshot_dir = source = os.path.join(self.snapshots_dir, backup_id)
+                self.snapshot(snapshot_dir)
+            data_files = self._data_files(source)
+            sizes = {rel_path: os.stat(full_path) for rel_path, full_path in data_files}
+            total = sum(st.st_size for st in sizes.values()) or 1
+
+            previous = self._latest_manifest()
+            known = previous.get("files", {}) if previous else {}
+            files = {}
+            stats = {"bytes": 0, "new_bytes": 0, "new_chunks": 0, "reused_files": 0}
+            for rel_path, full_path in data_files:
+                st = sizes[rel_path]
+                entry = known.get(rel_path)
+                if (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+                        and all(self._has_object(h) for h in entry["chunks"])):
+                    files[rel_path] = entry
+                    stats["reused_files"] += 1
+                else:
+                    files[rel_path] = self._store_file(full_path, st, stats, cancelled)
+                stats["bytes"] += st.st_size
+                progress(int(stats["bytes"] * 99 / total))
+
+            manifest = {
+                "id": backup_id,
+                "created": now.isoformat(),
+                "files": files,
+                "bytes": stats["bytes"],
+                "new_bytes": stats["new_bytes"],
+                "new_chunks": stats["new_chunks"],
+            }
+            self._write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+            self._save_index([self._index_entry(manifest, manifest_path)] + self._load_index())
+            print(f"Successfully created backup: {manifest_path} "
+                  f"({len(files)} files, {stats['reused_files']} unchanged, "
+                  f"{stats['new_chunks']} new chunks / {stats['new_bytes']} bytes written)")
+            self.prune()
+            progress(100)
+            return manifest_path
+        except BackupCancelled:
+            print("Backup cancelled")
+            return None
         except Exception as e:
             print(f"Error creating backup: {e}")
             return None
+        finally:
+            if snapshot_dir:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
 
-    def restore(self, backup_path):
+    def restore(self, backup_path, dry_run=False):
         """
-        Restores data from a specified backup file.
+        Restores data from a specified backup (a manifest, or a legacy zip).
 
-        This will overwrite the current data in the data directory.
+        The backup is extracted into a staging directory next to data_dir and
+        checked there: chunk hashes (manifests) or CRCs (zips), every JSON
+        file and journal line, the SQLite database, and the key of every
+        record. Only a backup that passes replaces the data, by swapping the
+        two directories, and only after the current data has itself been
+        backed up, so a restore can be undone with another restore.
 
         Args:
-            backup_path (str): The full path to the backup zip file.
+            backup_path (str): The full path to the backup manifest or zip file.
+            dry_run (bool): Extract and check only; the data is left as it is.
 
         Returns:
-            bool: True if restore was successful, False otherwise.
+            tuple: (success, report). The report holds "counts" (records per
+                collection), "ranges" ({collection: [first, last]} dates of
+                sales and shifts), "files", "bytes", "errors" and, after a
+                real restore, "safety_backup".
         """
         if not os.path.exists(backup_path):
             print(f"Backup file not found: {backup_path}")
-            return False
+            return False, self._restore_report(backup_path, dry_run, f"Backup file not found: {backup_path}")
+        extract = lambda staging_dir, report: self._extract(backup_path, staging_dir, report)
+        return self._restore_staged(backup_path, extract, dry_run)
+
+    def restore_to_time(self, when, replica_dir=None, dry_run=False):
+        """
+        Point-in-time restore from a replica: the newest base snapshot before
+        `when` rolled forward with the change log up to `when`. The result
+        is checked and swapped in exactly like a backup restore.
+
+        Args:
+            when (datetime|str): Time to restore to.
+            replica_dir (str, optional): Replica to read (default: the one
+                being replicated to).
+            dry_run (bool): Rebuild and check only; the data is left as it is.
 
+        Returns:
+            tuple: (success, report) as restore(), plus "base", "replayed"
+                (log entries applied) and "until" (time of the last one).
+        """
+        replica_dir = replica_dir or (self.replicator.replica_dir if self.replicator else None)
+        if not replica_dir or not os.path.isdir(replica_dir):
+            print(f"Replica not found: {replica_dir}")
+            return False, self._restore_report(replica_dir, dry_run, f"Replica not found: {replica_dir}")
+        replay = lambda staging_dir, report: replay_to(replica_dir, when, staging_dir, report)
+        return self._restore_staged(f"{replica_dir} @ {when}", replay, dry_run)
+
+    def _restore_report(self, source, dry_run, error=None):
+        return {"backup": source, "dry_run": dry_run, "files": 0, "bytes": 0,
+                "counts": {}, "ranges": {}, "errors": [error] if error else []}
+
+    def _restore_staged(self, source, build, dry_run):
+        """Builds the data in a staging directory with build(staging_dir, report), checks it, swaps it in."""
+        report = self._restore_report(source, dry_run)
+        data_dir = os.path.normpath(self.data_dir)
+        staging_dir = f"{data_dir}.restore-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
         try:
-            # Clear the current data directory
-            if os.path.exists(self.data_dir):
-                shutil.rmtree(self.data_dir)
-            os.makedirs(self.data_dir)
+            os.makedirs(staging_dir)
+            build(staging_dir, report)
+            if not report["errors"]:
+                self._verify(staging_dir, report)
+            if report["errors"]:
+                print(f"Backup {source} failed verification: {'; '.join(report['errors'])}")
+                return False, report
+            if dry_run:
+                print(f"Backup {source} verified: {report['counts']}")
+                return True, report
 
-            # Extract the backup
-            with zipfile.ZipFile(backup_path, 'r') as zipf:
-                zipf.extractall(self.data_dir)
-            
-            print(f"Successfully restored data from: {backup_path}")
-            return True
+            if os.path.exists(data_dir):
+                report["safety_backup"] = self.backup()
+                if not report["safety_backup"]:
+                    report["errors"].append("Could not back up the current data before restoring")
+                    return False, report
+            swap = lambda: swap_data_dir(data_dir, staging_dir)
+            if self.replace:
+                self.replace(swap)
+            else:
+                swap()
+            # The new data is open; the previous copy is no longer needed
+            recover_data_dir(data_dir)
+            print(f"Successfully restored data from: {source}")
+            return True, report
         except Exception as e:
+            report["errors"].append(str(e))
             print(f"Error restoring backup: {e}")
-            return False
+            return False, report
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
 
-    def get_backups(self):
+    def start_replication(self, replica_dir, base_snapshot, attach):
         """
+        Starts shipping committed changes to replica_dir (stopping any
+        earlier replication first).
 
-        Gets a list of available backup files, sorted by most recent first.
+        Args:
+            replica_dir (str): Second directory (USB stick, other disk, share).
+            base_snapshot (callable): DataManager.base_snapshot.
+            attach (callable): DataManager.set_change_log; the replicator is
+                attached before it takes its first base, so no commit is missed.
 
         Returns:
-            list: A list of backup file paths.
+            Replicator: The running replicator (see its get_stats()).
+        """
+        self.stop_replication(attach)
+        self.replicator = Replicator(os.path.join(self.backup_dir, "changes"), replica_dir, base_snapshot)
+        attach(self.replicator)
+        self.replicator.start()
+        return self.replicator
+
+    def stop_replication(self, attach=None, timeout=None):
+        """
+        Detaches and stops the replicator. Changes not shipped within
+        `timeout` seconds stay in the local log and go out next time.
+        """
+        if not self.replicator:
+            return
+        if attach:
+            attach(None)
+        self.replicator.shutdown(wait=True, timeout=timeout)
+        self.replicator = None
+
+    def get_replication_stats(self):
+        """Lag and throughput of the running replication (None when it is off)."""
+        return self.replicator.get_stats() if self.replicator else None
+
+    def get_backups(self):
+        """
+        Gets a list of available backups, sorted by most recent first.
+
+        Returns:
+            list: Paths of backup manifests (and of legacy zip backups).
         """
         try:
-            backups = [os.path.join(self.backup_dir, f) for f in os.listdir(self.backup_dir) if f.endswith('.zip')]
-            # Sort by modification time, newest first
-            backups.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            return backups
+            return [os.path.join(self.backup_dir, e["path"]) for e in self._load_index()]
         except Exception as e:
             print(f"Error getting backups: {e}")
             return []
 
+    def get_backup_index(self):
+        """
+        Index entries of all backups, newest first, without opening them.
+
+        Returns:
+            list: dicts with "id", "path" (relative to backup_dir), "created"
+                  (ISO time), "kind" ("manifest" or "zip"), "bytes" and "new_bytes".
+        """
+        return [dict(e) for e in self._load_index()]
+
+    def prune(self, retention=None):
+        """
+        Applies the retention policy: drops backups it does not keep, then
+        deletes the objects no remaining manifest refers to.
+
+        Args:
+            retention (dict, optional): Policy for this run (default: self.retention).
+
+        Returns:
+            dict: {"removed": backups removed, "objects_removed": n, "bytes_freed": n}.
+        """
+        result = {"removed": 0, "objects_removed": 0, "bytes_freed": 0}
+        try:
+            entries = self._load_index()
+            keep = select_retained(entries, dict(self.retention, **(retention or {})))
+            doomed = [e for e in entries if e["id"] not in keep]
+            if not doomed:
+                return result
+            # The index is updated first: a crash then leaves at worst an
+            # unlisted file, never a listed backup whose data is gone
+            self._save_index([e for e in entries if e["id"] in keep])
+            for e in doomed:
+                path = os.path.join(self.backup_dir, e["path"])
+                try:
+                    result["bytes_freed"] += os.path.getsize(path)
+                    os.remove(path)
+                    result["removed"] += 1
+                except OSError:
+                    pass
+            removed, freed = self._collect_garbage()
+            result["objects_removed"] = removed
+            result["bytes_freed"] += freed
+            print(f"Pruned {result['removed']} backup(s), {removed} unused object(s), "
+                  f"{result['bytes_freed']} bytes freed")
+        except Exception as e:
+            print(f"Error pruning backups: {e}")
+        return result
+
+    def load_manifest(self, manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_store_stats(self):
+        """Size of the object store against the data it holds across all manifests."""
+        stored = 0
+        count = 0
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                stored += os.path.getsize(os.path.join(root, name))
+                count += 1
+        manifests = [p for p in self.get_backups() if p.endswith('.json')]
+        logical = sum(self.load_manifest(p).get("bytes", 0) for p in manifests)
+        return {"objects": count, "stored_bytes": stored, "backups": len(manifests), "logical_bytes": logical}
+
+    # --- Index ---
+    def _index_entry(self, manifest, manifest_path):
+        return {"id": manifest["id"],
+                "path": os.path.relpath(manifest_path, self.backup_dir).replace(os.sep, "/"),
+                "created": manifest["created"], "kind": "manifest",
+                "bytes": manifest.get("bytes", 0), "new_bytes": manifest.get("new_bytes", 0)}
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)["backups"]
+            except (OSError, ValueError, KeyError, TypeError):
+                self._index = self._rebuild_index()
+        return self._index
+
+    def _save_index(self, entries):
+        entries.sort(key=lambda e: e["created"], reverse=True)
+        self._write_atomic(self.index_path, json.dumps({"backups": entries}, ensure_ascii=False, indent=1).encode("utf-8"))
+        self._index = entries
+
+    def _rebuild_index(self):
+        """Index from the backups on disk (first run, or a lost index.json)."""
+        entries = []
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.manifests_dir, name)
+                try:
+                    entries.append(self._index_entry(self.load_manifest(path), path))
+                except (OSError, ValueError, KeyError):
+                    print(f"Skipping unreadable backup manifest {path}")
+        for name in os.listdir(self.backup_dir):
+            if name.endswith('.zip'):
+                path = os.path.join(self.backup_dir, name)
+                try:
+                    # Legacy names carry the time: backup-YYYY-mm-dd-HH-MM-SS.zip
+                    created = datetime.datetime.strptime(name[7:26], '%Y-%m-%d-%H-%M-%S')
+                except ValueError:
+                    created = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+                size = os.path.getsize(path)
+                entries.append({"id": name[:-4], "path": name, "created": created.isoformat(),
+                                "kind": "zip", "bytes": size, "new_bytes": size})
+        self._save_index(entries)
+        print(f"Rebuilt backup index ({len(entries)} backups)")
+        return entries
+
+    def _collect_garbage(self):
+        """Deletes objects no manifest on disk refers to. Returns (count, bytes)."""
+        referenced = set()
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                manifest = self.load_manifest(os.path.join(self.manifests_dir, name))
+                for entry in manifest["files"].values():
+                    referenced.update(entry["chunks"])
+        removed = freed = 0
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if name not in referenced:
+                    path = os.path.join(root, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+        return removed, freed
+
+    # --- Object store ---
+    def _data_files(self, source):
+        """(path relative to source, full path) of every file to back up, sorted."""
+        found = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.endswith(SKIP_SUFFIXES):
+                    continue
+                full_path = os.path.join(root, name)
+                # Manifests use '/' whatever the OS, so backups move between machines
+                found.append((os.path.relpath(full_path, source).replace(os.sep, "/"), full_path))
+        found.sort()
+        return found
+
+    def _store_file(self, path, st, stats, cancelled):
+        chunks = []
+        with open(path, 'rb') as f:
+            while True:
+                if cancelled():
+                    raise BackupCancelled()
+                data = f.read(CHUNK_SIZE)
+                if not data and chunks:
+                    break
+                digest = hashlib.sha256(data).hexdigest()
+                if not self._has_object(digest):
+                    self._write_atomic(self._object_path(digest), zlib.compress(data, 6))
+                    stats["new_chunks"] += 1
+                    stats["new_bytes"] += len(data)
+                chunks.append(digest)
+                if len(data) < CHUNK_SIZE:
+                    break
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunks": chunks}
+
+    def _read_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup object {digest} is damaged")
+        return data
+
+    # --- Restore ---
+    def _extract(self, backup_path, staging_dir, report):
+        """Writes the backup's files under staging_dir, checking every chunk or CRC on the way."""
+        if backup_path.endswith('.zip'):
+            with zipfile.ZipFile(backup_path, 'r') as zipf:
+                for name in zipf.namelist():
+                    if name.startswith(("/", "\\")) or ".." in name.replace("\\", "/").split("/"):
+                        report["errors"].append(f"Unsafe path in backup: {name}")
+                        return
+                damaged = zipf.testzip()
+                if damaged:
+                    report["errors"].append(f"CRC check failed for {damaged}")
+                    return
+                zipf.extractall(staging_dir)
+            return
+        manifest = self.load_manifest(backup_path)
+        missing = {d for entry in manifest["files"].values() for d in entry["chunks"] if not self._has_object(d)}
+        if missing:
+            report["errors"].append(f"{len(missing)} backup object(s) are missing")
+            return
+        try:
+            self._materialize(manifest, staging_dir)
+        except (ValueError, zlib.error) as e:
+            report["errors"].append(str(e))
+
+    def _verify(self, staging_dir, report):
+        """
+        Checks an extracted backup file by file, then opens it the way
+        DataManager would and counts its records.
+        """
+        errors = report["errors"]
+        for rel_path, full_path in self._data_files(staging_dir):
+            report["files"] += 1
+            report["bytes"] += os.path.getsize(full_path)
+            parts = rel_path.split("/")
+            name = parts[-1]
+            if name.endswith(".json"):
+                try:
+                    with open(full_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (ValueError, UnicodeDecodeError) as e:
+                    errors.append(f"{rel_path} is not valid JSON ({e})")
+                    continue
+                stem = name[:-len(".json")]
+                partition = len(parts) == 2 and parts[0] in PARTITIONED
+                if partition:
+                    expected = dict if stem == "manifest" else list
+                elif len(parts) == 1 and stem in COLLECTIONS:
+                    expected = list
+                elif len(parts) == 1 and stem in ("settings", "sequences"):
+                    expected = dict
+                else:
+                    continue
+                if not isinstance(data, expected):
+                    errors.append(f"{rel_path} should hold a {expected.__name__}")
+            elif name == "journal.log":
+                with open(full_path, 'rb') as f:
+                    lines = f.read().split(b"\n")
+                for number, line in enumerate(lines, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        json.loads(line.decode('utf-8'))["ops"]
+                    except (ValueError, KeyError, TypeError):
+                        # An unterminated last line is a torn append; recovery drops it
+                        if number < len(lines):
+                            errors.append(f"{rel_path} line {number} is damaged")
+            elif name == SQLITE_DB_NAME:
+                conn = sqlite3.connect(full_path)
+                try:
+                    result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                except sqlite3.DatabaseError as e:
+                    result = str(e)
+                finally:
+                    conn.close()
+                if result != "ok":
+                    errors.append(f"{rel_path} failed its integrity check ({result})")
+        for collection in PARTITIONED:
+            # A year file the manifest does not list would silently drop its records
+            manifest_path = os.path.join(staging_dir, collection, "manifest.json")
+            if not os.path.exists(manifest_path):
+                continue
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    listed = set(json.load(f).get("partitions", {}))
+            except (ValueError, AttributeError):
+                continue
+            stored = {name[:-len(".json")] for name in os.listdir(os.path.join(staging_dir, collection))
+                      if name.endswith(".json") and name != "manifest.json"}
+            if stored != listed:
+                errors.append(f"{collection}/manifest.json does not match the partition files")
+        if errors:
+            return
+
+        storage = create_storage(staging_dir)
+        try:
+            storage.recover()
+            for collection, pk in COLLECTIONS.items():
+                records = storage.load(collection)
+                keyless = sum(1 for r in records if not isinstance(r, dict) or r.get(pk) is None)
+                if keyless:
+                    errors.append(f"{collection}: {keyless} record(s) without a {pk}")
+                report["counts"][collection] = len(records)
+                field = RECORD_DATES.get(collection)
+                dates = [str(r[field]) for r in records if isinstance(r, dict) and r.get(field)]
+                if dates:
+                    report["ranges"][collection] = [min(dates), max(dates)]
+            if storage.quarantined:
+                errors.append(f"Unreadable files: {', '.join(storage.quarantined)}")
+        finally:
+            storage.close()
+
+    def _materialize(self, manifest, target_dir):
+        """Writes the files of a manifest under target_dir."""
+        for rel_path, entry in manifest["files"].items():
+            path = os.path.join(target_dir, *rel_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                for digest in entry["chunks"]:
+                    f.write(self._read_object(digest))
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _has_object(self, digest):
+        return os.path.exists(self._object_path(digest))
+
+    def _latest_manifest(self):
+        for path in self.get_backups():
+            if path.endswith('.json'):
+                try:
+                    return self.load_manifest(path)
+                except (OSError, ValueError):
+                    continue
+        return None
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
 if __name__ == '__main__':
     # Example Usage
     # This part is for testing and will not run when imported.
-    
+
     # Create a dummy data directory and files for testing
     if not os.path.exists('data'):
         os.makedirs('data')
@@ -106,21 +672,21 @@ if __name__ == '__main__':
         f.write('{"key": "value1"}')
     with open('data/test2.json', 'w') as f:
         f.write('{"key": "value2"}')
-    
+
     print("--- Testing BackupManager ---")
-    
+
     # Initialize the manager
     backup_manager = BackupManager(data_dir='data', backup_dir='backups')
-    
+
     # 1. Create a backup
     print("\n1. Creating a backup...")
     backup_file = backup_manager.backup()
-    
+
     # 2. List backups
     print("\n2. Listing available backups...")
     available_backups = backup_manager.get_backups()
     print(f"Found backups: {available_backups}")
-    
+
     # 3. Restore from the backup
     if backup_file:
         print("\n3. Restoring from the created backup...")
@@ -129,8 +695,9 @@ if __name__ == '__main__':
             f.write('{"key": "modified"}')
         print("Modified 'data/test1.json'.")
 
+        print("Dry run:", backup_manager.restore(backup_file, dry_run=True))
         backup_manager.restore(backup_file)
-        
+
         # Verify content of restored file
         with open('data/test1.json', 'r') as f:
             content = f.read()
@@ -144,5 +711,5 @@ if __name__ == '__main__':
     shutil.rmtree('data')
     if os.path.exists('backups'):
         shutil.rmtree('backups')
-    
+
     print("\n--- Test complete ---")
@@ -0,0 +1,60 @@
+import time
+from PySide6.QtCore import QObject, QEvent, QTimer, Signal, Qt
+
+class BarcodeScanDetector(QObject):
+    """
+    Tells a barcode scanner apart from a person typing in a QLineEdit.
+
+    Scanners "type" the whole code within a few milliseconds per key and end
+    with Enter; people are an order of magnitude slower. Keys that arrive
+    within `max_gap_ms` of each other form a burst, and Enter closing a burst
+    of at least `min_length` characters emits `scanned` and removes the code
+    from the box. Text changes are debounced into `search_requested`, so a
+    scan never triggers a search/table rebuild halfway through the code.
+    """
+    scanned = Signal(str)           # code read by the scanner
+    submitted = Signal(str)         # Enter typed by hand (whole box text)
+    search_requested = Signal(str)  # debounced text change
+
+    def __init__(self, line_edit, max_gap_ms=35, min_length=4, search_delay_ms=60):
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.max_gap = max_gap_ms / 1000.0
+        self.min_length = min_length
+        self.burst = ""
+        self.last_key = 0.0
+
+        # Longer than the gap between scanner keys, shorter than a person notices
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(search_delay_ms)
+        self.search_timer.timeout.connect(lambda: self.search_requested.emit(self.line_edit.text()))
+        line_edit.textChanged.connect(self.search_timer.start)
+        line_edit.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is not self.line_edit or event.type() != QEvent.KeyPress:
+            return False
+        now = time.perf_counter()
+        in_burst = now - self.last_key <= self.max_gap
+        self.last_key = now
+
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            code, self.burst = self.burst, ""
+            if in_burst and len(code) >= self.min_length:
+                self.search_timer.stop()
+                text = self.line_edit.text()
+                self.line_edit.blockSignals(True)
+                self.line_edit.setText(text[:-len(code)] if text.endswith(code) else text)
+                self.line_edit.blockSignals(False)
+                self.scanned.emit(code)
+            else:
+                self.submitted.emit(self.line_edit.text().strip())
+            return True
+
+        char = event.text()
+        if char and char.isprintable():
+            self.burst = self.burst + char if in_burst else char
+        else:
+            self.burst = ""
+        return False
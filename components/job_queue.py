@@ -0,0 +1,96 @@
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as _wait
+from PySide6.QtCore import QObject, Signal
+
+class JobQueue(QObject):
+    """
+    Runs slow, UI-free work (receipt rendering, printing) on background threads.
+
+    With the default single worker, jobs run one at a time in submission
+    order, so receipts print in the order the sales were made. A job is
+    `func(progress, *args)`. It calls `progress(percent)` as it goes, and its
+    return value is delivered through `finished`. Signals are emitted from the
+    worker thread; slots on QObjects living in the UI thread receive them
+    queued, so they may touch widgets.
+    """
+    started = Signal(str, str)        # job id, title
+    progress = Signal(str, int)       # job id, percent
+    finished = Signal(str, object)    # job id, result
+    failed = Signal(str, str)         # job id, error message
+
+    # Finished jobs whose status stays queryable
+    KEEP_FINISHED = 200
+
+    def __init__(self, workers=1, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        self.jobs = {}                    # job id -> status dict (see `status`)
+        self.history = deque()            # finished/failed job ids, oldest first
+        self.futures = set()              # jobs not finished yet
+        self._ids = itertools.count(1)
+
+    def submit(self, title, func, *args):
+        """Queues a job and returns its id."""
+        job_id = f"job-{next(self._ids)}"
+        self.jobs[job_id] = {"id": job_id, "title": title, "status": "queued", "progress": 0,
+                             "queued_at": time.perf_counter(), "wait_ms": None, "run_ms": None,
+                             "error": None}
+        future = self.executor.submit(self._run, job_id, func, args)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return job_id
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        return sum(1 for job in list(self.jobs.values()) if job["status"] in ("queued", "running"))
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stops taking jobs. With `wait`, blocks until queued jobs are done, or
+        at most `timeout` seconds.
+
+        Returns:
+            bool: True if no job is left running.
+        """
+        if not wait or timeout is None:
+            self.executor.shutdown(wait=wait)
+            return not self.futures
+        self.executor.shutdown(wait=False)
+        _wait(list(self.futures), timeout=timeout)
+        return not self.futures
+
+    def _run(self, job_id, func, args):
+        job = self.jobs[job_id]
+        start = time.perf_counter()
+        job["status"] = "running"
+        job["wait_ms"] = round((start - job["queued_at"]) * 1000, 3)
+        self.started.emit(job_id, job["title"])
+        try:
+            result = func(lambda percent: self._progress(job_id, percent), *args)
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e) or e.__class__.__name__
+            self._done(job_id, start)
+            print(f"Background job '{job['title']}' failed: {job['error']}")
+            self.failed.emit(job_id, job["error"])
+        else:
+            job["status"] = "done"
+            job["progress"] = 100
+            self._done(job_id, start)
+            self.finished.emit(job_id, result)
+
+    def _progress(self, job_id, percent):
+        self.jobs[job_id]["progress"] = percent
+        self.progress.emit(job_id, percent)
+
+    def _done(self, job_id, start):
+        self.jobs[job_id]["run_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self.history.append(job_id)
+        while len(self.history) > self.KEEP_FINISHED:
+            self.jobs.pop(self.history.popleft(), None)
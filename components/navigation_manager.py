@@ -34,6 +34,11 @@ class NavigationManager:
             
         self.stack.setCurrentIndex(index)
         self.current_index = index
+
+        # Pages re-render only if something they show changed while hidden
+        page = self.stack.widget(index)
+        if hasattr(page, 'refresh_if_dirty'):
+            page.refresh_if_dirty()
         
         # Update button states
         for btn in self.nav_btns.values():
@@ -0,0 +1,202 @@
+from PySide6.QtWidgets import QTableView, QHeaderView, QAbstractItemView
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PySide6.QtGui import QBrush, QColor
+from search_engine import normalize
+
+# Role returning the record dict behind a row
+RECORD_ROLE = Qt.UserRole
+# Role returning the value a column sorts by
+SORT_ROLE = Qt.UserRole + 1
+
+class Column:
+    """
+    One table column over a record dict.
+
+    Args:
+        title (str): Header text.
+        value (callable): record -> display text. Only called for cells on screen.
+        sort_key (callable, optional): record -> sort value (defaults to `value`).
+        color (callable, optional): record -> color string or None.
+        align (Qt.Alignment, optional): Text alignment.
+    """
+
+    def __init__(self, title, value, sort_key=None, color=None, align=None):
+        self.title = title
+        self.value = value
+        self.sort_key = sort_key or value
+        self.color = color
+        self.align = align
+
+class RecordTableModel(QAbstractTableModel):
+    """
+    Read-only model over a list of DataManager records.
+
+    Nothing is allocated per cell: `data()` formats the few cells the view
+    actually paints, so a 50k-row list costs one list of references. Rows are
+    found by `key_field` for the fine-grained update/insert/remove signals.
+    """
+
+    def __init__(self, columns, key_field='id', parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.key_field = key_field
+        self.records = []
+        self._rows = None     # key -> row, built on demand
+        self._sorted = None   # (column, order) the list is currently in
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section].title
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        column = self.columns[index.column()]
+        if role == Qt.DisplayRole:
+            return column.value(record)
+        if role == RECORD_ROLE:
+            return record
+        if role == SORT_ROLE:
+            return column.sort_key(record)
+        if role == Qt.ForegroundRole and column.color:
+            color = column.color(record)
+            return QBrush(QColor(color)) if color else None
+        if role == Qt.TextAlignmentRole and column.align is not None:
+            return int(column.align)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sorts the list in Python (one key call per row, not one per comparison)."""
+        # QTableView.sortByColumn sorts once itself and once more through the
+        # header's sortIndicatorChanged; the second call is a no-op here
+        if column < 0 or self._sorted == (column, order):
+            return
+        key = self.columns[column].sort_key
+        self.layoutAboutToBeChanged.emit()
+        self.records.sort(key=lambda r: _sortable(key(r)), reverse=(order == Qt.DescendingOrder))
+        self._rows = None
+        self._sorted = (column, order)
+        self.layoutChanged.emit()
+
+    # --- Record API ---
+    def set_records(self, records):
+        """Replaces the rows (the list is copied, so later changes to it need the calls below)."""
+        self.beginResetModel()
+        self.records = list(records)
+        self._rows = None
+        self._sorted = None
+        self.endResetModel()
+
+    def record(self, row):
+        return self.records[row] if 0 <= row < len(self.records) else None
+
+    def row_of(self, key):
+        if self._rows is None:
+            self._rows = {r.get(self.key_field): i for i, r in enumerate(self.records)}
+        return self._rows.get(key, -1)
+
+    def update_record(self, record):
+        """Repaints the row of a record changed in place (or replaced by a fresh copy)."""
+        row = self.row_of(record.get(self.key_field))
+        if row < 0:
+            return False
+        self.records[row] = record
+        self._sorted = None
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+        return True
+
+    def insert_record(self, record, row=None):
+        row = len(self.records) if row is None else row
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.records.insert(row, record)
+        self._rows = None
+        self._sorted = None
+        self.endInsertRows()
+
+    def remove_record(self, key):
+        row = self.row_of(key)
+        if row < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.records[row]
+        self._rows = None
+        self.endRemoveRows()
+        return True
+
+class RecordFilterProxy(QSortFilterProxyModel):
+    """
+    Filters rows whose visible text contains every word of the filter
+    (Arabic-normalized). Sorting is forwarded to the source model, which sorts
+    its list in one pass instead of calling back into Python per comparison.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.words = []
+
+    def set_filter_text(self, text):
+        self.words = normalize(text).split()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.words:
+            return True
+        model = self.sourceModel()
+        record = model.records[source_row]
+        text = normalize(" ".join(str(c.value(record)) for c in model.columns))
+        return all(w in text for w in self.words)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+class RecordTableView(QTableView):
+    """QTableView wired to a RecordTableModel through a RecordFilterProxy."""
+
+    def __init__(self, columns, key_field='id', parent=None, sortable=True):
+        super().__init__(parent)
+        self.source = RecordTableModel(columns, key_field, self)
+        self.proxy = RecordFilterProxy(self)
+        self.proxy.setSourceModel(self.source)
+        self.setModel(self.proxy)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        # Keep the order records were given in until a header is clicked
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.setSortingEnabled(sortable)
+
+    def set_records(self, records):
+        self.source.set_records(records)
+        header = self.horizontalHeader()
+        if self.isSortingEnabled() and header.sortIndicatorSection() >= 0:
+            self.source.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+
+    def record_at(self, index):
+        """Record behind a view index (e.g. from doubleClicked or indexAt)."""
+        if not index.isValid():
+            return None
+        # Through the proxy to the source list: the same dict, not a QVariant copy
+        return self.source.record(self.proxy.mapToSource(index).row())
+
+    def current_record(self):
+        return self.record_at(self.currentIndex())
+
+    def row_count(self):
+        return self.proxy.rowCount()
+
+def _sortable(value):
+    # Mixed None/str/number columns must still sort without TypeError
+    if value is None:
+        return (0, "")
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
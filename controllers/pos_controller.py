@@ -1,39 +1,53 @@
+import time
+from collections import deque
 from controllers.base_controller import BaseController
 from datetime import datetime
 
+# What the cashier waits for: everything between the pay button and the next scan
+CHECKOUT_BUDGET_MS = 50
+
 class POSController(BaseController):
     def __init__(self, db, main_window=None):
         super().__init__(db, main_window)
         self.cart_items = []
+        # Per-stage timings of recent checkouts (see record_stage)
+        self.checkouts = deque(maxlen=200)
 
-    def search_products(self, query):
-        text = query.lower()
-        products = self.db.get_products()
-        return [p for p in products if text in p['name'].lower() or text in p.get('id', '').lower()]
+    def search_products(self, query, limit=50):
+        return self.db.search_products(query, limit)
 
-    def add_to_cart(self, product_id):
+    def add_to_cart(self, product_id, quantity=1):
         product = self.db.get_product_by_id(product_id)
         if not product or product['stock'] <= 0:
             return False, "الكمية غير متوفرة"
 
         existing = next((i for i in self.cart_items if i['product_id'] == product_id), None)
         if existing:
-            if existing['quantity'] < product['stock']:
-                existing['quantity'] += 1
+            if existing['quantity'] + quantity <= product['stock']:
+                existing['quantity'] += quantity
                 existing['total'] = existing['quantity'] * existing['price']
                 return True, "تم الكرار"
             else:
                 return False, "تم الوصول للحد الأقصى للمخزون"
         else:
+            if quantity > product['stock']:
+                return False, "الكمية غير متوفرة"
             self.cart_items.append({
                 "product_id": product_id,
                 "name": product['name'],
-                "quantity": 1,
+                "quantity": quantity,
                 "price": product['price'],
-                "total": product['price']
+                "total": product['price'] * quantity
             })
             return True, "تمت الإضافة"
 
+    def scan_barcode(self, code):
+        """Adds the product behind a scanned code (N units for a multi-pack code)."""
+        product, units = self.db.get_product_by_barcode(code)
+        if not product:
+            return False, f"الباركود غير معروف: {code}"
+        return self.add_to_cart(product['id'], units)
+
     def clear_cart(self):
         self.cart_items = []
 
@@ -46,8 +60,43 @@ class POSController(BaseController):
         
         total = self.get_cart_total()
         try:
+            start = time.perf_counter()
             sale = self.db.add_sale(self.cart_items, total, method, shift_id, customer_id)
+            committed = time.perf_counter()
             self.clear_cart()
+            self.checkouts.append({
+                "sale_id": sale['id'],
+                "invoice_number": sale.get('invoice_number'),
+                "timestamp": sale['timestamp'],
+                "stages": {"commit": round((committed - start) * 1000, 3),
+                           "cart_reset": round((time.perf_counter() - committed) * 1000, 3)}
+            })
             return True, "تمت العملية بنجاح", sale
         except Exception as e:
             return False, f"فشل في إتمام البيع: {str(e)}", None
+
+    def record_stage(self, sale_id, stage, ms):
+        """Adds a stage timing (ms) to a recent checkout, e.g. "ui", "receipt_render", "print"."""
+        checkout = next((c for c in reversed(self.checkouts) if c['sale_id'] == sale_id), None)
+        if checkout is None:
+            return
+        checkout['stages'][stage] = round(ms, 3)
+        if stage == "ui":
+            # commit + cart reset + UI update is what the cashier waits for
+            blocking = sum(checkout['stages'].get(s, 0) for s in ("commit", "cart_reset", "ui"))
+            if blocking > CHECKOUT_BUDGET_MS:
+                print(f"Slow checkout {checkout['invoice_number']}: {blocking:.1f} ms {checkout['stages']}")
+
+    def get_checkout_stats(self):
+        """Average and worst time per checkout stage over the recent checkouts (ms)."""
+        stages = {}
+        for checkout in self.checkouts:
+            for stage, ms in checkout['stages'].items():
+                stages.setdefault(stage, []).append(ms)
+        return {
+            "checkouts": len(self.checkouts),
+            "budget_ms": CHECKOUT_BUDGET_MS,
+            "stages": {stage: {"avg_ms": sum(v) / len(v), "max_ms": max(v), "count": len(v)}
+                       for stage, v in stages.items()},
+            "recent": list(self.checkouts)
+        }
@@ -1,259 +1,945 @@
 import json
 import os
-from datetime import datetime
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from event_bus import (
+    CUSTOMER_CHANGED, CUSTOMER_DEBT_CHANGED, PRODUCT_CHANGED, SALE_ADDED, SALE_DELETED,
+    DATA_RELOADED, SETTINGS_CHANGED, SHIFT_CLOSED, SHIFT_OPENED, STOCK_CHANGED, USER_CHANGED, ChangeEvent, EventBus
+)
+from search_engine import InvoiceSearchIndex, ProductSearchIndex, normalize
+from storage_engine import (COLLECTIONS, PARTITIONED, create_storage, partition_key, partition_stats,
+                            recover_data_dir)
+
+# Payment method label (Arabic UI or legacy English) -> shift totals bucket
+PAYMENT_KINDS = {
+    "cash": "cash", "نقدي": "cash", "نقداً": "cash",
+    "card": "card", "بطاقة": "card",
+    "debt": "debt", "دين": "debt"
+}
 
 class CacheManager:
-    def __init__(self):
-        self.cache = {}
-        self.max_cache_size = 100
+    """
+    LRU cache for loaded collections.
+
+    Entries can carry a validator callable (e.g. file mtime/size from the
+    storage backend); it is re-checked at most every `validate_interval`
+    seconds and a changed signature turns the lookup into a miss, so edits
+    made outside the app (or a backup restore) are picked up. Entries are
+    evicted least-recently-used first when either `max_entries` or the
+    `max_bytes` budget is exceeded; `ttl` (seconds) optionally expires them.
+    """
+
+    def __init__(self, max_entries=100, max_bytes=64 * 1024 * 1024, ttl=None, validate_interval=1.0):
+        self.cache = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.validate_interval = validate_interval
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expirations": 0}
     
-    def get(self, key):
-        """الحصول على بيانات من الذاكرة المؤقتة"""
-        if key in self.cache:
-            return self.cache[key]
-        return None
+    def get(self, key, validator=None):
+        """الحصول على بيانات من الذاكرة المؤقتة (None عند عدم الوجود)"""
+        entry = self.cache.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        now = time.monotonic()
+        if self.ttl is not None and now - entry["stored_at"] > self.ttl:
+            self._drop(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        validator = validator or entry["validator"]
+        if validator and now - entry["checked_at"] >= self.validate_interval:
+            entry["checked_at"] = now
+            if validator() != entry["signature"]:
+                self._drop(key)
+                self.stats["invalidations"] += 1
+                self.stats["misses"] += 1
+                return None
+
+        self.cache.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry["value"]
     
-    def set(self, key, value):
-        """تخزين بيانات في الذاكرة المؤقتة"""
-        if len(self.cache) >= self.max_cache_size:
-            # إزالة أقدم عنصر
-            oldest_key = next(iter(self.cache))
-            del self.cache[oldest_key]
-        
+    def set(self, key, value, validator=None, size=None):
+        """
+        تخزين بيانات في الذاكرة المؤقتة
+
+        Args:
+            validator (callable, optional): Returns the current signature of
+                the backing data; kept from the previous entry when omitted.
+            size (int, optional): Approximate size in bytes for the memory
+                budget; kept from the previous entry when omitted.
+        """
+        old = self.cache.get(key)
+        if old is not None:
+            validator = validator or old["validator"]
+            size = old["size"] if size is None else size
+            self._drop(key)
+        size = size or 0
+        now = time.monotonic()
         self.cache[key] = {
             "value": value,
-            "timestamp": datetime.now()
+            "validator": validator,
+            "signature": validator() if validator else None,
+            "size": size,
+            "stored_at": now,
+            "checked_at": now
         }
+        self.total_bytes += size
+        self._evict(keep=key)
+
+    def revalidate(self):
+        """Re-reads the signatures of all entries (call after the app's own writes)."""
+        now = time.monotonic()
+        for entry in self.cache.values():
+            if entry["validator"]:
+                entry["signature"] = entry["validator"]()
+                entry["checked_at"] = now
     
+    def invalidate(self, key):
+        """حذف عنصر من الذاكرة المؤقتة"""
+        if key in self.cache:
+            self._drop(key)
+            self.stats["invalidations"] += 1
+
     def clear(self):
         """مسح الذاكرة المؤقتة"""
         self.cache.clear()
+        self.total_bytes = 0
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats,
+                    entries=len(self.cache),
+                    bytes=self.total_bytes,
+                    hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+    def _drop(self, key):
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry["size"]
+
+    def _evict(self, keep):
+        while len(self.cache) > 1 and (len(self.cache) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest_key = next(iter(self.cache))
+            if oldest_key == keep:
+                self.cache.move_to_end(keep)
+                oldest_key = next(iter(self.cache))
+            self._drop(oldest_key)
+            self.stats["evictions"] += 1
+
+class Transaction:
+    """
+    Unit of work for DataManager.
+
+    Record changes made while the transaction is open are staged and handed to
+    the storage backend as one batch when the outermost `with` block exits, so
+    a checkout (sale + stock + customer debt) is a single atomic write. If the
+    block raises, nothing is written and the touched collections are dropped
+    from the cache so the next read comes from storage. Change events raised
+    inside the block are published only after the batch is committed.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.ops = {}      # (collection, key) -> op, in first-touch order
+        self.states = {}   # collection -> full record list after the change
+        self.events = {}   # (kind, key) -> ChangeEvent, in first-raise order
+        self.depth = 0
+        self.failed = False
+        self.duration = None
+
+    def __enter__(self):
+        self.depth += 1
+        self.db._tx = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if exc_type is not None:
+            self.failed = True
+        if self.depth:
+            return False
+        self.db._tx = None
+        if self.failed:
+            self.rollback()
+        else:
+            self.commit()
+        return False
+
+    def put(self, collection, record, records):
+        self._stage("put", collection, record, records)
+
+    def remove(self, collection, record, records):
+        self._stage("del", collection, record, records)
+
+    def _stage(self, kind, collection, record, records):
+        key = record.get(COLLECTIONS[collection])
+        op = {"op": kind, "collection": collection}
+        if kind == "put":
+            op["record"] = record
+        else:
+            op["key"] = key
+        if collection in PARTITIONED:
+            op["partition"] = partition_key(record)
+        self.ops[(collection, key)] = op
+        self.states[collection] = records
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            if self.ops:
+                with self.db.write_lock:
+                    ops = list(self.ops.values())
+                    self.db.storage.commit(ops, self.states)
+                    if self.db.change_log:
+                        self.db.change_log.append(ops)
+        except Exception:
+            self.rollback()
+            raise
+        self.duration = time.perf_counter() - start
+        self.db._record_commit(len(self.ops), self.duration)
+        for event in self.events.values():
+            self.db.events.publish(event)
+
+    def emit(self, event):
+        # A checkout touching the same product twice is one change to listeners
+        self.events[(event.kind, event.key)] = event
+
+    def rollback(self):
+        self.events.clear()
+        for collection in self.states:
+            self.db.cache.invalidate(collection)
+
+class RecordIndex:
+    """
+    Dict indexes over one loaded record list (field value -> record).
+
+    The index remembers which list object it was built from; if the cache
+    hands out a different list (reload, restore, rollback) it is rebuilt once,
+    otherwise it is maintained incrementally by add/remove.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.source = None
+        self.maps = {f: {} for f in fields}
+
+    def sync(self, records):
+        if self.source is not records:
+            self.rebuild(records)
+
+    def rebuild(self, records):
+        self.maps = {f: {} for f in self.fields}
+        for record in records:
+            self._add(record)
+        self.source = records
+
+    def add(self, record, records):
+        if self.source is not records:
+            self.rebuild(records)
+        else:
+            self._add(record)
+
+    def remove(self, record, records):
+        if self.source is not records:
+            self.rebuild(records)
+            return
+        for f in self.fields:
+            value = record.get(f)
+            if self.maps[f].get(value) is record:
+                del self.maps[f][value]
+
+    def get(self, field, value):
+        return self.maps[field].get(value)
+
+    def _add(self, record):
+        for f in self.fields:
+            value = record.get(f)
+            if value is not None:
+                self.maps[f][value] = record
+
+class BarcodeIndex:
+    """
+    Scanned code -> (product, units).
+
+    A product's own `barcode` adds one unit; each entry of its optional
+    `pack_barcodes` ({"code": ..., "units": N}, e.g. a carton) adds N. Codes
+    are normalized like search text, so Arabic-Indic digits match. Same
+    sync/add/remove contract as RecordIndex, plus `update` for edits.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.codes = {}      # code -> (product, units)
+        self.by_product = {} # product id -> [codes]
+
+    def sync(self, products):
+        if self.source is not products:
+            self.rebuild(products)
+
+    def rebuild(self, products):
+        self.codes, self.by_product = {}, {}
+        for product in products:
+            self._add(product)
+        self.source = products
+
+    def add(self, product, products):
+        if self.source is not products:
+            self.rebuild(products)
+        else:
+            self._add(product)
+
+    def update(self, product, products):
+        if self.source is not products:
+            self.rebuild(products)
+            return
+        self._discard(product)
+        self._add(product)
+
+    def remove(self, product, products):
+        if self.source is not products:
+            self.rebuild(products)
+        else:
+            self._discard(product)
+
+    def get(self, code):
+        return self.codes.get(normalize(code), (None, 0))
+
+    def _add(self, product):
+        entries = [(product.get('barcode'), 1)]
+        entries += [(p.get('code'), p.get('units', 1)) for p in product.get('pack_barcodes') or []]
+        codes = []
+        for code, units in entries:
+            code = normalize(code)
+            if code:
+                self.codes[code] = (product, max(int(units or 1), 1))
+                codes.append(code)
+        self.by_product[product.get('id')] = codes
+
+    def _discard(self, product):
+        for code in self.by_product.pop(product.get('id'), []):
+            if self.codes.get(code, (None,))[0] is product:
+                del self.codes[code]
+
+class TimelineIndex:
+    """
+    Sales kept in timestamp order for range queries.
+
+    ISO timestamps sort lexically, so the key is the timestamp string itself
+    (computed once when a sale is indexed) and a date range is two bisects
+    plus a slice. Sales are normally appended in time order, which keeps
+    `add` O(1); the same sync/add/remove contract as RecordIndex applies.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.keys = []
+        self.records = []
+
+    def sync(self, records):
+        if self.source is not records:
+            self.rebuild(records)
+
+    def rebuild(self, records):
+        ordered = sorted(records, key=lambda r: r.get('timestamp', ''))
+        self.keys = [r.get('timestamp', '') for r in ordered]
+        self.records = ordered
+        self.source = records
+
+    def add(self, record, records):
+        if self.source is not records:
+            self.rebuild(records)
+            return
+        key = record.get('timestamp', '')
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.records.append(record)
+        else:
+            pos = bisect_right(self.keys, key)
+            self.keys.insert(pos, key)
+            self.records.insert(pos, record)
+
+    def remove(self, record, records):
+        if self.source is not records:
+            self.rebuild(records)
+            return
+        key = record.get('timestamp', '')
+        pos = bisect_left(self.keys, key)
+        while pos < len(self.keys) and self.keys[pos] == key:
+            if self.records[pos] is record:
+                del self.keys[pos]
+                del self.records[pos]
+                return
+            pos += 1
+
+    def between(self, start_key, end_key):
+        """Records with start_key <= timestamp < end_key."""
+        lo = bisect_left(self.keys, start_key)
+        hi = bisect_left(self.keys, end_key, lo)
+        return self.records[lo:hi]
+
+class InvoiceSequence:
+    """
+    Hands out INV-YYYY-NNNN numbers from a persisted per-year counter.
+
+    Numbers are reserved from the storage backend in blocks of `block_size`:
+    the reservation is durable before any number from it is used, so a crash
+    can only leave a gap, never a duplicate. Terminals sharing one data
+    directory each take their own block; with the default block size of 1
+    numbering stays gap-free on a single terminal.
+    """
+
+    def __init__(self, storage, seed, block_size=1):
+        self.storage = storage
+        self.seed = seed            # callable(year) -> highest number already issued
+        self.block_size = block_size
+        self.blocks = {}            # year -> [next, end)
+
+    def next_number(self, year=None):
+        year = year or datetime.now().year
+        block = self.blocks.get(year)
+        if not block or block[0] >= block[1]:
+            first = self.storage.reserve_sequence(f"INV-{year}", self.block_size, lambda: self.seed(year))
+            block = self.blocks[year] = [first, first + self.block_size]
+        number = block[0]
+        block[0] += 1
+        return f"INV-{year}-{number:04d}"
 
 class DataManager:
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", engine=None, invoice_block_size=1):
         self.data_dir = data_dir
         self.cache = CacheManager()
+        # A backup restore cut off mid-swap leaves the previous data aside
+        recover_data_dir(self.data_dir)
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
-            
-        self.products_file = os.path.join(self.data_dir, "products.json")
-        self.sales_file = os.path.join(self.data_dir, "sales.json")
-        self.settings_file = os.path.join(self.data_dir, "settings.json")
-        self.users_file = os.path.join(self.data_dir, "users.json")
-        self.shifts_file = os.path.join(self.data_dir, "shifts.json")
-        self.customers_file = os.path.join(self.data_dir, "customers.json")
+
+        # "json" (flat files) or "sqlite"; auto-detected when not given
+        self.storage = create_storage(self.data_dir, engine)
+        # Finish or discard whatever an unclean shutdown left behind
+        self.recovery = self.storage.recover()
+        # Held while data files are written; snapshots for backups take it too
+        self.write_lock = threading.RLock()
+        self._tx = None
+        # Receives every committed change in order (replication.Replicator)
+        self.change_log = None
+        # Committed changes are announced here (see event_bus)
+        self.events = EventBus()
+        self.commit_stats = deque(maxlen=200)
+        self.total_commits = 0
+        self.invoice_sequence = InvoiceSequence(self.storage, self._max_invoice_number, invoice_block_size)
+        self._reset_indexes()
         
         self._initialize_files()
 
+    def _reset_indexes(self):
+        self.indexes = {
+            "products": RecordIndex(["id"]),
+            "customers": RecordIndex(["id"]),
+            "sales": RecordIndex(["id", "invoice_number"]),
+            "shifts": RecordIndex(["id"])
+        }
+        self.sales_timeline = TimelineIndex()
+        self.product_search = ProductSearchIndex()
+        self.barcodes = BarcodeIndex()
+        self.invoice_search = InvoiceSearchIndex(self.get_customer_by_id)
+        # Which year partitions the cached sales list holds
+        self._sales_loaded = {"years": set(), "complete": False}
+
     def _initialize_files(self):
-        if not os.path.exists(self.products_file):
-            self._save_json(self.products_file, [])
-        if not os.path.exists(self.sales_file):
-            self._save_json(self.sales_file, [])
-        if not os.path.exists(self.settings_file):
-            self._save_json(self.settings_file, {"theme": "dark", "currency": "LYD", "shop_name": "SmokeDash", "language": "ar"})
-        if not os.path.exists(self.users_file):
-            self._save_json(self.users_file, [
+        if not self.storage.exists("products"):
+            self.storage.replace("products", [])
+        if not self.storage.exists("sales"):
+            self.storage.replace("sales", [])
+        if not self.storage.exists("settings"):
+            self.storage.replace("settings", {"theme": "dark", "currency": "LYD", "shop_name": "SmokeDash", "language": "ar"})
+        if not self.storage.exists("users"):
+            self.storage.replace("users", [
                 {"username": "admin", "password": "123", "role": "admin", "full_name": "مدير النظام"},
                 {"username": "cashier", "password": "123", "role": "cashier", "full_name": "موظف مبيعات"}
             ])
-        if not os.path.exists(self.shifts_file):
-            self._save_json(self.shifts_file, [])
-        if not os.path.exists(self.customers_file):
-            self._save_json(self.customers_file, [])
+        if not self.storage.exists("shifts"):
+            self.storage.replace("shifts", [])
+        if not self.storage.exists("customers"):
+            self.storage.replace("customers", [])
 
-    def _load_json(self, file_path, default_type=list):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, default_type):
-                    return data
-                return default_type()
-        except (FileNotFoundError, json.JSONDecodeError):
-            return default_type()
-
-    def _save_json(self, file_path, data):
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving {file_path}: {e}")
+    def compact_storage(self):
+        """Folds the change journal into the data files (or checkpoints the SQLite WAL)."""
+        states = {}
+        for collection in COLLECTIONS:
+            records = self.cache.get(collection, self._validator(collection))
+            if records is not None:
+                states[collection] = records
+        with self.write_lock:
+            self.storage.compact(states)
+        self.cache.revalidate()
+
+    def replace_data(self, swap):
+        """
+        Swaps the data directory underneath the running app (backup restore).
+
+        `swap()` runs with writes held off and the storage closed, so no file
+        is open while directories are renamed. The storage is then reopened
+        (the restored data may use the other engine), every cache and index is
+        dropped, and DATA_RELOADED tells the pages to re-read.
+
+        Args:
+            swap (callable): Replaces the files under data_dir.
+        """
+        if self._tx:
+            raise RuntimeError("Cannot replace the data inside a transaction")
+        with self.write_lock:
+            self.storage.close()
+            try:
+                swap()
+            finally:
+                self.storage = create_storage(self.data_dir)
+                self.recovery = self.storage.recover()
+                self.invoice_sequence = InvoiceSequence(self.storage, self._max_invoice_number,
+                                                        self.invoice_sequence.block_size)
+                self.cache.clear()
+                self._reset_indexes()
+                self._initialize_files()
+                if self.change_log:
+                    self.change_log.append([{"op": "reload"}])
+        self.events.publish(ChangeEvent(DATA_RELOADED))
+
+    def set_change_log(self, change_log):
+        """Starts (or with None stops) handing committed changes to a change log."""
+        with self.write_lock:
+            self.change_log = change_log
+
+    def base_snapshot(self, target_dir):
+        """
+        Snapshot for replication, taken with writes held off throughout so
+        it matches the change log position exactly.
+
+        Returns:
+            int: Sequence number of the last change the snapshot contains.
+        """
+        with self.write_lock:
+            self.storage.snapshot(target_dir, self.write_lock)
+            return self.change_log.position if self.change_log else 0
+
+    def snapshot(self, target_dir):
+        """
+        Writes a point-in-time copy of the data files into target_dir, for
+        backups. Commits wait only while the files are linked, not while the
+        backup reads them.
+
+        Returns:
+            int: Number of files in the snapshot.
+        """
+        return self.storage.snapshot(target_dir, self.write_lock)
+
+    def get_recovery_report(self):
+        """Startup recovery result plus any damaged files moved aside since."""
+        return dict(self.recovery, quarantined=list(self.storage.quarantined))
+
+    # Cache
+    def get_cache_stats(self):
+        return self.cache.get_stats()
+
+    def invalidate_cache(self):
+        """Drops every cached collection; the next read comes from storage."""
+        self.cache.clear()
+
+    def _validator(self, collection):
+        return lambda: self.storage.signature(collection)
+
+    def _lookup(self, collection, field, value, records=None):
+        """O(1) lookup through the collection's index."""
+        index = self.indexes[collection]
+        index.sync(records if records is not None else self._get_collection(collection))
+        return index.get(field, value)
+
+    def _get_collection(self, collection, use_cache=True):
+        if not use_cache:
+            return self.storage.load(collection)
+        cached = self.cache.get(collection, self._validator(collection))
+        if cached is not None:
+            return cached
+        if collection == "sales":
+            # Only the current year is read up front; older years load on demand
+            year = str(datetime.now().year)
+            data = self.storage.load_partition("sales", year)
+            self._sales_loaded = {"years": {year}, "complete": False}
+        else:
+            data = self.storage.load(collection)
+        self.cache.set(collection, data, self._validator(collection), self.storage.size(collection))
+        return data
+
+    def _sales(self, years=()):
+        """
+        The cached sales list with the current year and the given year
+        partitions loaded. Missing years are merged in timestamp order and
+        the sales indexes rebuilt once.
+        """
+        sales = self._get_collection("sales")
+        loaded = self._sales_loaded
+        missing = {str(y) for y in years if y} - loaded["years"]
+        if not missing:
+            return sales
+        available = self.storage.partitions("sales")
+        to_load = sorted(y for y in missing if y in available)
+        if to_load:
+            start = time.perf_counter()
+            for year in to_load:
+                sales.extend(self.storage.load_partition("sales", year))
+            sales.sort(key=lambda s: s.get('timestamp', ''))
+            self.indexes["sales"].rebuild(sales)
+            self.sales_timeline.rebuild(sales)
+            self.invoice_search.source = None
+            print(f"Loaded sales for {', '.join(to_load)} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        loaded["years"].update(missing)
+        return sales
+
+    def _sale_year(self, sale_id):
+        """Year encoded in a sale id (YYYYmmdd...) or invoice number (INV-YYYY-NNNN)."""
+        sale_id = str(sale_id or "")
+        year = sale_id[4:8] if sale_id.startswith("INV-") else sale_id[:4]
+        return year if year.isdigit() else None
+
+    def _find_sale(self, sale_id):
+        """Looks a sale up by id or invoice number, loading only the year it names."""
+        year = self._sale_year(sale_id)
+        sales = self._sales([year] if year else ())
+        sale = (self._lookup("sales", "id", sale_id, sales)
+                or self._lookup("sales", "invoice_number", sale_id, sales))
+        if not sale and not self._sales_loaded["complete"]:
+            sales = self.get_sales()
+            sale = (self._lookup("sales", "id", sale_id, sales)
+                    or self._lookup("sales", "invoice_number", sale_id, sales))
+        return sale, sales
+
+    def close(self):
+        self.compact_storage()
+        with self.write_lock:
+            self.storage.close()
+
+    # Transactions
+    def transaction(self):
+        """
+        Returns the active transaction, or a new one.
+
+        Usage:
+            with db.transaction():
+                ...  # every DataManager mutation in here is committed together
+        """
+        return self._tx or Transaction(self)
+
+    def get_commit_stats(self):
+        """Timing of the most recent commits (milliseconds)."""
+        durations = [c["ms"] for c in self.commit_stats]
+        return {
+            "commits": self.total_commits,
+            "last_ms": durations[-1] if durations else 0.0,
+            "avg_ms": sum(durations) / len(durations) if durations else 0.0,
+            "max_ms": max(durations) if durations else 0.0,
+            "recent": list(self.commit_stats)
+        }
+
+    def _record_commit(self, op_count, duration):
+        # Our own write changed the files; don't treat that as an external edit
+        self.cache.revalidate()
+        self.total_commits += 1
+        self.commit_stats.append({
+            "ops": op_count,
+            "ms": round(duration * 1000, 3),
+            "timestamp": datetime.now().isoformat()
+        })
+
+    def _put(self, collection, record, records):
+        with self.transaction() as tx:
+            tx.put(collection, record, records)
+
+    def _remove(self, collection, record, records):
+        with self.transaction() as tx:
+            tx.remove(collection, record, records)
+
+    def _emit(self, kind, key=None, record=None, action=None):
+        """Announces a change: after the commit if a transaction is open, else now."""
+        event = ChangeEvent(kind, key, record, action)
+        if self._tx:
+            self._tx.emit(event)
+        else:
+            self.events.publish(event)
 
     # Settings
     def get_settings(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("settings")
-            if cached: return cached["value"]
-        settings = self._load_json(self.settings_file, dict)
-        if use_cache: self.cache.set("settings", settings)
-        return settings
+        return self._get_collection("settings", use_cache)
 
     def save_settings(self, settings_data):
-        self._save_json(self.settings_file, settings_data)
-        self.cache.set("settings", settings_data)
+        with self.write_lock:
+            self.storage.replace("settings", settings_data)
+            if self.change_log:
+                self.change_log.append([{"op": "settings", "settings": settings_data}])
+        self.cache.set("settings", settings_data, self._validator("settings"))
+        self._emit(SETTINGS_CHANGED, record=settings_data)
         return settings_data
 
     # Products
     def get_products(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("products")
-            if cached: return cached["value"]
-        products = self._load_json(self.products_file, list)
-        if use_cache: self.cache.set("products", products)
-        return products
+        return self._get_collection("products", use_cache)
 
     def add_product(self, product_data):
-        products = self.get_products(use_cache=False)
+        products = self.get_products()
         product_data['id'] = datetime.now().strftime("%Y%m%d%H%M%S")
         products.append(product_data)
-        self._save_json(self.products_file, products)
+        self.indexes["products"].add(product_data, products)
+        self.product_search.add(product_data, products)
+        self.barcodes.add(product_data, products)
+        self._put("products", product_data, products)
         self.cache.set("products", products)
+        self._emit(PRODUCT_CHANGED, product_data['id'], product_data, "added")
         return product_data
 
     def delete_product(self, product_id):
-        products = self.get_products(use_cache=False)
-        products = [p for p in products if p['id'] != product_id]
-        self._save_json(self.products_file, products)
+        products = self.get_products()
+        product = self._lookup("products", "id", product_id, products)
+        if product:
+            products.remove(product)
+            self.indexes["products"].remove(product, products)
+            self.product_search.remove(product, products)
+            self.barcodes.remove(product, products)
+            self._remove("products", product, products)
+            self._emit(PRODUCT_CHANGED, product_id, product, "deleted")
         self.cache.set("products", products)
         return True
 
     def update_product(self, product_id, updated_data):
-        products = self.get_products(use_cache=False)
-        for i, p in enumerate(products):
-            if p['id'] == product_id:
-                products[i].update(updated_data)
-                products[i]['id'] = product_id
-                break
-        self._save_json(self.products_file, products)
+        products = self.get_products()
+        product = self._lookup("products", "id", product_id, products)
+        if product:
+            product.update(updated_data)
+            product['id'] = product_id
+            self.product_search.update(product, products)
+            self.barcodes.update(product, products)
+            self._put("products", product, products)
+            self._emit(PRODUCT_CHANGED, product_id, product, "updated")
         self.cache.set("products", products)
 
-    def get_product_by_id(self, product_id):
+    def search_products(self, query, limit=50):
+        """Ranked, Arabic-normalized search over name, id and barcode (see search_engine)."""
+        products = self.get_products()
+        self.product_search.sync(products)
+        return self.product_search.search(query, limit)
+
+    def get_product_by_barcode(self, code):
+        """
+        O(1) lookup of a scanned code.
+
+        Returns:
+            tuple: (product, units) - units > 1 for multi-pack codes; (None, 0) if unknown.
+        """
         products = self.get_products()
-        return next((p for p in products if p['id'] == product_id), None)
+        self.barcodes.sync(products)
+        return self.barcodes.get(code)
+
+    def get_product_by_id(self, product_id):
+        return self._lookup("products", "id", product_id)
 
     def update_product_stock(self, product_id, quantity_change):
-        products = self.get_products(use_cache=False)
-        for p in products:
-            if p['id'] == product_id:
-                p['stock'] = p.get('stock', 0) + quantity_change
-                break
-        self._save_json(self.products_file, products)
+        products = self.get_products()
+        product = self._lookup("products", "id", product_id, products)
+        if product:
+            product['stock'] = product.get('stock', 0) + quantity_change
+            self._put("products", product, products)
+            self._emit(STOCK_CHANGED, product_id, product)
         self.cache.set("products", products)
 
     # Sales
     def get_sales(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("sales")
-            if cached: return cached["value"]
-        sales = self._load_json(self.sales_file, list)
-        if use_cache: self.cache.set("sales", sales)
+        """Full sales history; closed years are read the first time this is called."""
+        if not use_cache:
+            return self.storage.load("sales")
+        sales = self._get_collection("sales")
+        if not self._sales_loaded["complete"]:
+            sales = self._sales(self.storage.partitions("sales"))
+            self._sales_loaded["complete"] = True
         return sales
 
+    def get_sales_partitions(self):
+        """
+        Bounds and totals of each year of sales, without loading closed years.
+
+        Returns:
+            dict: year -> {"count", "total", "first", "last", "products", "loaded"};
+                  "products" maps product id -> {"name", "qty", "rev"}.
+        """
+        partitions = self.storage.partitions("sales", detail=True)
+        sales = self._sales()
+        by_year = {}
+        for sale in sales:
+            by_year.setdefault(partition_key(sale), []).append(sale)
+        # Loaded years are summarised from memory, which includes uncompacted changes
+        for year in self._sales_loaded["years"]:
+            if year in by_year or year in partitions:
+                partitions[year] = partition_stats(by_year.get(year, []))
+        for year, stats in partitions.items():
+            stats["loaded"] = year in self._sales_loaded["years"]
+        return partitions
+
+    def get_sales_summary(self):
+        """All-time sale count, revenue and per-product figures from the partition manifest."""
+        summary = {"count": 0, "total": 0.0, "products": {}}
+        for stats in self.get_sales_partitions().values():
+            summary["count"] += stats.get("count", 0)
+            summary["total"] += stats.get("total", 0.0)
+            for pid, p in stats.get("products", {}).items():
+                agg = summary["products"].setdefault(pid, {"name": p["name"], "qty": 0, "rev": 0.0})
+                agg["qty"] += p["qty"]
+                agg["rev"] += p["rev"]
+        return summary
+
     def add_sale(self, items, total_amount, payment_method, shift_id=None, customer_id=None):
-        sales = self.get_sales(use_cache=False)
-        
-        # Generate Unique Invoice Number (INV-YYYY-NNNN)
-        today = datetime.now()
-        year_prefix = f"INV-{today.year}-"
+        """Records a sale and its stock/debt effects as one transaction."""
+        with self.transaction():
+            sales = self._sales([datetime.now().year])
+            invoice_number = self.next_invoice_number()
+            
+            sale_data = {
+                "id": datetime.now().strftime("%Y%m%d%H%M%S%f"), # Added microseconds for higher uniqueness
+                "invoice_number": invoice_number,
+                "timestamp": datetime.now().isoformat(),
+                "items": items,
+                "total_amount": total_amount,
+                "payment_method": payment_method,
+                "shift_id": shift_id,
+                "customer_id": customer_id
+            }
+            sales.append(sale_data)
+            self.indexes["sales"].add(sale_data, sales)
+            self.sales_timeline.add(sale_data, sales)
+            self.invoice_search.add(sale_data, sales)
+            self._put("sales", sale_data, sales)
+            self.cache.set("sales", sales)
+            self._update_shift_totals(sale_data, 1)
+            self._emit(SALE_ADDED, sale_data['id'], sale_data)
+            
+            # Update Stocks
+            for item in items:
+                self.update_product_stock(item['product_id'], -item['quantity'])
+                
+            # Update Customer Debt
+            if payment_method == 'دين' and customer_id:
+                self.update_customer_debt(customer_id, total_amount)
+            
+        return sale_data
+
+    def search_sales(self, query):
+        """Invoices matching `query` by number, customer, phone, payment or date; newest first."""
+        sales = self.get_sales()
+        self.invoice_search.sync(sales)
+        return self.invoice_search.search(query)
+
+    def get_sale_by_id(self, sale_id):
+        return self._lookup("sales", "id", sale_id, self._sales([self._sale_year(sale_id)]))
+
+    def get_sale_by_invoice_number(self, invoice_number):
+        return self._lookup("sales", "invoice_number", invoice_number,
+                            self._sales([self._sale_year(invoice_number)]))
+
+    def next_invoice_number(self):
+        """Allocates the next unique invoice number (INV-YYYY-NNNN) in O(1)."""
+        return self.invoice_sequence.next_number()
+
+    def _max_invoice_number(self, year):
+        """Highest number used in `year`; seeds a sequence the first time it is used."""
+        year_prefix = f"INV-{year}-"
         last_num = 0
-        for s in sales:
+        for s in self._sales([year]):
             inv_no = s.get('invoice_number', '')
             if inv_no.startswith(year_prefix):
                 try:
                     num = int(inv_no.split('-')[-1])
                     if num > last_num: last_num = num
                 except: continue
-        
-        invoice_number = f"{year_prefix}{last_num + 1:04d}"
-        
-        sale_data = {
-            "id": datetime.now().strftime("%Y%m%d%H%M%S%f"), # Added microseconds for higher uniqueness
-            "invoice_number": invoice_number,
-            "timestamp": datetime.now().isoformat(),
-            "items": items,
-            "total_amount": total_amount,
-            "payment_method": payment_method,
-            "shift_id": shift_id,
-            "customer_id": customer_id
-        }
-        sales.append(sale_data)
-        self._save_json(self.sales_file, sales)
-        self.cache.set("sales", sales)
-        
-        # Update Stocks
-        for item in items:
-            self.update_product_stock(item['product_id'], -item['quantity'])
-            
-        # Update Customer Debt
-        if payment_method == 'دين' and customer_id:
-            self.update_customer_debt(customer_id, total_amount)
-            
-        return sale_data
+        return last_num
 
     def delete_sale(self, sale_id):
         """Removes a sale, restores stock, and adjusts debt if applicable."""
-        sales = self.get_sales(use_cache=False)
-        sale_to_delete = next((s for s in sales if s['id'] == sale_id or s.get('invoice_number') == sale_id), None)
+        sale_to_delete, sales = self._find_sale(sale_id)
         
         if not sale_to_delete:
             return False, "الفاتورة غير موجودة"
             
-        # 1. Restore Stock
-        for item in sale_to_delete.get('items', []):
-            self.update_product_stock(item['product_id'], item['quantity'])
-            
-        # 2. Revert Customer Debt
-        if sale_to_delete.get('payment_method') == 'دين' and sale_to_delete.get('customer_id'):
-            self.update_customer_debt(sale_to_delete['customer_id'], -sale_to_delete['total_amount'])
-            
-        # 3. Remove Sale
-        sales = [s for s in sales if s['id'] != sale_to_delete['id']]
-        self._save_json(self.sales_file, sales)
-        self.cache.set("sales", sales)
+        with self.transaction():
+            # 1. Restore Stock
+            for item in sale_to_delete.get('items', []):
+                self.update_product_stock(item['product_id'], item['quantity'])
+                
+            # 2. Revert Customer Debt
+            if sale_to_delete.get('payment_method') == 'دين' and sale_to_delete.get('customer_id'):
+                self.update_customer_debt(sale_to_delete['customer_id'], -sale_to_delete['total_amount'])
+                
+            # 3. Remove Sale
+            sales.remove(sale_to_delete)
+            self.indexes["sales"].remove(sale_to_delete, sales)
+            self.sales_timeline.remove(sale_to_delete, sales)
+            self.invoice_search.remove(sale_to_delete, sales)
+            self._remove("sales", sale_to_delete, sales)
+            self.cache.set("sales", sales)
+            self._update_shift_totals(sale_to_delete, -1)
+            self._emit(SALE_DELETED, sale_to_delete['id'], sale_to_delete)
         return True, "تم حذف الفاتورة وإرجاع الكميات للمخزون"
 
     # Users
     def get_users(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("users")
-            if cached: return cached["value"]
-        users = self._load_json(self.users_file, list)
-        if use_cache: self.cache.set("users", users)
-        return users
+        return self._get_collection("users", use_cache)
 
     def add_user(self, user_data):
-        users = self.get_users(use_cache=False)
+        users = self.get_users()
         if any(u['username'] == user_data['username'] for u in users):
             return None
         users.append(user_data)
-        self._save_json(self.users_file, users)
+        self._put("users", user_data, users)
+        self._emit(USER_CHANGED, user_data['username'], user_data, "added")
         self.cache.set("users", users)
         return user_data
 
     def update_user_password(self, username, new_password):
-        users = self.get_users(use_cache=False)
+        users = self.get_users()
         for u in users:
             if u['username'] == username:
                 u['password'] = new_password
+                self._put("users", u, users)
+                self._emit(USER_CHANGED, username, u, "updated")
+                break
+        self.cache.set("users", users)
+
+    def update_user(self, username, data):
+        users = self.get_users()
+        for u in users:
+            if u['username'] == username:
+                u.update(data)
+                u['username'] = username
+                self._put("users", u, users)
+                self._emit(USER_CHANGED, username, u, "updated")
                 break
-        self._save_json(self.users_file, users)
         self.cache.set("users", users)
 
     # Shifts
     def get_shifts(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("shifts")
-            if cached: return cached["value"]
-        shifts = self._load_json(self.shifts_file, list)
-        if use_cache: self.cache.set("shifts", shifts)
-        return shifts
+        return self._get_collection("shifts", use_cache)
+
+    def get_shift_by_id(self, shift_id):
+        return self._lookup("shifts", "id", shift_id)
 
     def get_active_shift(self, username):
         shifts = self.get_shifts()
         return next((s for s in shifts if s['username'] == username and s['status'] == 'open'), None)
 
     def open_shift(self, username, start_cash):
-        shifts = self.get_shifts(use_cache=False)
+        shifts = self.get_shifts()
         shift_id = datetime.now().strftime("SHFT%Y%m%d%H%M%S")
         new_shift = {
             "id": shift_id,
@@ -262,56 +948,148 @@ class DataManager:
             "end_time": None,
             "start_cash": start_cash,
             "end_cash": 0,
-            "status": "open"
+            "status": "open",
+            "totals": self._empty_shift_totals()
         }
         shifts.append(new_shift)
-        self._save_json(self.shifts_file, shifts)
+        self.indexes["shifts"].add(new_shift, shifts)
+        self._put("shifts", new_shift, shifts)
         self.cache.set("shifts", shifts)
+        self._emit(SHIFT_OPENED, shift_id, new_shift)
         return new_shift
 
     def close_shift(self, shift_id, end_cash, notes=""):
-        shifts = self.get_shifts(use_cache=False)
-        for s in shifts:
-            if s['id'] == shift_id:
-                s['end_time'] = datetime.now().isoformat()
-                s['end_cash'] = end_cash
-                s['notes'] = notes
-                s['status'] = 'closed'
-                
-                # Calculate final stats for this shift
-                report = self.get_shift_report(shift_id)
-                s['total_sales'] = report['total']
-                s['cash_sales'] = report['cash']
-                s['card_sales'] = report['card']
-                s['debt_sales'] = report['debt']
-                break
-        self._save_json(self.shifts_file, shifts)
+        shifts = self.get_shifts()
+        s = self._lookup("shifts", "id", shift_id, shifts)
+        if s:
+            s['end_time'] = datetime.now().isoformat()
+            s['end_cash'] = end_cash
+            s['notes'] = notes
+            s['status'] = 'closed'
+            
+            # Calculate final stats for this shift
+            report = self.get_shift_report(shift_id)
+            s['total_sales'] = report['total']
+            s['cash_sales'] = report['cash']
+            s['card_sales'] = report['card']
+            s['debt_sales'] = report['debt']
+            self._put("shifts", s, shifts)
+            self._emit(SHIFT_CLOSED, shift_id, s)
         self.cache.set("shifts", shifts)
 
     def get_shift_report(self, shift_id):
-        sales = self.get_sales()
-        shift_sales = [s for s in sales if s.get('shift_id') == shift_id]
-        
-        totals = {
-            "count": len(shift_sales),
-            "total": sum(s['total_amount'] for s in shift_sales),
-            "cash": sum(s['total_amount'] for s in shift_sales if s['payment_method'] == 'cash' or s['payment_method'] == 'نقدي'),
-            "card": sum(s['total_amount'] for s in shift_sales if s['payment_method'] == 'card' or s['payment_method'] == 'بطاقة'),
-            "debt": sum(s['total_amount'] for s in shift_sales if s['payment_method'] == 'debt' or s['payment_method'] == 'دين')
-        }
+        """Shift totals from the running aggregates kept on the shift record (O(1))."""
+        shifts = self.get_shifts()
+        shift = self._lookup("shifts", "id", shift_id, shifts)
+        if not shift:
+            return self._compute_shift_totals(shift_id)
+        if 'totals' not in shift:
+            # Shift opened before running totals existed: compute once and keep them
+            shift['totals'] = self._compute_shift_totals(shift_id)
+            self._put("shifts", shift, shifts)
+        return dict(shift['totals'])
+
+    def rebuild_shift_totals(self, apply=True):
+        """
+        Recomputes every shift's running totals from the raw sales in one pass.
+
+        Args:
+            apply (bool): Write the recomputed totals back (one transaction).
+
+        Returns:
+            list: {"shift_id", "stored", "computed"} for each shift whose stored
+                  totals were missing or did not match.
+        """
+        computed = {}
+        for sale in self.get_sales():
+            shift_id = sale.get('shift_id')
+            if shift_id:
+                totals = computed.setdefault(shift_id, self._empty_shift_totals())
+                self._accumulate_shift_totals(totals, sale, 1)
+
+        shifts = self.get_shifts()
+        mismatches = []
+        with self.transaction():
+            for shift in shifts:
+                fresh = computed.get(shift['id'], self._empty_shift_totals())
+                stored = shift.get('totals')
+                if not self._same_shift_totals(stored, fresh):
+                    mismatches.append({"shift_id": shift['id'], "stored": stored, "computed": fresh})
+                    if apply:
+                        shift['totals'] = fresh
+                        self._put("shifts", shift, shifts)
+        return mismatches
+
+    def _empty_shift_totals(self):
+        return {"count": 0, "total": 0.0, "cash": 0.0, "card": 0.0, "debt": 0.0,
+                "first_sale": None, "last_sale": None}
+
+    def _accumulate_shift_totals(self, totals, sale, sign):
+        amount = sale['total_amount'] * sign
+        totals['count'] += sign
+        totals['total'] += amount
+        kind = PAYMENT_KINDS.get(sale.get('payment_method'))
+        if kind:
+            totals[kind] += amount
+        if sign > 0:
+            ts = sale['timestamp']
+            if not totals['first_sale'] or ts < totals['first_sale']: totals['first_sale'] = ts
+            if not totals['last_sale'] or ts > totals['last_sale']: totals['last_sale'] = ts
+
+    def _compute_shift_totals(self, shift_id):
+        totals = self._empty_shift_totals()
+        shift = self._lookup("shifts", "id", shift_id)
+        if shift and shift.get('start_time'):
+            # Only the years the shift spans need to be loaded
+            end_time = shift.get('end_time') or datetime.now().isoformat()
+            sales = self._sales(range(int(shift['start_time'][:4]), int(end_time[:4]) + 1))
+        else:
+            sales = self.get_sales()
+        for sale in sales:
+            if sale.get('shift_id') == shift_id:
+                self._accumulate_shift_totals(totals, sale, 1)
         return totals
 
+    def _same_shift_totals(self, stored, fresh):
+        if not stored:
+            return False
+        if stored.get('count') != fresh['count']:
+            return False
+        if any(abs(stored.get(k, 0) - fresh[k]) > 0.005 for k in ("total", "cash", "card", "debt")):
+            return False
+        return stored.get('first_sale') == fresh['first_sale'] and stored.get('last_sale') == fresh['last_sale']
+
+    def _update_shift_totals(self, sale, sign):
+        """Applies a sale (+1) or its deletion (-1) to its shift's running totals."""
+        shifts = self.get_shifts()
+        shift = self._lookup("shifts", "id", sale.get('shift_id'), shifts)
+        if not shift:
+            return
+        if 'totals' not in shift:
+            # Legacy shift: the scan already reflects the sales list after this change
+            shift['totals'] = self._compute_shift_totals(shift['id'])
+        else:
+            totals = shift['totals']
+            self._accumulate_shift_totals(totals, sale, sign)
+            if sign < 0:
+                if totals['count'] <= 0:
+                    totals['first_sale'] = totals['last_sale'] = None
+                elif sale['timestamp'] in (totals['first_sale'], totals['last_sale']):
+                    # The removed sale was at an edge: rescan only this shift's time window
+                    self.sales_timeline.sync(self._sales())
+                    window = self.sales_timeline.between(totals['first_sale'], totals['last_sale'] + "~")
+                    stamps = [s['timestamp'] for s in window if s.get('shift_id') == shift['id']]
+                    totals['first_sale'] = min(stamps) if stamps else None
+                    totals['last_sale'] = max(stamps) if stamps else None
+        self._put("shifts", shift, shifts)
+        self.cache.set("shifts", shifts)
+
     # Customers
     def get_customers(self, use_cache=True):
-        if use_cache:
-            cached = self.cache.get("customers")
-            if cached: return cached["value"]
-        customers = self._load_json(self.customers_file, list)
-        if use_cache: self.cache.set("customers", customers)
-        return customers
+        return self._get_collection("customers", use_cache)
 
     def add_customer(self, data):
-        customers = self.get_customers(use_cache=False)
+        customers = self.get_customers()
         new_customer = {
             "id": datetime.now().strftime("CUST%Y%m%d%H%M%S"),
             "name": data.get('name', 'N/A'),
@@ -321,39 +1099,54 @@ class DataManager:
             "created_at": datetime.now().isoformat()
         }
         customers.append(new_customer)
-        self._save_json(self.customers_file, customers)
+        self.indexes["customers"].add(new_customer, customers)
+        self._put("customers", new_customer, customers)
         self.cache.set("customers", customers)
+        self._emit(CUSTOMER_CHANGED, new_customer['id'], new_customer, "added")
         return new_customer
 
+    def get_customer_by_id(self, customer_id):
+        return self._lookup("customers", "id", customer_id)
+
     def update_customer(self, customer_id, data):
-        customers = self.get_customers(use_cache=False)
-        for c in customers:
-            if c['id'] == customer_id:
-                c.update(data)
-                break
-        self._save_json(self.customers_file, customers)
+        customers = self.get_customers()
+        customer = self._lookup("customers", "id", customer_id, customers)
+        if customer:
+            customer.update(data)
+            customer['id'] = customer_id
+            self._put("customers", customer, customers)
+            self.invoice_search.update_customer(customer_id)
+            self._emit(CUSTOMER_CHANGED, customer_id, customer, "updated")
         self.cache.set("customers", customers)
 
     def update_customer_debt(self, customer_id, amount_change):
-        customers = self.get_customers(use_cache=False)
-        for c in customers:
-            if c['id'] == customer_id:
-                c['debt'] += amount_change
-                break
-        self._save_json(self.customers_file, customers)
+        customers = self.get_customers()
+        customer = self._lookup("customers", "id", customer_id, customers)
+        if customer:
+            customer['debt'] += amount_change
+            self._put("customers", customer, customers)
+            self._emit(CUSTOMER_DEBT_CHANGED, customer_id, customer)
         self.cache.set("customers", customers)
 
     # General purpose methods from original file - kept for compatibility
     def get_sales_by_date_range(self, start_date, end_date):
-        sales = self.get_sales()
-        filtered = []
-        for s in sales:
-            sale_date = datetime.fromisoformat(s['timestamp']).date()
-            if start_date <= sale_date <= end_date:
-                filtered.append(s)
-        return filtered
+        """Sales from start_date to end_date (inclusive dates), oldest first."""
+        self.sales_timeline.sync(self._sales(range(start_date.year, end_date.year + 1)))
+        end_key = (end_date + timedelta(days=1)).isoformat()
+        return self.sales_timeline.between(start_date.isoformat(), end_key)
     
     def get_todays_sales(self):
-        sales = self.get_sales()
-        today = datetime.now().strftime("%Y-%m-%d")
-        return [s for s in sales if s['timestamp'].startswith(today)]
\ No newline at end of file
+        today = datetime.now().date()
+        return self.get_sales_by_date_range(today, today)
+
+
+if __name__ == '__main__':
+    # Maintenance: recompute per-shift running totals from the raw sales and report drift.
+    import sys
+    check_only = "--check" in sys.argv
+    db = DataManager()
+    mismatches = db.rebuild_shift_totals(apply=not check_only)
+    for m in mismatches:
+        print(f"{m['shift_id']}: stored={m['stored']} computed={m['computed']}")
+    print(f"{len(mismatches)} shift(s) {'out of date' if check_only else 'rebuilt'}.")
+    db.close()
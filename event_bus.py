@@ -0,0 +1,66 @@
+# event_bus.py
+# Change notifications from DataManager to whoever shows the data (pages, main window).
+
+# Event kinds
+PRODUCT_CHANGED = "product_changed"               # added, edited or deleted
+STOCK_CHANGED = "stock_changed"                   # quantity on hand only
+SALE_ADDED = "sale_added"
+SALE_DELETED = "sale_deleted"
+CUSTOMER_CHANGED = "customer_changed"             # added or edited
+CUSTOMER_DEBT_CHANGED = "customer_debt_changed"
+SHIFT_OPENED = "shift_opened"
+SHIFT_CLOSED = "shift_closed"
+USER_CHANGED = "user_changed"
+SETTINGS_CHANGED = "settings_changed"
+DATA_RELOADED = "data_reloaded"                   # the whole data set was replaced (backup restore)
+
+
+class ChangeEvent:
+    """
+    One committed change.
+
+    Args:
+        kind (str): One of the event kinds above.
+        key: Id of the record that changed (username for users, None for settings).
+        record (dict, optional): The record after the change (before it, for deletions).
+        action (str, optional): "added", "updated" or "deleted" where the kind covers several.
+    """
+
+    def __init__(self, kind, key=None, record=None, action=None):
+        self.kind = kind
+        self.key = key
+        self.record = record
+        self.action = action
+
+    def __repr__(self):
+        return f"ChangeEvent({self.kind}, {self.key!r}{', ' + self.action if self.action else ''})"
+
+
+class EventBus:
+    """
+    Synchronous publish/subscribe by event kind.
+
+    A failing handler is logged and skipped: the data is already committed
+    when events are published, so one broken subscriber must not stop the
+    others from hearing about it.
+    """
+
+    def __init__(self):
+        self.handlers = {}   # kind -> [callable(event)]
+
+    def subscribe(self, kind, handler):
+        handlers = self.handlers.setdefault(kind, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe(self, kind, handler):
+        handlers = self.handlers.get(kind, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def publish(self, event):
+        for handler in list(self.handlers.get(event.kind, ())):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Event handler failed for {event!r}: {e}")
@@ -1,15 +1,24 @@
 # invoice_manager.py
 # Manages invoice creation, numbering, and exporting.
 
+import io
 import os
-from datetime import datetime
+import shutil
+import tempfile
+import time
+import unicodedata
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape
 try:
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import letter
     from reportlab.lib.units import inch, mm
     from reportlab.pdfbase import pdfmetrics
     from reportlab.pdfbase.ttfonts import TTFont
-    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.styles import ParagraphStyle
     from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle, Spacer, Image
     from reportlab.lib.colors import HexColor, white, black
     from reportlab.lib.utils import ImageReader
@@ -18,9 +27,18 @@ try:
     from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 except ImportError:
     pass
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
 
 # Register Arial for decent Arabic support (standard Windows font)
 ARABIC_FONT_NAME = "Arial"
+ARABIC_BOLD_FONT_NAME = "Arial-Bold"
 try:
     # Try typical Windows path or assume it's system available
     pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
@@ -29,10 +47,137 @@ except:
     # Fallback to Helvetica if Arial not found (won't look good for Arabic but avoids crash)
     print("WARNING: Arial font not found. Arabic may not render.")
     ARABIC_FONT_NAME = "Helvetica"
+    ARABIC_BOLD_FONT_NAME = "Helvetica-Bold"
+
+# ESC/POS commands (Epson-compatible 80 mm thermal printers)
+ESC_INIT = b"\x1b@"
+ESC_ALIGN_LEFT, ESC_ALIGN_CENTER, ESC_ALIGN_RIGHT = b"\x1ba\x00", b"\x1ba\x01", b"\x1ba\x02"
+ESC_BOLD_ON, ESC_BOLD_OFF = b"\x1bE\x01", b"\x1bE\x00"
+ESC_DOUBLE, ESC_NORMAL = b"\x1d!\x11", b"\x1d!\x00"
+ESC_FEED = b"\x1bd"              # + number of lines
+ESC_CUT = b"\x1dVB\x00"         # feed to the cutter, then partial cut
+ESC_CODEPAGE = b"\x1bt"          # + code page number
+ESCPOS_ARABIC_CODEPAGE = 37     # PC864 on Epson TM printers; other brands: settings['escpos_codepage']
+ESCPOS_COLUMNS = 48             # characters per line, Font A on 80 mm paper
+ESCPOS_LOGO_WIDTH = 384         # dots (the full 80 mm line is 576)
+
+# Logo rasters by (path, mtime, width): built once, reused for every receipt
+_LOGO_RASTERS = {}
+
+# Receipts per worker task in a batch export: the logo and fonts are
+# embedded once per chunk, and progress/cancel are checked between chunks
+EXPORT_CHUNK = 50
+
+# PDF receipt logo
+PDF_LOGO_HEIGHT_MM = 35
+PDF_LOGO_MAX_WIDTH_MM = 70
+PDF_LOGO_DPI = 203               # thermal printer resolution; more pixels never reach the paper
+# Logos decoded for the PDF receipt by (path, mtime): (JPEG bytes, width, height in points)
+_PDF_LOGOS = {}
+
+_HARAKAT = dict.fromkeys(range(0x064B, 0x0653))
+
+
+@lru_cache(maxsize=4096)
+def shape_text(text):
+    """Arabic text joined and reordered for left-to-right output (cached: receipts repeat the same names)."""
+    try:
+        return get_display(arabic_reshaper.reshape(str(text)))
+    except Exception:
+        return str(text)
+
+
+@lru_cache(maxsize=1)
+def _pdf_template():
+    """
+    The parts of the PDF receipt that never change between receipts: paragraph
+    and table styles, column widths and the shaped fixed labels. Built on the
+    first receipt and shared by all of them (none of it is modified while
+    drawing, so the print spool's render threads can use it concurrently).
+    """
+    return {
+        "page_width": 80 * mm,
+        "margin": 2 * mm,
+        "rule": "-" * 32,
+        "center": ParagraphStyle("ReceiptCenter", fontName=ARABIC_FONT_NAME, fontSize=10,
+                                 leading=12, alignment=TA_CENTER),
+        "right": ParagraphStyle("ReceiptRight", fontName=ARABIC_FONT_NAME, fontSize=9,
+                                leading=11, alignment=TA_RIGHT),
+        "items_header": [shape_text("الإجمالي"), shape_text("السعر"), shape_text("ع"), shape_text("الصنف")],
+        "items_widths": [18*mm, 15*mm, 8*mm, 34*mm],
+        "items_style": TableStyle([
+            ('FONT', (0,0), (-1,-1), ARABIC_FONT_NAME, 8),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('LINEBELOW', (0,0), (-1,0), 1, black),
+            ('LINEBELOW', (0,-1), (-1,-1), 0.5, HexColor('#aaaaaa')),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 2),
+            ('TOPPADDING', (0,0), (-1,-1), 2),
+        ]),
+        "totals_widths": [40*mm, 35*mm],
+        "totals_style": TableStyle([
+            ('FONT', (0,0), (-1,-1), ARABIC_FONT_NAME, 10),
+            ('ALIGN', (0,0), (0,-1), 'LEFT'),
+            ('ALIGN', (1,0), (1,-1), 'RIGHT'),
+            ('FONTNAME', (0,0), (-1,0), ARABIC_BOLD_FONT_NAME),
+            ('TEXTCOLOR', (0,0), (-1,0), black),
+        ]),
+        "total_label": shape_text("الإجمالي:"),
+        "payment_label": shape_text("طريقة الدفع:"),
+        "thanks": shape_text("شكراً لزيارتكم!"),
+    }
+
+
+def _cp864_fallbacks():
+    """
+    Presentation forms missing from PC864 -> the glyph printers use for them.
+    PC864 only has isolated/initial shapes for most letters; finals print
+    with the isolated glyph and medials with the initial one.
+    """
+    forms = {}   # base letter(s) -> {"<final>": char, ...}; lam-alef ligatures have two
+    for cp in range(0xFE70, 0xFEFD):
+        parts = unicodedata.decomposition(chr(cp)).split()
+        if len(parts) >= 2 and parts[0].startswith("<"):
+            base = "".join(chr(int(x, 16)) for x in parts[1:])
+            forms.setdefault(base, {})[parts[0]] = chr(cp)
+    preferred = {"<final>": ("<isolated>", "<initial>", "<medial>"),
+                 "<medial>": ("<initial>", "<isolated>", "<final>"),
+                 "<initial>": ("<isolated>", "<medial>", "<final>"),
+                 "<isolated>": ("<initial>", "<final>", "<medial>")}
+    plain = {"إ": "ا", "أ": "ا", "آ": "ا", "ئ": "ي", "ؤ": "و", "ة": "ه"}
+
+    def encodable(ch):
+        try:
+            ch.encode("cp864")
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    table = {}
+    for base, shapes in forms.items():
+        for form, ch in shapes.items():
+            if encodable(ch):
+                continue
+            if all(ord(c) in _HARAKAT or c in " \u0640" for c in base):
+                table[ord(ch)] = None   # vowel marks are dropped, as in plain text
+                continue
+            candidates = [shapes.get(f) for f in preferred.get(form, ())]
+            plain_base = "".join(plain.get(c, c) for c in base)
+            if plain_base != base:
+                # e.g. alef with hamza below -> plain alef in the same position
+                other = forms.get(plain_base, {})
+                candidates += [other.get(form)] + [other.get(f) for f in preferred.get(form, ())]
+            table[ord(ch)] = next((c for c in candidates if c and encodable(c)), "?")
+    return table
+
+try:
+    _CP864_FALLBACKS = _cp864_fallbacks()
+except LookupError:
+    _CP864_FALLBACKS = {}
 
 
 class InvoiceManager:
-    """Manages invoice generation, numbering, and PDF export."""
+    """Manages invoice generation, numbering, PDF export and raw ESC/POS receipts."""
 
     def __init__(self, data_manager, invoice_dir='invoices'):
         """
@@ -48,24 +193,10 @@ class InvoiceManager:
 
     def get_next_invoice_number(self):
         """
-        Generates a new, unique invoice number based on the last sale.
+        Allocates a new, unique invoice number from DataManager's persisted sequence.
         Format: INV-YYYY-NNNN
         """
-        sales = self.db.get_sales()
-        today = datetime.now()
-        year_prefix = f"INV-{today.year}-"
-        
-        last_invoice_num = 0
-        for sale in sales:
-            if sale.get('invoice_number', '').startswith(year_prefix):
-                try:
-                    num = int(sale['invoice_number'].split('-')[-1])
-                    if num > last_invoice_num:
-                        last_invoice_num = num
-                except (ValueError, IndexError):
-                    continue
-        
-        return f"{year_prefix}{last_invoice_num + 1:04d}"
+        return self.db.next_invoice_number()
 
     def generate_pdf_invoice(self, sale_data, settings, customer_data=None):
         """
@@ -79,151 +210,454 @@ class InvoiceManager:
         Returns:
             str: The path to the generated PDF file, or None on failure.
         """
-        if 'invoice_number' not in sale_data:
-            print("WARNING: sale_data missing invoice_number. This should not happen now.")
-            sale_data['invoice_number'] = self.get_next_invoice_number() # Fallback for old sales
+        # Very old sales have no invoice number; they are shown by id and
+        # never take one from the sequence (only add_sale does)
+        sale_data = _numbered_sale(sale_data)
 
         invoice_path = os.path.join(self.invoice_dir, f"{sale_data['invoice_number']}.pdf")
-        
+
+        try:
+            c = canvas.Canvas(invoice_path)
+            total_height = self._draw_pdf_receipt(c, sale_data, settings, customer_data)
+            c.save()
+            print(f"Successfully generated dynamic invoice ({total_height/mm:.1f}mm): {invoice_path}")
+            return invoice_path
+
+        except Exception as e:
+            print(f"Error generating PDF invoice: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def _draw_pdf_receipt(self, c, sale_data, settings, customer_data=None):
+        """
+        Draws one receipt as the next page of canvas `c`, sized to its content.
+
+        Returns:
+            float: The page height in points.
+        """
         shop_name = settings.get('shop_name', 'SmokeDash')
         currency = settings.get('currency', 'LYD')
         logo_path = settings.get('logo_path', None)
         show_logo = settings.get('show_logo', True)
 
-        try:
-            # 1. Prepare Elements & Styles
-            page_width = 80 * mm
-            margin = 2 * mm
-            printable_width = page_width - (2 * margin)
-            
-            elements = []
-            
-            # Styles
-            styles = getSampleStyleSheet()
-            style_nc = styles['Normal']
-            style_nc.fontName = ARABIC_FONT_NAME
-            style_nc.fontSize = 10
-            style_nc.alignment = TA_CENTER
-            style_nc.leading = 12
-
-            style_right = styles['Normal']
-            style_right.fontName = ARABIC_FONT_NAME
-            style_right.fontSize = 9
-            style_right.alignment = TA_RIGHT
-            
-            style_left = styles['Normal']
-            style_left.fontName = ARABIC_FONT_NAME
-            style_left.fontSize = 9
-            style_left.alignment = TA_LEFT
-
-            def reshape(text):
-                try:
-                    return get_display(arabic_reshaper.reshape(str(text)))
-                except:
-                    return str(text)
-
-            # --- Logo ---
-            if show_logo and logo_path and os.path.exists(logo_path):
-                img = Image(logo_path)
-                img.drawHeight = 35 * mm
-                img.drawWidth = 35 * mm * (img.imageWidth / img.imageHeight)
-                if img.drawWidth > 70 * mm:
-                     img.drawWidth = 70 * mm
-                     img.drawHeight = 70 * mm * (img.imageHeight / img.imageWidth)
-                elements.append(img)
+        tpl = _pdf_template()
+        page_width = tpl["page_width"]
+        margin = tpl["margin"]
+        printable_width = page_width - (2 * margin)
+        style_nc = tpl["center"]
+        rule = tpl["rule"]
+
+        elements = []
+
+        # --- Logo ---
+        if show_logo and logo_path and os.path.exists(logo_path):
+            logo = self._pdf_logo(logo_path)
+            if logo:
+                elements.append(logo)
                 elements.append(Spacer(1, 5))
 
-            # --- Shop Name ---
-            elements.append(Paragraph(reshape(shop_name), style_nc))
-            elements.append(Spacer(1, 5))
-            
+        # --- Shop Name ---
+        elements.append(Paragraph(escape(shape_text(shop_name)), style_nc))
+        elements.append(Spacer(1, 5))
+
+        # --- Invoice Info ---
+        elements.append(Paragraph(rule, style_nc))
+        elements.append(Paragraph(f"NO: {sale_data['invoice_number']}", style_nc))
+        t_str = sale_data['timestamp'].replace('T', ' ').split('.')[0]
+        elements.append(Paragraph(t_str, style_nc))
+
+        if customer_data:
+             elements.append(Paragraph(escape(shape_text(f"العميل: {customer_data['name']}")), style_nc))
+
+        elements.append(Paragraph(rule, style_nc))
+
+        # --- Items Table ---
+        data = [tpl["items_header"]]
+        for item in sale_data['items']:
+            # Paragraph text is markup: "L&M" must not become an entity
+            name_para = Paragraph(escape(shape_text(item['name'])), tpl["right"])
+            qty = str(item['quantity'])
+            price = f"{item['price']:.2f}"
+            total = f"{item['quantity'] * item['price']:.2f}"
+            data.append([total, price, qty, name_para])
+
+        t = Table(data, colWidths=tpl["items_widths"])
+        t.setStyle(tpl["items_style"])
+        elements.append(t)
+
+        elements.append(Paragraph(rule, style_nc))
+
+        # --- Totals ---
+        total_val = f"{sale_data['total_amount']:.2f} {currency}"
+        t_data = [
+            [total_val, tpl["total_label"]],
+            [shape_text(sale_data.get('payment_method', '')), tpl["payment_label"]]
+        ]
+        t_tot = Table(t_data, colWidths=tpl["totals_widths"])
+        t_tot.setStyle(tpl["totals_style"])
+        elements.append(t_tot)
+
+        elements.append(Paragraph(tpl["thanks"], style_nc))
+        elements.append(Spacer(1, 10))
+
+        # One layout pass: each element is wrapped once, the page is cut to
+        # the measured height and the elements are drawn top to bottom
+        # (SimpleDocTemplate.build would wrap and split everything again)
+        sizes = [elem.wrap(printable_width, 10000) for elem in elements]
+        total_height = sum(h for _, h in sizes) + (2 * margin)
+
+        c.setPageSize((page_width, total_height))
+        y = total_height - margin
+        for elem, (w, h) in zip(elements, sizes):
+            y -= h
+            x = margin
+            if w < printable_width and getattr(elem, 'hAlign', 'CENTER') == 'CENTER':
+                x += (printable_width - w) / 2
+            elem.drawOn(c, x, y)
+        c.showPage()
+        return total_height
+
+    def render_receipt(self, sale_data, settings, customer_data=None):
+        """
+        Renders a receipt in the format chosen in settings (the print spool's renderer).
+
+        Returns:
+            str | bytes: PDF path (receipt_format "pdf", the default) or ESC/POS
+                         bytes ("escpos"); None on failure.
+        """
+        if settings.get('receipt_format') == "escpos":
+            return self.generate_escpos_receipt(sale_data, settings, customer_data)
+        return self.generate_pdf_invoice(sale_data, settings, customer_data)
+
+    def generate_escpos_receipt(self, sale_data, settings, customer_data=None):
+        """
+        Renders a receipt as an ESC/POS byte stream for 80 mm thermal printers,
+        with the same content as the PDF receipt but no PDF or OS print dialog
+        in between.
+
+        Arabic is shaped and reordered for the printer's left-to-right output
+        and encoded in PC864 (selected with ESC t). The logo is sent as a
+        GS v 0 raster, converted once per logo file. The stream ends with a
+        feed and a cut.
+
+        Args:
+            sale_data (dict): The dictionary containing sale details.
+            settings (dict): Application settings (shop name, currency, logo,
+                             escpos_columns, escpos_codepage).
+            customer_data (dict, optional): Customer details if it's a debt sale.
+
+        Returns:
+            bytes: The ESC/POS stream, or None on failure.
+        """
+        # Very old sales have no invoice number; they are shown by id and
+        # never take one from the sequence (only add_sale does)
+        sale_data = _numbered_sale(sale_data)
+
+        cols = int(settings.get('escpos_columns', ESCPOS_COLUMNS))
+        currency = settings.get('currency', 'LYD')
+        logo_path = settings.get('logo_path', None)
+        rule = "-" * cols
+
+        try:
+            out = bytearray(ESC_INIT)
+            out += ESC_CODEPAGE + bytes([int(settings.get('escpos_codepage', ESCPOS_ARABIC_CODEPAGE))])
+
+            # --- Logo & Shop Name ---
+            out += ESC_ALIGN_CENTER
+            if settings.get('show_logo', True) and logo_path and os.path.exists(logo_path):
+                out += self._escpos_logo(logo_path)
+            out += ESC_DOUBLE + ESC_BOLD_ON + self._escpos_line(settings.get('shop_name', 'SmokeDash'))
+            out += ESC_NORMAL + ESC_BOLD_OFF
+
             # --- Invoice Info ---
-            elements.append(Paragraph("--------------------------------", style_nc))
-            elements.append(Paragraph(f"NO: {sale_data['invoice_number']}", style_nc))
-            t_str = sale_data['timestamp'].replace('T', ' ').split('.')[0]
-            elements.append(Paragraph(t_str, style_nc))
-            
+            out += self._escpos_line(rule)
+            out += self._escpos_line(f"NO: {sale_data['invoice_number']}")
+            out += self._escpos_line(sale_data['timestamp'].replace('T', ' ').split('.')[0])
             if customer_data:
-                 elements.append(Paragraph(reshape(f"العميل: {customer_data['name']}"), style_nc))
-            
-            elements.append(Paragraph("--------------------------------", style_nc))
-            
-            # --- Items Table ---
-            data = [[reshape("الإجمالي"), reshape("السعر"), reshape("ع"), reshape("الصنف")]]
-            
+                out += self._escpos_line(f"العميل: {customer_data['name']}")
+            out += self._escpos_line(rule)
+
+            # --- Items (columns laid out left to right: total, price, qty, name) ---
+            widths = [10, 9, 4, cols - 23]
+            out += ESC_ALIGN_LEFT + ESC_BOLD_ON
+            out += self._escpos_row(["الإجمالي", "السعر", "ع", "الصنف"], widths)
+            out += ESC_BOLD_OFF
             for item in sale_data['items']:
-                name = reshape(item['name'])
-                name_para = Paragraph(name, style_right)
-                qty = str(item['quantity'])
-                price = f"{item['price']:.2f}"
-                total = f"{item['quantity'] * item['price']:.2f}"
-                data.append([total, price, qty, name_para])
-            
-            t = Table(data, colWidths=[18*mm, 15*mm, 8*mm, 34*mm])
-            t.setStyle(TableStyle([
-                ('FONT', (0,0), (-1,-1), ARABIC_FONT_NAME, 8),
-                ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-                ('VALIGN', (0,0), (-1,-1), 'TOP'),
-                ('LINEBELOW', (0,0), (-1,0), 1, black),
-                ('LINEBELOW', (0,-1), (-1,-1), 0.5, HexColor('#aaaaaa')),
-                ('BOTTOMPADDING', (0,0), (-1,-1), 2),
-                ('TOPPADDING', (0,0), (-1,-1), 2),
-            ]))
-            elements.append(t)
-            
-            elements.append(Paragraph("--------------------------------", style_nc))
-            
+                out += self._escpos_row([f"{item['quantity'] * item['price']:.2f}", f"{item['price']:.2f}",
+                                         str(item['quantity']), item['name']], widths)
+            out += self._escpos_line(rule)
+
             # --- Totals ---
-            total_val = f"{sale_data['total_amount']:.2f} {currency}"
-            t_data = [
-                [total_val, reshape("الإجمالي:")],
-                [reshape(sale_data.get('payment_method', '')), reshape("طريقة الدفع:")]
-            ]
-            t_tot = Table(t_data, colWidths=[40*mm, 35*mm])
-            t_tot.setStyle(TableStyle([
-                ('FONT', (0,0), (-1,-1), ARABIC_FONT_NAME, 10),
-                ('ALIGN', (0,0), (0,-1), 'LEFT'),
-                ('ALIGN', (1,0), (1,-1), 'RIGHT'),
-                ('FONTNAME', (0,0), (-1,0), 'Arial-Bold'),
-                ('TEXTCOLOR', (0,0), (-1,0), black),
-            ]))
-            elements.append(t_tot)
-            
-            elements.append(Paragraph(reshape("شكراً لزيارتكم!"), style_nc))
-            elements.append(Spacer(1, 10))
-            
-            # 2. Calculate Total Height
-            total_height = 0
-            for elem in elements:
-                w, h = elem.wrap(printable_width, 10000) # Wrap with infinite height
-                total_height += h
-            
-            # Add margins
-            total_height += (2 * margin) + 10 # Buffer
-            
-            # 3. Create Document with Calculated Height
-            doc = SimpleDocTemplate(invoice_path, pagesize=(page_width, total_height),
-                                    rightMargin=margin, leftMargin=margin,
-                                    topMargin=margin, bottomMargin=margin)
-            
-            doc.build(elements)
-            print(f"Successfully generated dynamic invoice ({total_height/mm:.1f}mm): {invoice_path}")
-            return invoice_path
+            half = cols // 2
+            out += ESC_BOLD_ON + self._escpos_row([f"{sale_data['total_amount']:.2f} {currency}", "الإجمالي:"],
+                                                  [cols - half, half]) + ESC_BOLD_OFF
+            out += self._escpos_row([sale_data.get('payment_method', ''), "طريقة الدفع:"], [cols - half, half])
+
+            out += ESC_ALIGN_CENTER + self._escpos_line("شكراً لزيارتكم!")
+            out += ESC_FEED + b"\x04" + ESC_CUT
+            return bytes(out)
 
         except Exception as e:
-            print(f"Error generating PDF invoice: {e}")
+            print(f"Error generating ESC/POS receipt: {e}")
             import traceback
             traceback.print_exc()
             return None
 
+    def _escpos_encode(self, visual):
+        return visual.translate(_HARAKAT).translate(_CP864_FALLBACKS).encode("cp864", errors="replace")
+
+    def _escpos_line(self, text):
+        return self._escpos_encode(shape_text(text)) + b"\n"
+
+    def _escpos_row(self, cells, widths):
+        """One line of fixed-width cells: the last (rightmost, Arabic) cell right-aligned, the rest left."""
+        line = ""
+        last = len(cells) - 1
+        for i, (text, width) in enumerate(zip(cells, widths)):
+            text = str(text)
+            visual = shape_text(text)
+            while len(visual) > width and text:
+                # Cut the logical string (its end), not the reordered one
+                text = text[:-1]
+                visual = shape_text(text)
+            line += visual.rjust(width) if i == last else visual.ljust(width)
+        return self._escpos_encode(line) + b"\n"
+
+    def _escpos_logo(self, path, max_width=ESCPOS_LOGO_WIDTH):
+        """The logo as a GS v 0 raster, converted once per logo file and width."""
+        try:
+            key = (path, os.path.getmtime(path), max_width)
+        except OSError:
+            return b""
+        raster = _LOGO_RASTERS.get(key)
+        if raster is None:
+            if PILImage is None:
+                return b""
+            try:
+                img = PILImage.open(path)
+                if img.mode in ("RGBA", "LA", "P"):
+                    # Transparent areas print white, not black
+                    img = img.convert("RGBA")
+                    background = PILImage.new("RGBA", img.size, "white")
+                    background.alpha_composite(img)
+                    img = background
+                img = img.convert("L")
+                if img.width > max_width:
+                    img = img.resize((max_width, max(1, round(img.height * max_width / img.width))))
+                img = img.convert("1")   # Floyd-Steinberg dithering
+                width_bytes = (img.width + 7) // 8
+                padded = PILImage.new("1", (width_bytes * 8, img.height), 1)
+                padded.paste(img, (0, 0))
+                # PIL sets a bit for white; ESC/POS prints a dot for a set bit
+                data = bytes(b ^ 0xFF for b in padded.tobytes())
+                raster = (b"\x1dv0\x00" + bytes([width_bytes & 0xFF, width_bytes >> 8,
+                                                   img.height & 0xFF, img.height >> 8]) + data + b"\n")
+            except Exception as e:
+                print(f"Could not convert logo for ESC/POS: {e}")
+                raster = b""
+            _LOGO_RASTERS[key] = raster
+        return raster
+
+    def _pdf_logo(self, path):
+        """
+        The logo flowable for the PDF receipt.
+
+        The file is decoded once per logo (path and mtime): transparency is
+        flattened onto white paper, the image is scaled down to what the
+        printer can resolve and kept as JPEG bytes, which reportlab embeds
+        as they are instead of re-encoding the pixels on every receipt.
+        """
+        try:
+            key = (path, os.path.getmtime(path))
+        except OSError:
+            return None
+        logo = _PDF_LOGOS.get(key)
+        if logo is None:
+            try:
+                if PILImage is None:
+                    raise ImportError("Pillow is not installed")
+                img = PILImage.open(path)
+                height = PDF_LOGO_HEIGHT_MM * mm
+                width = height * img.width / img.height
+                if width > PDF_LOGO_MAX_WIDTH_MM * mm:
+                    width = PDF_LOGO_MAX_WIDTH_MM * mm
+                    height = width * img.height / img.width
+                if img.mode in ("RGBA", "LA", "P"):
+                    img = img.convert("RGBA")
+                    background = PILImage.new("RGBA", img.size, "white")
+                    background.alpha_composite(img)
+                    img = background
+                img = img.convert("RGB")
+                max_px = round(width / inch * PDF_LOGO_DPI)
+                if img.width > max_px:
+                    img = img.resize((max_px, max(1, round(img.height * max_px / img.width))), PILImage.LANCZOS)
+                buf = io.BytesIO()
+                img.save(buf, "JPEG", quality=90)
+                logo = (buf.getvalue(), width, height)
+            except Exception as e:
+                print(f"Could not prepare logo for PDF receipts, using the file as is: {e}")
+                logo = (None, None, None)
+            _PDF_LOGOS[key] = logo
+        data, width, height = logo
+        if data is None:
+            img = Image(path)
+            img.drawHeight = PDF_LOGO_HEIGHT_MM * mm
+            img.drawWidth = img.drawHeight * (img.imageWidth / img.imageHeight)
+            if img.drawWidth > PDF_LOGO_MAX_WIDTH_MM * mm:
+                img.drawWidth = PDF_LOGO_MAX_WIDTH_MM * mm
+                img.drawHeight = img.drawWidth * (img.imageHeight / img.imageWidth)
+            return img
+        # A fresh reader per receipt: receipts render on several threads
+        return Image(io.BytesIO(data), width, height)
+
+    def select_invoices(self, start_date=None, end_date=None, shift_id=None, customer_id=None):
+        """
+        Sales for a batch export, oldest first. The filters combine.
+
+        Args:
+            start_date (date, optional): First day (inclusive).
+            end_date (date, optional): Last day (inclusive).
+            shift_id (str, optional): Only sales made in this shift.
+            customer_id (str, optional): Only this customer's sales.
+
+        Returns:
+            list: Sale dicts.
+        """
+        if shift_id and not (start_date or end_date):
+            # Only the years the shift spans need to be read
+            shift = self.db.get_shift_by_id(shift_id)
+            if not shift:
+                return []
+            start_date = date.fromisoformat(shift['start_time'][:10])
+            end_date = date.fromisoformat((shift.get('end_time') or datetime.now().isoformat())[:10])
+        if start_date or end_date:
+            if start_date and end_date:
+                sales = self.db.get_sales_by_date_range(start_date, end_date)
+            else:
+                sales = [s for s in self.db.get_sales()
+                         if (not start_date or s['timestamp'][:10] >= start_date.isoformat())
+                         and (not end_date or s['timestamp'][:10] <= end_date.isoformat())]
+        else:
+            sales = list(self.db.get_sales())
+        if shift_id:
+            sales = [s for s in sales if s.get('shift_id') == shift_id]
+        if customer_id:
+            sales = [s for s in sales if s.get('customer_id') == customer_id]
+        return sorted(sales, key=lambda s: s.get('timestamp', ''))
+
+    def export_invoices(self, sales, customers, settings, output_path, fmt="pdf", workers=None,
+                        progress=None, cancelled=None):
+        """
+        Exports many invoices at once: one multi-page PDF with a receipt per
+        page (fmt "pdf") or a zip with one PDF per invoice (fmt "zip").
+
+        Receipts are rendered in chunks of EXPORT_CHUNK on worker processes
+        (reportlab is pure Python, so threads would share one core). The
+        chunks are merged in sale order with pypdf. Without pypdf a merged
+        PDF is drawn in this process onto a single canvas, which is still far
+        quicker than one file per invoice. Exports of a single chunk also stay
+        in process, because starting workers would cost more than it saves.
+
+        The data manager is not read here, so this may run off the UI thread.
+
+        Args:
+            sales (list): Sale dicts in output order (see `select_invoices`).
+            customers (dict): Customer dicts by id for the sales' customers.
+            settings (dict): Application settings (shop name, currency, logo).
+            output_path (str): The .pdf or .zip file to write.
+            fmt (str): "pdf" or "zip".
+            workers (int, optional): Worker processes (default: CPU count).
+            progress (callable, optional): Called with a percentage as chunks finish.
+            cancelled (callable, optional): Polled while rendering; when it returns
+                                            True the export stops and writes nothing.
+
+        Returns:
+            tuple: (success, message)
+        """
+        if not sales:
+            return False, "لا توجد فواتير مطابقة للتصدير"
+        progress = progress or (lambda percent: None)
+        cancelled = cancelled or (lambda: False)
+        start = time.perf_counter()
+
+        chunks = [sales[i:i + EXPORT_CHUNK] for i in range(0, len(sales), EXPORT_CHUNK)]
+        separate = fmt == "zip"
+        workers = min(workers or os.cpu_count() or 1, len(chunks))
+        staging = tempfile.mkdtemp(prefix="export-", dir=self.invoice_dir)
+        try:
+            done = 0
+            if workers > 1 and (separate or PdfWriter is not None):
+                results = {}
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(_export_chunk, chunk, customers, settings, staging, separate, i): i
+                               for i, chunk in enumerate(chunks)}
+                    waiting = set(futures)
+                    while waiting:
+                        finished, waiting = wait(waiting, timeout=0.2, return_when=FIRST_COMPLETED)
+                        if cancelled():
+                            pool.shutdown(wait=True, cancel_futures=True)
+                            return False, "تم إلغاء التصدير"
+                        for future in finished:
+                            i = futures[future]
+                            results[i] = future.result()
+                            done += len(chunks[i])
+                            progress(int(done * 95 / len(sales)))
+                parts = [path for i in sorted(results) for path in results[i]]
+            else:
+                parts = []
+                c = None if separate else canvas.Canvas(os.path.join(staging, "export.pdf"))
+                for i, chunk in enumerate(chunks):
+                    if cancelled():
+                        return False, "تم إلغاء التصدير"
+                    if separate:
+                        parts += _export_chunk(chunk, customers, settings, staging, True, i)
+                    else:
+                        for sale in chunk:
+                            self._draw_pdf_receipt(c, _numbered_sale(sale), settings, customers.get(sale.get('customer_id')))
+                    done += len(chunk)
+                    progress(int(done * 95 / len(sales)))
+                if c is not None:
+                    c.save()
+                    parts = [os.path.join(staging, "export.pdf")]
+
+            # Written beside the target and moved over it, so a failed export
+            # never leaves half a file under the chosen name
+            tmp_path = output_path + ".tmp"
+            if separate:
+                with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+                    for path in parts:
+                        zf.write(path, os.path.basename(path))
+            elif len(parts) == 1:
+                shutil.move(parts[0], tmp_path)
+            else:
+                writer = PdfWriter()
+                for path in parts:
+                    writer.append(path)
+                with open(tmp_path, "wb") as f:
+                    writer.write(f)
+            os.replace(tmp_path, output_path)
+            progress(100)
+            elapsed = time.perf_counter() - start
+            print(f"Exported {len(sales)} invoices to {output_path} in {elapsed:.1f} s ({workers} worker(s))")
+            return True, f"تم تصدير {len(sales)} فاتورة بنجاح"
+        except Exception as e:
+            print(f"Error exporting invoices: {e}")
+            return False, f"فشل تصدير الفواتير: {e}"
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
     def print_invoice(self, pdf_path):
         """
         Prints the specified PDF invoice using the default system printer.
         Uses win32api for better reliability on Windows.
+
+        Returns:
+            bool: True if the file was handed to the printer.
         """
         if not pdf_path or not os.path.exists(pdf_path):
             print(f"Error: Invoice path does not exist: {pdf_path}")
-            return
+            return False
 
         try:
             if os.name == 'nt': # Windows
@@ -240,8 +674,11 @@ class InvoiceManager:
                 print(f"Sent to printer via ShellExecute: {pdf_path}")
             else:
                 # Linux/Mac fallback (lp)
-                os.system(f"lp {pdf_path}")
+                if os.system(f"lp {pdf_path}") != 0:
+                    print(f"Error printing invoice: lp failed for {pdf_path}")
+                    return False
                 print(f"Sent to printer (lp): {pdf_path}")
+            return True
         except Exception as e:
             print(f"Error printing invoice: {e}")
             # Final fallback: just try to open it so user can manually print
@@ -251,16 +688,116 @@ class InvoiceManager:
                     print("Fallback: Opened PDF for manual printing.")
             except:
                 pass
+            return False
 
+    def print_raw(self, data):
+        """
+        Sends raw printer bytes (ESC/POS) to the default printer, bypassing
+        the driver's rendering: a RAW print job on Windows, `lp -o raw` elsewhere.
+
+        Returns:
+            bool: True if the bytes were handed to the printer.
+        """
+        try:
+            if os.name == 'nt': # Windows
+                import win32print
+
+                printer = win32print.GetDefaultPrinter()
+                handle = win32print.OpenPrinter(printer)
+                try:
+                    win32print.StartDocPrinter(handle, 1, ("Receipt", None, "RAW"))
+                    try:
+                        win32print.StartPagePrinter(handle)
+                        win32print.WritePrinter(handle, data)
+                        win32print.EndPagePrinter(handle)
+                    finally:
+                        win32print.EndDocPrinter(handle)
+                finally:
+                    win32print.ClosePrinter(handle)
+                print(f"Sent {len(data)} raw bytes to {printer}")
+            else:
+                import subprocess
+                result = subprocess.run(["lp", "-o", "raw"], input=data, capture_output=True, timeout=30)
+                if result.returncode != 0:
+                    print(f"Error printing raw receipt: {result.stderr.decode(errors='replace').strip()}")
+                    return False
+                print(f"Sent {len(data)} raw bytes (lp)")
+            return True
+        except Exception as e:
+            print(f"Error printing raw receipt: {e}")
+            return False
+
+
+
+def _numbered_sale(sale):
+    """
+    The sale as rendered. Very old sales lack an invoice number and are shown
+    by their id; the caller's dict is never changed.
+    """
+    if sale.get('invoice_number'):
+        return sale
+    return dict(sale, invoice_number=str(sale.get('id', '')))
+
+
+def _export_chunk(sales, customers, settings, directory, separate, index):
+    """
+    Renders one chunk of a batch export (runs in a worker process).
+
+    Returns:
+        list: The PDF paths written: one per sale when `separate`, otherwise a
+              single file with a page per sale.
+    """
+    mgr = InvoiceManager(None, directory)
+    if separate:
+        paths = []
+        for sale in sales:
+            sale = _numbered_sale(sale)
+            path = os.path.join(directory, f"{sale['invoice_number']}.pdf")
+            c = canvas.Canvas(path)
+            mgr._draw_pdf_receipt(c, sale, settings, customers.get(sale.get('customer_id')))
+            c.save()
+            paths.append(path)
+        return paths
+    path = os.path.join(directory, f"part-{index:05d}.pdf")
+    c = canvas.Canvas(path)
+    for sale in sales:
+        mgr._draw_pdf_receipt(c, _numbered_sale(sale), settings, customers.get(sale.get('customer_id')))
+    c.save()
+    return [path]
+
+
+def benchmark_receipts(invoice_mgr, sale_data, settings, count=50):
+    """
+    Renders the same receipt `count` times as PDF and as ESC/POS and reports
+    the cost of each (rendering only: printing depends on the printer).
+
+    Returns:
+        dict: {"pdf": {...}, "escpos": {...}, "speedup": float} with ms per
+              receipt, receipts per second and output size per format.
+    """
+    results = {}
+    for fmt, render in (("pdf", invoice_mgr.generate_pdf_invoice), ("escpos", invoice_mgr.generate_escpos_receipt)):
+        render(dict(sale_data), settings)   # warm-up: font loading, logo raster
+        start = time.perf_counter()
+        for _ in range(count):
+            out = render(dict(sale_data), settings)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(out) if isinstance(out, str) else len(out or b"")
+        results[fmt] = {"ms_per_receipt": elapsed * 1000 / count,
+                        "receipts_per_sec": count / elapsed if elapsed else 0.0,
+                        "bytes": size}
+    results["speedup"] = results["pdf"]["ms_per_receipt"] / max(results["escpos"]["ms_per_receipt"], 1e-9)
+    return results
 
 if __name__ == '__main__':
     # This is a dummy DataManager for testing purposes.
     class DummyDataManager:
-        def get_sales(self):
-            return [
-                {'invoice_number': 'INV-2025-0001', 'timestamp': '2025-12-29T10:00:00'},
-                {'invoice_number': 'INV-2025-0002', 'timestamp': '2025-12-29T11:00:00'}
-            ]
+        def __init__(self):
+            self.last_number = 2
+
+        def next_invoice_number(self):
+            self.last_number += 1
+            return f"INV-{datetime.now().year}-{self.last_number:04d}"
     
     # Example Usage
     print("--- Testing InvoiceManager ---")
@@ -291,6 +828,17 @@ if __name__ == '__main__':
     }
     mock_settings = {'shop_name': 'متجر النخبة', 'currency': 'دينار'}
     
+    import sys
+    if "--benchmark" in sys.argv:
+        # python invoice_manager.py --benchmark: PDF vs raw ESC/POS rendering
+        mock_sale['items'] = mock_sale['items'] * 4
+        report = benchmark_receipts(invoice_mgr, mock_sale, mock_settings)
+        for fmt in ("pdf", "escpos"):
+            r = report[fmt]
+            print(f"{fmt:>7}: {r['ms_per_receipt']:.2f} ms/receipt, {r['receipts_per_sec']:.0f} receipts/s, {r['bytes']} bytes")
+        print(f"ESC/POS is {report['speedup']:.0f}x faster to render")
+        sys.exit(0)
+
     pdf_path = invoice_mgr.generate_pdf_invoice(mock_sale, mock_settings)
     
     if pdf_path and os.path.exists(pdf_path):
@@ -1,6 +1,8 @@
 import sys
 import os
 import json
+import time
+import multiprocessing
 from datetime import datetime, timedelta
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QStackedWidget,
@@ -12,13 +14,16 @@ from PySide6.QtCore import Qt, QSize, QTimer, QDate
 from PySide6.QtGui import QColor, QPixmap, QAction
 import qtawesome as qta
 from components.utils import resource_path
+from components.job_queue import JobQueue
 
 # Import Managers
 from data_manager import DataManager
-from backup_manager import BackupManager
+from event_bus import DATA_RELOADED, SHIFT_CLOSED, SHIFT_OPENED
+from backup_manager import SHUTDOWN_WAIT, BackupManager
 from notification_manager import NotificationManager
 from language_manager import LanguageManager
 from invoice_manager import InvoiceManager
+from print_spool import ACTIVE, DONE, FAILED, PrintSpool, create_sink
 from user_manager import UserManager
 from update_manager import UpdateManager
 
@@ -80,27 +85,52 @@ class MainWindow(QMainWindow):
         # 5. Global Features
         self.setup_statusbar()
         self.setup_toolbar()
-        self.setup_timers()
+        self.db.events.subscribe(SHIFT_OPENED, self.on_shift_changed)
+        self.db.events.subscribe(SHIFT_CLOSED, self.on_shift_changed)
+        self.db.events.subscribe(DATA_RELOADED, self.on_data_reloaded)
         
         # 6. Localization
         self.set_app_direction()
         
-        # Initial Data load
-        self.refresh_data()
+        # Initial Data load (pages render when first shown)
+        self.update_shift_ui()
         
         # 7. Shift Enforcement
         QTimer.singleShot(100, self.force_shift_check)
+        QTimer.singleShot(0, self.show_recovery_warnings)
         
         # Start
         self.nav_manager.switch_page(start_idx)
 
+    def show_recovery_warnings(self):
+        damaged = self.db.get_recovery_report()['quarantined']
+        if damaged:
+            QMessageBox.warning(self, "تحذير",
+                                "تم العثور على ملفات بيانات تالفة وتم نقلها جانباً:\n" + "\n".join(damaged) +
+                                "\n\nيرجى استعادة نسخة احتياطية.")
+
     def setup_managers(self):
-        self.backup_mgr = BackupManager()
+        # Backups read a snapshot on a background thread; sales go on meanwhile
+        self.backup_mgr = BackupManager(snapshot=self.db.snapshot, retention=self.settings.get("backup_retention"),
+                                        replace=self.db.replace_data)
+        self.backup_jobs = JobQueue(parent=self)
+        self.backup_jobs.progress.connect(self.on_backup_progress)
+        self.backup_jobs.finished.connect(self.on_backup_finished)
+        self.backup_jobs.failed.connect(self.on_backup_failed)
+        self.backup_job = None
+        self.backup_notify = False
+        self.backup_cancel = False
+        self.start_replication()
         self.notification_mgr = NotificationManager(self.db)
         self.lang = LanguageManager()
         self.invoice_mgr = InvoiceManager(self.db)
         self.user_mgr = UserManager(self.db)
         self.update_mgr = UpdateManager()
+        # Receipts render and print here, off the checkout path
+        self.print_spool = PrintSpool(self.invoice_mgr.render_receipt,
+                                      create_sink(self.settings, self.invoice_mgr.print_invoice,
+                                                  self.invoice_mgr.print_raw))
+        self.print_batch = {}   # spool job id -> outcome already reported
         
         saved_lang = self.settings.get('language', 'ar')
         self.lang.set_language(saved_lang)
@@ -243,36 +273,44 @@ class MainWindow(QMainWindow):
         text = self.pos_page.search_input.text()
         filtered = self.pos_ctrl.search_products(text)
         
-        tbl = self.pos_page.products_table
-        tbl.setRowCount(0)
-        for p in filtered:
-            row = tbl.rowCount()
-            tbl.insertRow(row)
-            tbl.setItem(row, 0, QTableWidgetItem(p['name']))
-            tbl.setItem(row, 1, QTableWidgetItem(f"{p['price']:.2f}"))
-            tbl.setItem(row, 2, QTableWidgetItem(str(p['stock'])))
-            tbl.item(row, 0).setData(Qt.UserRole, p['id'])
-
-    def add_to_cart(self, item):
-        row = item.row()
-        product_id = self.pos_page.products_table.item(row, 0).data(Qt.UserRole)
-        success, msg = self.pos_ctrl.add_to_cart(product_id)
+        self.pos_page.products_table.set_records(filtered)
+
+    def add_to_cart(self, index):
+        product = self.pos_page.products_table.record_at(index)
+        if not product:
+            return
+        success, msg = self.pos_ctrl.add_to_cart(product['id'])
         
         if success:
             self.update_cart_ui()
         else:
             QMessageBox.warning(self, "خطأ", msg)
 
+    def scan_barcode(self, code):
+        """Scanner fast path: code -> cart without touching the search results."""
+        start = time.perf_counter()
+        success, msg = self.pos_ctrl.scan_barcode(code)
+        if success:
+            self.update_cart_ui()
+        else:
+            # No modal dialog at the counter; the next scan must not be blocked
+            self.statusbar.showMessage(msg, 4000)
+        elapsed = (time.perf_counter() - start) * 1000
+        if elapsed > 10:
+            print(f"Slow barcode scan {code}: {elapsed:.1f} ms")
+
+    def submit_pos_search(self, text):
+        """Enter typed by hand: a code typed in full, or the only search result."""
+        if not text:
+            return
+        product, _ = self.db.get_product_by_barcode(text)
+        if product:
+            self.scan_barcode(text)
+        elif self.pos_page.products_table.row_count() == 1:
+            self.add_to_cart(self.pos_page.products_table.model().index(0, 0))
+
     def update_cart_ui(self):
-        tbl = self.pos_page.cart_table
-        tbl.setRowCount(0)
-        cart_items = self.pos_ctrl.cart_items
-        for item in cart_items:
-            row = tbl.rowCount()
-            tbl.insertRow(row)
-            tbl.setItem(row, 0, QTableWidgetItem(item['name']))
-            tbl.setItem(row, 1, QTableWidgetItem(str(item['quantity'])))
-            tbl.setItem(row, 2, QTableWidgetItem(f"{item['total']:.2f}"))
+        self.pos_page.cart_table.set_records(self.pos_ctrl.cart_items)
         
         currency = self.settings.get('currency', 'LYD')
         self.pos_page.total_label.setText(f"الإجمالي: {self.pos_ctrl.get_cart_total():.2f} {currency}")
@@ -283,6 +321,7 @@ class MainWindow(QMainWindow):
 
     def process_sale(self, method):
         customer_id = None
+        customer = None
         if method == "دين":
             # Select customer for debt
             from PySide6.QtWidgets import QInputDialog
@@ -305,18 +344,19 @@ class MainWindow(QMainWindow):
         success, msg, sale_data = self.pos_ctrl.process_sale(method, shift_id, customer_id)
         
         if success:
+            # Only the commit and the cart reset happen before the next scan: pages
+            # refresh from the change events after this returns, and the receipt
+            # renders and prints on the job queue
+            start = time.perf_counter()
             self.update_cart_ui()
-            self.refresh_data()
-            self.search_pos_products()
             
             # Auto-Print Logic
             if self.settings.get('auto_print', False) and sale_data:
-                path = self.invoice_mgr.generate_pdf_invoice(sale_data, self.settings)
-                if path:
-                    self.invoice_mgr.print_invoice(path)
-                    msg += "\n(تمت الطباعة تلقائياً)"
+                self.queue_receipt(sale_data, customer)
+                msg += " - جاري الطباعة"
             
-            QMessageBox.information(self, "تم", msg)
+            self.statusbar.showMessage(f"{msg} ({sale_data['invoice_number']})", 5000)
+            self.pos_ctrl.record_stage(sale_data['id'], "ui", (time.perf_counter() - start) * 1000)
         else:
             QMessageBox.warning(self, "خطأ", msg)
 
@@ -327,6 +367,99 @@ class MainWindow(QMainWindow):
         self.status_user.setStyleSheet(f"margin-left: 20px; color: {Colors.ACCENT}; font-weight: bold;")
         self.statusbar.addWidget(self.status_user)
 
+        # Receipt printing progress; hidden while the spool is idle
+        self.print_progress = QProgressBar()
+        self.print_progress.setMaximumWidth(180)
+        self.print_progress.setRange(0, 100)
+        self.print_progress.hide()
+        self.statusbar.addPermanentWidget(self.print_progress)
+        # The spool has no Qt side: its job states are polled, and only while it has work
+        self.print_timer = QTimer(self)
+        self.print_timer.setInterval(200)
+        self.print_timer.timeout.connect(self.poll_print_jobs)
+        # Replication lag, refreshed every few seconds while replication is on
+        self.replica_lbl = QLabel()
+        self.replica_lbl.hide()
+        self.statusbar.addPermanentWidget(self.replica_lbl)
+        self.replica_timer = QTimer(self)
+        self.replica_timer.setInterval(5000)
+        self.replica_timer.timeout.connect(self.update_replica_status)
+        self.replica_timer.start()
+        self.update_replica_status()
+
+    # --- Receipt printing ---
+    def queue_receipt(self, sale, customer=None):
+        """Hands a receipt to the print spool; returns the spool job id."""
+        if customer is None and sale.get('customer_id'):
+            customer = self.db.get_customer_by_id(sale['customer_id'])
+        # The spool gets its own copies: the UI thread may change settings meanwhile
+        job_id = self.print_spool.submit(dict(sale), dict(self.settings), dict(customer) if customer else None)
+        self.track_print_job(job_id)
+        return job_id
+
+    def reprint_receipt(self, sale):
+        """Queues a receipt for a past sale and says so in the status bar."""
+        # Tables hand out the cached sale itself; the spool copies it before the
+        # job leaves this thread. Failures are reported by poll_print_jobs
+        job_id = self.queue_receipt(sale)
+        self.statusbar.showMessage("تم إرسال الفاتورة للطباعة", 4000)
+        return job_id
+
+    def track_print_job(self, job_id):
+        self.print_batch[job_id] = False
+        if not self.print_timer.isActive():
+            self.print_timer.start()
+        self.poll_print_jobs()
+
+    def poll_print_jobs(self):
+        done = 0
+        for job_id in list(self.print_batch):
+            job = self.print_spool.status(job_id)
+            if job and job['status'] in ACTIVE:
+                continue
+            done += 1
+            if job and not self.print_batch[job_id]:
+                self.print_batch[job_id] = True
+                self.on_print_job_finished(job)
+        total = len(self.print_batch)
+        if done == total:
+            self.print_timer.stop()
+            self.print_progress.hide()
+            self.print_batch.clear()
+        else:
+            self.print_progress.setValue(done * 100 // total)
+            self.print_progress.setFormat(f"طباعة الفواتير {done}/{total}")
+            self.print_progress.show()
+
+    def on_print_job_finished(self, job):
+        if job['status'] == DONE:
+            self.pos_ctrl.record_stage(job['sale_id'], "receipt_render", job['render_ms'] or 0)
+            self.pos_ctrl.record_stage(job['sale_id'], "print", job['print_ms'] or 0)
+        elif job['status'] == FAILED:
+            # Not modal: the cashier keeps selling while they deal with the printer
+            box = QMessageBox(QMessageBox.Warning, "فشل الطباعة",
+                              f"الفاتورة {job['invoice_number']} (بعد {job['attempts']} محاولات):\n{job['error']}",
+                              QMessageBox.NoButton, self)
+            retry_btn = box.addButton("إعادة المحاولة", QMessageBox.AcceptRole)
+            box.addButton("إغلاق", QMessageBox.RejectRole)
+
+            def on_click(btn):
+                if btn is retry_btn:
+                    self.retry_print_job(job['id'])
+            box.buttonClicked.connect(on_click)
+            box.setWindowModality(Qt.NonModal)
+            box.setAttribute(Qt.WA_DeleteOnClose)
+            box.show()
+
+    def retry_print_job(self, job_id):
+        if self.print_spool.retry(job_id):
+            self.track_print_job(job_id)
+
+    def update_print_sink(self):
+        """Applies the sink chosen on the settings page to receipts not yet printed."""
+        self.print_spool.set_sink(create_sink(self.settings, self.invoice_mgr.print_invoice,
+                                              self.invoice_mgr.print_raw))
+
     def setup_toolbar(self):
         self.toolbar = QToolBar()
         self.toolbar.setIconSize(QSize(22, 22))
@@ -338,23 +471,48 @@ class MainWindow(QMainWindow):
         self.toolbar.addAction(backup_act)
 
     def db_backup_quick(self):
-        filename = self.backup_mgr.create_backup()
-        if filename:
-            QMessageBox.information(self, "نجاح", f"تم إنشاء نسخة احتياطية سريعة:\n{filename}")
-
-    def setup_timers(self):
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.refresh_data)
-        self.timer.start(300000)
-
-    def refresh_data(self):
-        if hasattr(self, 'dashboard_page'): self.dashboard_page.refresh()
-        if hasattr(self, 'pos_page'): self.search_pos_products()
-        if hasattr(self, 'inventory_page'): self.inventory_page.refresh()
-        if hasattr(self, 'customers_page'): self.customers_page.refresh()
-        if hasattr(self, 'users_page'): self.users_page.refresh()
-        if hasattr(self, 'reports_page'): self.reports_page.refresh()
-        if hasattr(self, 'invoices_page'): self.invoices_page.refresh()
+        self.start_backup(notify=True)
+
+    def start_backup(self, notify=False):
+        """Starts a backup on the background queue unless one is already running."""
+        if self.backup_job:
+            if notify:
+                self.statusbar.showMessage("النسخ الاحتياطي قيد التنفيذ بالفعل", 4000)
+            return self.backup_job
+        self.backup_notify = notify
+        self.backup_job = self.backup_jobs.submit("نسخة احتياطية", self.backup_mgr.backup,
+                                                  lambda: self.backup_cancel)
+        self.statusbar.showMessage("جاري إنشاء نسخة احتياطية...")
+        return self.backup_job
+
+    def on_backup_progress(self, job_id, percent):
+        if job_id == self.backup_job:
+            self.statusbar.showMessage(f"جاري إنشاء نسخة احتياطية... {percent}%")
+
+    def on_backup_finished(self, job_id, path):
+        if job_id != self.backup_job:
+            return
+        self.backup_job = None
+        if not path:
+            self.on_backup_failed(job_id, "")
+            return
+        self.statusbar.showMessage("تم إنشاء النسخة الاحتياطية", 5000)
+        if self.backup_notify:
+            QMessageBox.information(self, "نجاح", f"تم إنشاء النسخة الاحتياطية:\n{path}")
+
+    def on_backup_failed(self, job_id, error):
+        if job_id == self.backup_job:
+            self.backup_job = None
+        self.statusbar.showMessage("فشل إنشاء النسخة الاحتياطية", 8000)
+        if self.backup_notify:
+            QMessageBox.warning(self, "خطأ", f"فشل إنشاء النسخة الاحتياطية\n{error}".strip())
+
+    def on_shift_changed(self, event):
+        self.update_shift_ui()
+
+    def on_data_reloaded(self, event):
+        # A restore replaced everything; the pages re-read on their own
+        self.settings = self.db.get_settings()
         self.update_shift_ui()
 
     def update_shift_ui(self):
@@ -384,7 +542,6 @@ class MainWindow(QMainWindow):
                 self.db.close_shift(self.active_shift['id'], cash, notes)
                 self.active_shift = None
                 QMessageBox.information(self, "تم", "تم إغلاق الوردية بنجاح.")
-                self.refresh_data()
         else:
             # Open Shift
             dialog = OpenShiftDialog(self)
@@ -392,7 +549,6 @@ class MainWindow(QMainWindow):
                 cash = dialog.get_start_cash()
                 self.active_shift = self.db.open_shift(self.user_data['username'], cash)
                 QMessageBox.information(self, "تم", "تم فتح وردية جديدة.")
-                self.refresh_data()
 
     # --- User Permissions Logic ---
     def add_user_dialog(self):
@@ -400,7 +556,6 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
             self.db.add_user(data)
-            self.refresh_data()
             QMessageBox.information(self, "تم", "تمت إضافة الموظف بنجاح")
 
     def open_user_drawer(self, item):
@@ -430,13 +585,7 @@ class MainWindow(QMainWindow):
         if hasattr(self.users_page, 'edit_pwd'):
             data["password"] = self.users_page.edit_pwd.text()
         
-        users = self.db.get_users()
-        for u in users:
-            if u['username'] == username:
-                u.update(data)
-                break
-        self.db._save_json(self.db.users_file, users)
-        self.refresh_data()
+        self.db.update_user(username, data)
         self.users_page.drawer.hide()
         QMessageBox.information(self, "تم", "تم تحديث البيانات")
 
@@ -461,8 +610,103 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "تنبيه", "يرجى إعادة تشغيل التطبيق لتطبيق اللغة الجديدة بالكامل.")
 
     def create_manual_backup(self):
-        path = self.backup_mgr.backup()
-        if path: QMessageBox.information(self, "نجاح", f"تم إنشاء النسخة الاحتياطية:\n{path}")
+        self.start_backup(notify=True)
+
+    def restore_backup(self):
+        """Checks a chosen backup, shows what it holds, and restores it once confirmed."""
+        entries = self.backup_mgr.get_backup_index()
+        if not entries:
+            QMessageBox.information(self, "تنبيه", "لا توجد نسخ احتياطية")
+            return
+        labels = [e['created'].replace('T', ' ')[:19] for e in entries]
+        label, ok = QInputDialog.getItem(self, "استعادة نسخة احتياطية", "اختر النسخة:", labels, 0, False)
+        if not ok:
+            return
+        path = os.path.join(self.backup_mgr.backup_dir, entries[labels.index(label)]['path'])
+        self.confirm_restore(f"النسخة {label}", lambda dry_run: self.backup_mgr.restore(path, dry_run=dry_run))
+
+    def restore_to_time(self):
+        """Rebuilds the data as it was at a chosen moment from the replica folder."""
+        replica_dir = self.settings.get('replica_dir')
+        if not replica_dir:
+            QMessageBox.information(self, "تنبيه", "لم يتم اختيار مجلد النسخ المتزامن")
+            return
+        text, ok = QInputDialog.getText(self, "استعادة إلى وقت محدد", "الوقت (YYYY-MM-DD HH:MM):",
+                                        text=datetime.now().strftime("%Y-%m-%d %H:%M"))
+        if not ok:
+            return
+        try:
+            when = datetime.fromisoformat(text.strip())
+        except ValueError:
+            QMessageBox.warning(self, "خطأ", "صيغة الوقت غير صحيحة")
+            return
+        self.confirm_restore(f"البيانات كما كانت في {text.strip()}",
+                             lambda dry_run: self.backup_mgr.restore_to_time(when, replica_dir, dry_run=dry_run))
+
+    def confirm_restore(self, label, run):
+        """
+        Dry run first (the data is rebuilt and checked aside, nothing is
+        replaced), then the real restore once the user has seen what it holds.
+        `run(dry_run)` returns BackupManager's (success, report).
+        """
+        if self.backup_job:
+            QMessageBox.information(self, "تنبيه", "يرجى الانتظار حتى ينتهي النسخ الاحتياطي الجاري")
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            ok, report = run(True)
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not ok:
+            QMessageBox.warning(self, "خطأ", "لا يمكن الاستعادة:\n" + "\n".join(report['errors']))
+            return
+        names = {"products": "المنتجات", "sales": "المبيعات", "shifts": "الورديات",
+                 "customers": "العملاء", "users": "المستخدمين"}
+        lines = [f"{names.get(c, c)}: {n}" for c, n in report['counts'].items()]
+        for c, (first, last) in report['ranges'].items():
+            lines.append(f"{names.get(c, c)} من {first[:10]} إلى {last[:10]}")
+        reply = QMessageBox.question(self, "تأكيد الاستعادة",
+                                     f"{label} سليمة وتحتوي على:\n" + "\n".join(lines) +
+                                     "\n\nسيتم استبدال البيانات الحالية (مع حفظ نسخة منها أولاً). هل تريد المتابعة؟",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            ok, report = run(False)
+        finally:
+            QApplication.restoreOverrideCursor()
+        if ok:
+            QMessageBox.information(self, "نجاح", "تمت استعادة البيانات بنجاح")
+        else:
+            QMessageBox.warning(self, "خطأ", "فشلت الاستعادة ولم يتم تغيير البيانات:\n" + "\n".join(report['errors']))
+
+    # --- Replication ---
+    def start_replication(self):
+        """Ships every commit to the replica folder chosen in settings (stops if none is set)."""
+        replica_dir = self.settings.get('replica_dir')
+        if replica_dir:
+            self.backup_mgr.start_replication(replica_dir, self.db.base_snapshot, self.db.set_change_log)
+        else:
+            self.backup_mgr.stop_replication(self.db.set_change_log)
+
+    def update_replica_status(self):
+        stats = self.backup_mgr.get_replication_stats()
+        if not stats:
+            self.replica_lbl.hide()
+            return
+        if not stats['connected']:
+            text = f"⚠ النسخ المتزامن متوقف ({stats['lag_entries']} عملية بانتظار النقل)"
+        elif stats['lag_entries']:
+            text = f"النسخ المتزامن: {stats['lag_entries']} عملية متأخرة ({stats['lag_seconds']:.0f} ث)"
+        else:
+            text = "النسخ المتزامن: محدّث ✓"
+        self.replica_lbl.setText(text)
+        self.replica_lbl.setToolTip(f"{stats['replica_dir']}\n"
+                                    f"{stats['entries_per_sec']:.2f} عملية/ث - {stats['bytes_per_sec'] / 1024:.1f} KB/ث\n"
+                                    f"{stats['error'] or ''}".strip())
+        self.replica_lbl.show()
 
     def check_for_updates_action(self):
         if self.update_mgr.check_for_updates():
@@ -476,16 +720,14 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             success, msg = self.inventory_ctrl.add_product(dialog.get_data())
             if success:
-                self.refresh_data()
                 QMessageBox.information(self, "تم", msg)
             else:
                 QMessageBox.warning(self, "خطأ", msg)
 
-    def edit_product_dialog(self, item):
-        row = item.row()
-        product_id = self.inventory_page.table.item(row, 0).text()
-        product = self.db.get_product_by_id(product_id)
+    def edit_product_dialog(self, index):
+        product = self.inventory_page.table.record_at(index)
         if product:
+            product_id = product['id']
             dialog = ProductDialog(self, product)
             res = dialog.exec()
             success, msg = False, ""
@@ -495,7 +737,6 @@ class MainWindow(QMainWindow):
                 success, msg = self.inventory_ctrl.delete_product(product_id)
             
             if success:
-                self.refresh_data()
                 QMessageBox.information(self, "تم", msg)
             elif msg:
                 QMessageBox.warning(self, "خطأ", msg)
@@ -505,18 +746,15 @@ class MainWindow(QMainWindow):
         dialog = CustomerDialog(self)
         if dialog.exec():
             self.db.add_customer(dialog.get_data())
-            self.refresh_data()
             QMessageBox.information(self, "تم", "تمت إضافة العميل بنجاح")
 
-    def edit_customer_dialog(self, item):
-        row = item.row()
-        customer_id = self.customers_page.table.item(row, 0).text()
-        customer = next((c for c in self.db.get_customers() if c['id'] == customer_id), None)
+    def edit_customer_dialog(self, index):
+        customer = self.customers_page.table.record_at(index)
         if customer:
+            customer_id = customer['id']
             dialog = CustomerDialog(self, customer)
             if dialog.exec():
                 self.db.update_customer(customer_id, dialog.get_data())
-                self.refresh_data()
                 QMessageBox.information(self, "تم", "تم تحديث بيانات العميل")
 
     def collect_debt_dialog(self):
@@ -534,7 +772,6 @@ class MainWindow(QMainWindow):
                                                  0, 0, customer['debt'], 2)
             if ok2:
                 self.db.update_customer_debt(customer['id'], -amount)
-                self.refresh_data()
                 QMessageBox.information(self, "تم", "تم تحصيل المبلغ وتحديث سجل العميل بنجاح")
 
     def set_app_direction(self):
@@ -542,7 +779,21 @@ class MainWindow(QMainWindow):
         self.setLayoutDirection(direction)
 
     def closeEvent(self, event):
-        self.backup_mgr.backup()
+        # Receipts already queued still print (a dead printer does not hold up closing for long)
+        self.print_spool.shutdown(wait=True, timeout=10)
+        # A closing backup is queued even if one is running, so it includes the
+        # latest sales; closing waits for it only up to the configured limit
+        # (a backup cut short leaves no manifest, so nothing half-written)
+        self.backup_notify = False
+        self.backup_jobs.submit("نسخة احتياطية", self.backup_mgr.backup, lambda: self.backup_cancel)
+        limit = float(self.settings.get('backup_shutdown_timeout', SHUTDOWN_WAIT))
+        if not self.backup_jobs.shutdown(wait=True, timeout=limit):
+            print(f"Backup still running after {limit:.0f} s; cancelling it")
+            self.backup_cancel = True
+            self.backup_jobs.shutdown(wait=True)
+        # Changes not shipped by then stay in the local log and go out next start
+        self.backup_mgr.stop_replication(self.db.set_change_log, timeout=10)
+        self.db.close()
         event.accept()
 
     def resizeEvent(self, event):
@@ -560,6 +811,8 @@ class MainWindow(QMainWindow):
                 ))
 
 if __name__ == "__main__":
+    # Invoice exports render on worker processes, which re-run this file in the packaged exe
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     # Apply Global Styles to the App
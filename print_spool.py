@@ -0,0 +1,390 @@
+# print_spool.py
+# Receipt print spool: renders on a worker pool, prints in sale order through a
+# pluggable sink, retries when the printer fails.
+
+import itertools
+import os
+import queue
+import shutil
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states, in the order a job normally goes through them
+QUEUED = "queued"
+RENDERING = "rendering"
+RENDERED = "rendered"
+PRINTING = "printing"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE = (QUEUED, RENDERING, RENDERED, PRINTING, RETRYING)
+
+
+class PrintError(Exception):
+    """A receipt could not be rendered or delivered to its sink."""
+
+
+class PrinterSink:
+    """
+    Where rendered receipts go. `send` receives the rendered payload (a file
+    path, or raw bytes for printers that take them) and the job's status
+    dict, and raises PrintError if the receipt did not get out.
+    """
+    name = "sink"
+
+    def send(self, payload, job):
+        raise NotImplementedError
+
+
+class SystemPrinterSink(PrinterSink):
+    """
+    The OS default printer: PDFs through `print_file(path) -> bool`
+    (InvoiceManager.print_invoice), raw ESC/POS bytes through
+    `print_raw(data) -> bool` (InvoiceManager.print_raw).
+    """
+    name = "printer"
+
+    def __init__(self, print_file, print_raw=None):
+        self.print_file = print_file
+        self.print_raw = print_raw
+
+    def send(self, payload, job):
+        if isinstance(payload, str):
+            ok = self.print_file(payload)
+        elif self.print_raw:
+            ok = self.print_raw(payload)
+        else:
+            raise PrintError("الطابعة الافتراضية لا تقبل بيانات ESC/POS")
+        if not ok:
+            raise PrintError("فشل إرسال الفاتورة للطابعة")
+        return "printer"
+
+
+class DeviceSink(PrinterSink):
+    """
+    Raw bytes straight to a printer device: /dev/usb/lp0 on Linux, a serial
+    port or a shared printer path (\\\\pc\\printer) on Windows.
+    """
+    name = "device"
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, payload, job):
+        data = _raw_payload(payload)
+        try:
+            with open(self.path, 'wb') as f:
+                f.write(data)
+                f.flush()
+            return self.path
+        except OSError as e:
+            raise PrintError(f"تعذر الكتابة إلى الطابعة {self.path}: {e}")
+
+
+class NetworkSink(PrinterSink):
+    """Raw bytes to a network printer's socket (port 9100, "JetDirect")."""
+    name = "network"
+
+    def __init__(self, host, port=9100, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, payload, job):
+        data = _raw_payload(payload)
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+                conn.sendall(data)
+            return f"{self.host}:{self.port}"
+        except OSError as e:
+            raise PrintError(f"تعذر الاتصال بالطابعة {self.host}:{self.port}: {e}")
+
+
+def _raw_payload(payload):
+    if isinstance(payload, str):
+        # A thermal printer cannot print a PDF; receipt_format must be "escpos"
+        raise PrintError("هذه الطابعة تحتاج فواتير بصيغة ESC/POS وليس PDF")
+    return payload
+
+
+class DirectorySink(PrinterSink):
+    """
+    Writes each receipt into a folder instead of printing it: lets the spool
+    run without a printer (tests, demos), or feed a folder another machine prints from.
+    """
+    name = "directory"
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, payload, job):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if isinstance(payload, str):
+                ext = os.path.splitext(payload)[1]
+            else:
+                ext = ".prn"
+            target = os.path.join(self.directory, f"{job['invoice_number'] or job['id']}{ext}")
+            tmp = target + ".tmp"
+            if isinstance(payload, str):
+                shutil.copyfile(payload, tmp)
+            else:
+                with open(tmp, 'wb') as f:
+                    f.write(payload)
+            # Readers of the folder never see a half-written receipt
+            os.replace(tmp, target)
+            return target
+        except OSError as e:
+            raise PrintError(f"تعذر الكتابة في مجلد الطباعة: {e}")
+
+
+def create_sink(settings, print_file, print_raw=None):
+    """
+    The sink chosen in settings['print_sink']:
+        "printer" (default)  the OS default printer
+        "directory"          files in settings['print_dir']
+        "device"             raw bytes to settings['print_device']
+        "network"            raw bytes to settings['print_address'] ("host" or "host:port")
+    """
+    kind = settings.get('print_sink')
+    if kind == "directory":
+        return DirectorySink(settings.get('print_dir') or "printed")
+    if kind == "device" and settings.get('print_device'):
+        return DeviceSink(settings['print_device'])
+    if kind == "network" and settings.get('print_address'):
+        host, _, port = settings['print_address'].partition(':')
+        return NetworkSink(host, int(port) if port.isdigit() else 9100)
+    return SystemPrinterSink(print_file, print_raw)
+
+
+class PrintSpool:
+    """
+    Print queue for receipts.
+
+    Receipts are rendered on a pool of `workers` threads, so a slow render
+    does not hold up the next sale. A single printer thread then delivers
+    them to the sink in submission order. A failed delivery is retried up to
+    `retries` more times, waiting `retry_delay` seconds longer each time.
+    Nothing here touches Qt: the UI polls `status`/`jobs`.
+
+    Args:
+        render (callable): (sale, settings, customer) -> payload (path or bytes), or None on failure.
+        sink (PrinterSink): Where rendered receipts go.
+        workers (int): Render threads.
+        retries (int): Extra delivery attempts after a failure.
+        retry_delay (float): Seconds before the first retry (grows linearly).
+    """
+
+    KEEP_FINISHED = 200
+
+    def __init__(self, render, sink, workers=2, retries=3, retry_delay=1.0):
+        self.render = render
+        self.sink = sink
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        self._jobs = {}                # job id -> status dict
+        self._renders = {}             # job id -> Future of the payload
+        self._args = {}                # job id -> (sale, settings, customer), for re-renders
+        self._finished = deque()       # finished job ids, oldest first
+        self._order = queue.Queue()    # job ids in print order
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._printer = None
+        self._ids = itertools.count(1)
+
+    # --- API ---
+    def submit(self, sale, settings, customer=None):
+        """Queues a receipt and returns its job id right away."""
+        job_id = f"print-{next(self._ids)}"
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "sale_id": sale.get('id'),
+                "invoice_number": sale.get('invoice_number'),
+                "status": QUEUED,
+                "attempts": 0,
+                "error": None,
+                "output": None,
+                "render_ms": None,
+                "print_ms": None,
+                "submitted": time.time(),
+            }
+            self._args[job_id] = (sale, settings, customer)
+            self._renders[job_id] = self.executor.submit(self._render, job_id, sale, settings, customer)
+        self._order.put(job_id)
+        self._start_printer()
+        return job_id
+
+    def status(self, job_id):
+        """Snapshot of one job (None once it has aged out of the history)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def jobs(self):
+        """Snapshots of every known job, oldest first."""
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ACTIVE)
+
+    def cancel(self, job_id):
+        """Drops a job that has not reached the printer yet."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in (QUEUED, RENDERING, RENDERED, RETRYING):
+                return False
+            self._finish(job, CANCELLED)
+            return True
+
+    def retry(self, job_id):
+        """Sends a failed job again (re-rendering it only if the render failed)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != FAILED:
+                return False
+            if job_id in self._finished:
+                self._finished.remove(job_id)
+            future = self._renders.get(job_id)
+            if future.exception() is None:
+                job.update(status=RENDERED, attempts=0, error=None)
+            else:
+                job.update(status=QUEUED, attempts=0, error=None)
+                self._renders[job_id] = self.executor.submit(self._render, job_id, *self._args[job_id])
+        self._order.put(job_id)
+        self._start_printer()
+        return True
+
+    def set_sink(self, sink):
+        """Switches the sink; jobs not yet printed go to the new one."""
+        self.sink = sink
+
+    def get_stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        renders = [j["render_ms"] for j in jobs if j["render_ms"] is not None]
+        prints = [j["print_ms"] for j in jobs if j["print_ms"] is not None]
+        counts = {}
+        for j in jobs:
+            counts[j["status"]] = counts.get(j["status"], 0) + 1
+        return {
+            "sink": self.sink.name,
+            "jobs": counts,
+            "avg_render_ms": sum(renders) / len(renders) if renders else 0.0,
+            "avg_print_ms": sum(prints) / len(prints) if prints else 0.0,
+        }
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stops the spool. With `wait`, receipts already queued are printed first
+        (up to `timeout` seconds); retries still pending after that are abandoned.
+        """
+        if wait and self._printer:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.pending() and (deadline is None or time.monotonic() < deadline):
+                time.sleep(0.05)
+        self._stop.set()
+        self._order.put(None)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._printer:
+            self._printer.join(timeout=1.0)
+
+    # --- Workers ---
+    def _start_printer(self):
+        with self._lock:
+            if self._printer is None or not self._printer.is_alive():
+                self._printer = threading.Thread(target=self._print_loop, name="printer", daemon=True)
+                self._printer.start()
+
+    def _render(self, job_id, sale, settings, customer):
+        if not self._set_status(job_id, RENDERING, QUEUED):
+            return None
+        start = time.perf_counter()
+        payload = self.render(sale, settings, customer)
+        with self._lock:
+            job = self._jobs.get(job_id, {})
+            job["render_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            if job.get("status") == RENDERING:
+                job["status"] = RENDERED
+        if payload is None:
+            raise PrintError("فشل إنشاء ملف الفاتورة")
+        return payload
+
+    def _print_loop(self):
+        while not self._stop.is_set():
+            job_id = self._order.get()
+            if job_id is None:
+                break
+            with self._lock:
+                future = self._renders.get(job_id)
+            if future is None:
+                continue
+            try:
+                payload = future.result()
+            except Exception as e:
+                self._fail(job_id, str(e) or e.__class__.__name__)
+                continue
+            self._deliver(job_id, payload)
+
+    def _deliver(self, job_id, payload):
+        for attempt in range(self.retries + 1):
+            if attempt and self._stop.wait(self.retry_delay * attempt):
+                self._fail(job_id, "أوقفت قائمة الطباعة قبل إعادة المحاولة")
+                return
+            if not self._set_status(job_id, PRINTING, RENDERED, RETRYING):
+                return   # cancelled meanwhile
+            with self._lock:
+                job = self._jobs[job_id]
+                job["attempts"] += 1
+                snapshot = dict(job)
+            start = time.perf_counter()
+            try:
+                output = self.sink.send(payload, snapshot)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                print(f"Print attempt {attempt + 1} for {snapshot['invoice_number'] or snapshot['sale_id']} failed: {error}")
+                with self._lock:
+                    job["error"] = error
+                    job["status"] = RETRYING
+                continue
+            with self._lock:
+                job["print_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                job["output"] = output
+                job["error"] = None
+                self._finish(job, DONE)
+            return
+        self._fail(job_id, job["error"])
+
+    # --- Bookkeeping (call with the lock held unless noted) ---
+    def _set_status(self, job_id, status, *allowed):
+        """Moves a job to `status` if it is in one of `allowed`; takes the lock."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in allowed:
+                return False
+            job["status"] = status
+            return True
+
+    def _fail(self, job_id, error):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] != CANCELLED:
+                job["error"] = error
+                self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        job["status"] = status
+        self._finished.append(job["id"])
+        while len(self._finished) > self.KEEP_FINISHED:
+            old = self._finished.popleft()
+            self._jobs.pop(old, None)
+            self._renders.pop(old, None)
+            self._args.pop(old, None)
@@ -0,0 +1,515 @@
+# replication.py
+# Continuous replication of committed changes to a second directory.
+
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from storage_engine import create_storage, fsync_dir
+
+# A local log segment is closed and a new one started past this size
+SEGMENT_BYTES = 4 * 1024 * 1024
+
+# A new base snapshot is shipped at least this often (seconds), so a
+# point-in-time restore never replays more than a day of changes
+REBASE_INTERVAL = 24 * 3600
+
+# Base snapshots kept on the replica, with the log needed to roll them forward
+KEEP_BASES = 3
+
+# Seconds between attempts while the replica is unreachable (USB stick pulled, share down)
+RETRY_DELAY = 5.0
+
+# Most log entries copied to the replica in one write
+SHIP_BATCH = 5000
+
+# Throughput is averaged over this many seconds
+THROUGHPUT_WINDOW = 60.0
+
+
+def list_segments(log_dir):
+    """Log segment names, oldest first. A segment is named after the first seq it holds."""
+    try:
+        return sorted(name for name in os.listdir(log_dir) if name.endswith(".log"))
+    except FileNotFoundError:
+        return []
+
+
+def segment_start(name):
+    return int(name[:-len(".log")])
+
+
+def read_entries(path, offset=0):
+    """
+    Complete entries of a log segment from a byte offset.
+
+    Returns:
+        tuple: (entries, end offset). Each entry is (entry dict, raw line); a
+            torn last line (an append cut short) is left out.
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b"\n") + 1
+    entries = []
+    for line in data[:end].splitlines(keepends=True):
+        try:
+            entries.append((json.loads(line.decode('utf-8')), line))
+        except (ValueError, UnicodeDecodeError):
+            print(f"Skipping damaged change log line in {path}")
+    return entries, offset + end
+
+
+def list_bases(replica_dir):
+    """Base snapshots on a replica ({"id", "created", "position"}), oldest first."""
+    bases = []
+    base_dir = os.path.join(replica_dir, "base")
+    try:
+        names = os.listdir(base_dir)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(base_dir, name), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.isdir(os.path.join(base_dir, meta["id"])):
+            bases.append(meta)
+    bases.sort(key=lambda b: b["position"])
+    return bases
+
+
+def replay_to(replica_dir, when, target_dir, report):
+    """
+    Rebuilds the data as it was at `when` from a replica.
+
+    The newest base snapshot taken at or before `when` is copied to
+    target_dir and the log entries after it, up to `when`, are committed on
+    top. Stops with an error in report["errors"] at a gap in the log or at a
+    restore made after the base (its data is not in the log).
+
+    Args:
+        replica_dir (str): Replica directory written by Replicator.
+        when (datetime|str): Point in time to restore.
+        target_dir (str): Empty directory to build the data in.
+        report (dict): Filled with "base", "replayed" and "until".
+    """
+    when = when.isoformat() if isinstance(when, datetime.datetime) else str(when)
+    bases = [b for b in list_bases(replica_dir) if b["created"] <= when]
+    if not bases:
+        report["errors"].append(f"No base snapshot on the replica before {when}")
+        return
+    base = bases[-1]
+    shutil.copytree(os.path.join(replica_dir, "base", base["id"]), target_dir, dirs_exist_ok=True)
+
+    storage = create_storage(target_dir)
+    try:
+        storage.recover()
+        expected = base["position"] + 1
+        replayed = 0
+        until = base["created"]
+        log_dir = os.path.join(replica_dir, "log")
+        segments = list_segments(log_dir)
+        done = False
+        for i, name in enumerate(segments):
+            if i + 1 < len(segments) and segment_start(segments[i + 1]) <= expected:
+                continue
+            entries, _ = read_entries(os.path.join(log_dir, name))
+            for entry, _ in entries:
+                if entry["seq"] < expected:
+                    continue
+                if entry["time"] > when:
+                    done = True
+                    break
+                if entry["seq"] != expected:
+                    report["errors"].append(f"Change log is missing entries {expected}-{entry['seq'] - 1}")
+                    return
+                ops = entry["ops"]
+                if any(op["op"] == "reload" for op in ops):
+                    report["errors"].append(f"The data was restored from a backup at {entry['time']}; "
+                                            f"choose a time before it or after the next base snapshot")
+                    return
+                records = [op for op in ops if op["op"] in ("put", "del")]
+                if records:
+                    storage.commit(records, {})
+                for op in ops:
+                    if op["op"] == "settings":
+                        storage.replace("settings", op["settings"])
+                expected += 1
+                replayed += 1
+                until = entry["time"]
+            if done:
+                break
+        _sync_sequences(storage)
+        storage.compact()
+        report.update(base=base["id"], replayed=replayed, until=until)
+    finally:
+        storage.close()
+
+
+def _sync_sequences(storage):
+    """
+    Moves invoice counters past the numbers the replayed sales use; the
+    base holds the counters as they were when it was taken.
+    """
+    highest = {}
+    for sale in storage.load("sales"):
+        parts = str(sale.get("invoice_number", "")).split("-")
+        if len(parts) == 3 and parts[0] == "INV" and parts[2].isdigit():
+            name = f"INV-{parts[1]}"
+            highest[name] = max(highest.get(name, 0), int(parts[2]))
+    for name, used in highest.items():
+        current = storage.reserve_sequence(name, 0, lambda: used) - 1
+        if used > current:
+            storage.reserve_sequence(name, used - current, lambda: used)
+
+
+class Replicator:
+    """
+    Ships every committed DataManager change to a second directory.
+
+    DataManager hands each committed batch to append() while it still holds
+    its write lock, so the local change log (`<log_dir>/*.log`, one JSON line
+    per commit: {"seq", "time", "ops"}) is in commit order. A background
+    thread copies new lines to `<replica>/log/` and fsyncs them there; a
+    commit never waits for the replica, which may be a slow share or a USB
+    stick that is not plugged in. Lines stay in the local log until shipped.
+
+    The replica also holds base snapshots (`<replica>/base/<id>/`), each
+    tagged with the log position it matches, so replay_to() can rebuild the
+    data at any time covered by the log.
+
+    Args:
+        log_dir (str): Local change log directory.
+        replica_dir (str): Second directory the log and bases are shipped to.
+        base_snapshot (callable): base_snapshot(target_dir) writes a copy of
+            the data and returns the log position it matches
+            (DataManager.base_snapshot).
+    """
+
+    def __init__(self, log_dir, replica_dir, base_snapshot, keep_bases=KEEP_BASES,
+                 rebase_interval=REBASE_INTERVAL, segment_bytes=SEGMENT_BYTES):
+        self.log_dir = log_dir
+        self.replica_dir = replica_dir
+        self.base_snapshot = base_snapshot
+        self.keep_bases = keep_bases
+        self.rebase_interval = rebase_interval
+        self.segment_bytes = segment_bytes
+        os.makedirs(log_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._segment = None           # name of the segment being appended to
+        self._segment_size = 0
+        self._pending = deque()        # (seq, time.time()) appended but not shipped
+        self._offsets = {}             # local segment -> bytes already shipped
+        self._shipments = deque(maxlen=500)   # (time, entries, bytes) per write to the replica
+        self._rebase = False
+        self.position = self._open_log()
+        self.shipped = None            # last seq on the replica; None until it has been reached
+        self.base_position = None
+        self.last_base = None
+        self.last_ship = None
+        self.shipped_total = 0
+        self.last_error = None
+
+    # --- API ---
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._ship_loop, name="replicator", daemon=True)
+            self._thread.start()
+
+    def append(self, ops):
+        """
+        Logs one committed batch (Journal ops, plus {"op": "settings"} and
+        {"op": "reload"}). Called by DataManager with its write lock held.
+        """
+        with self._lock:
+            seq = self.position + 1
+            line = (json.dumps({"seq": seq, "time": datetime.datetime.now().isoformat(), "ops": ops},
+                               ensure_ascii=False) + "\n").encode("utf-8")
+            self.position = seq
+            try:
+                if self._segment is None or self._segment_size + len(line) > self.segment_bytes:
+                    self._segment = f"{seq:012d}.log"
+                    self._segment_size = 0
+                with open(os.path.join(self.log_dir, self._segment), 'ab') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._segment_size += len(line)
+            except OSError as e:
+                # The commit itself is safe; the log now has a gap only a new base can bridge
+                print(f"Error writing change log: {e}")
+                self.last_error = str(e)
+                self._rebase = True
+            else:
+                self._pending.append((seq, time.time()))
+            if any(op["op"] == "reload" for op in ops):
+                # Restored data is not in the log: the replica needs a new starting point
+                self._rebase = True
+        self._wake.set()
+
+    def get_stats(self):
+        """Replication lag and throughput."""
+        now = time.time()
+        with self._lock:
+            oldest = self._pending[0][1] if self._pending else None
+            recent = [s for s in self._shipments if now - s[0] <= THROUGHPUT_WINDOW]
+            shipped = self.shipped
+        window = THROUGHPUT_WINDOW
+        return {
+            "replica_dir": self.replica_dir,
+            "connected": shipped is not None and self.last_error is None,
+            "position": self.position,
+            "shipped": shipped or 0,
+            "lag_entries": self.position - (shipped or 0) if shipped is not None else len(self._pending),
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "entries_per_sec": round(sum(s[1] for s in recent) / window, 3),
+            "bytes_per_sec": round(sum(s[2] for s in recent) / window, 1),
+            "shipped_total": self.shipped_total,
+            "last_ship": self.last_ship,
+            "last_base": self.last_base,
+            "error": self.last_error,
+        }
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stops shipping. With `wait`, entries already logged are shipped first
+        (up to `timeout` seconds); the rest stay in the local log for next time.
+        """
+        if wait and self._thread:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while (self._pending and self.last_error is None
+                   and (deadline is None or time.monotonic() < deadline)):
+                self._wake.set()
+                time.sleep(0.05)
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    # --- Local log ---
+    def _open_log(self):
+        """Last seq in the local log; a torn tail left by a crash is cut off."""
+        segments = list_segments(self.log_dir)
+        if not segments:
+            return 0
+        self._segment = segments[-1]
+        path = os.path.join(self.log_dir, self._segment)
+        entries, end = read_entries(path)
+        if end != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        self._segment_size = end
+        if entries:
+            return entries[-1][0]["seq"]
+        return segment_start(self._segment) - 1
+
+    # --- Shipping ---
+    def _ship_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=1.0)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if self.shipped is None:
+                    self._open_replica()
+                if (self._rebase or self.base_position is None
+                        or time.time() - self.last_base_time >= self.rebase_interval):
+                    self._ship_base()
+                if self._ship_log():
+                    self._wake.set()
+                self.last_error = None
+            except Exception as e:
+                if self.last_error != str(e):
+                    print(f"Replication to {self.replica_dir} paused: {e}")
+                self.last_error = str(e)
+                self._stop.wait(RETRY_DELAY)
+                self._wake.set()
+
+    def _open_replica(self):
+        """Reads where the replica is up to; a torn tail from a write cut short is cut off."""
+        log_dir = os.path.join(self.replica_dir, "log")
+        os.makedirs(log_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.replica_dir, "base"), exist_ok=True)
+        shipped = 0
+        segments = list_segments(log_dir)
+        if segments:
+            path = os.path.join(log_dir, segments[-1])
+            entries, end = read_entries(path)
+            if end != os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            shipped = entries[-1][0]["seq"] if entries else segment_start(segments[-1]) - 1
+        bases = list_bases(self.replica_dir)
+        if bases:
+            self.base_position = bases[-1]["position"]
+            self.last_base = bases[-1]["created"]
+        if shipped > self.position:
+            # The replica was written from another change log (the local one
+            # was deleted, or the directory is shared): keep it, start anew
+            stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            for name in ("log", "base"):
+                os.replace(os.path.join(self.replica_dir, name), os.path.join(self.replica_dir, f"{name}.old-{stamp}"))
+                os.makedirs(os.path.join(self.replica_dir, name))
+            print(f"Replica {self.replica_dir} did not match the local change log; moved its contents to *.old-{stamp}")
+            shipped = 0
+            self.base_position = None
+            self.last_base = None
+        with self._lock:
+            self.shipped = shipped
+            self._offsets = {}
+            while self._pending and self._pending[0][0] <= shipped:
+                self._pending.popleft()
+        print(f"Replicating to {self.replica_dir} (replica at {shipped}, local log at {self.position})")
+
+    @property
+    def last_base_time(self):
+        return datetime.datetime.fromisoformat(self.last_base).timestamp() if self.last_base else 0.0
+
+    def _ship_base(self):
+        """Copies a fresh base snapshot to the replica (files first, its metadata last)."""
+        self._rebase = False
+        created = datetime.datetime.now()
+        base_id = f"base-{created.strftime('%Y-%m-%d-%H-%M-%S-%f')}"
+        local_dir = os.path.join(self.log_dir, "base.tmp")
+        shutil.rmtree(local_dir, ignore_errors=True)
+        try:
+            position = self.base_snapshot(local_dir)
+            base_dir = os.path.join(self.replica_dir, "base")
+            partial = os.path.join(base_dir, f"{base_id}.partial")
+            shutil.rmtree(partial, ignore_errors=True)
+            shutil.copytree(local_dir, partial)
+            for root, _, files in os.walk(partial):
+                for name in files:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        os.fsync(f.fileno())
+            os.replace(partial, os.path.join(base_dir, base_id))
+            meta = {"id": base_id, "created": created.isoformat(), "position": position}
+            self._write_replica(os.path.join(base_dir, f"{base_id}.json"),
+                                json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        except BaseException:
+            self._rebase = True
+            raise
+        finally:
+            shutil.rmtree(local_dir, ignore_errors=True)
+        self.base_position = position
+        self.last_base = meta["created"]
+        print(f"Shipped base snapshot {base_id} (log position {position}) to {self.replica_dir}")
+        self._prune()
+
+    def _ship_log(self):
+        """
+        Copies the next batch of unshipped local entries to the replica.
+
+        Returns:
+            bool: True if more entries are waiting.
+        """
+        segments = list_segments(self.log_dir)
+        batch = []       # (segment, seq, line)
+        ends = {}        # segment -> offset just past the last line read
+        for i, name in enumerate(segments):
+            if i + 1 < len(segments) and segment_start(segments[i + 1]) - 1 <= self.shipped:
+                continue
+            offset = self._offsets.get(name, 0)
+            entries, _ = read_entries(os.path.join(self.log_dir, name), offset)
+            for entry, line in entries:
+                offset += len(line)
+                if entry["seq"] > self.shipped:
+                    batch.append((name, entry["seq"], line))
+                ends[name] = offset
+                if len(batch) >= SHIP_BATCH:
+                    break
+            if len(batch) >= SHIP_BATCH:
+                break
+        if not batch:
+            self._offsets.update(ends)
+            return False
+        if batch[0][1] != self.shipped + 1:
+            # Entries in between are gone (a log write failed, or the local
+            # log was cleared): carry on from a base taken after the gap
+            if self.base_position is None or self.base_position < batch[0][1] - 1:
+                self._ship_base()
+            with self._lock:
+                self.shipped = max(self.shipped, self.base_position)
+            return True
+
+        log_dir = os.path.join(self.replica_dir, "log")
+        groups = {}
+        for name, _, line in batch:
+            groups.setdefault(name, []).append(line)
+        size = 0
+        for name, lines in groups.items():
+            data = b"".join(lines)
+            target = os.path.join(log_dir, name)
+            new_file = not os.path.exists(target)
+            with open(target, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if new_file:
+                fsync_dir(log_dir)
+            size += len(data)
+
+        last = batch[-1][1]
+        with self._lock:
+            self.shipped = last
+            while self._pending and self._pending[0][0] <= last:
+                self._pending.popleft()
+            self._shipments.append((time.time(), len(batch), size))
+        self._offsets.update(ends)
+        self.shipped_total += len(batch)
+        self.last_ship = datetime.datetime.now().isoformat()
+        self._prune_local(segments)
+        return len(batch) >= SHIP_BATCH
+
+    # --- Pruning ---
+    def _prune_local(self, segments):
+        """Deletes local segments whose entries are all on the replica (never the open one)."""
+        for i, name in enumerate(segments[:-1]):
+            if segment_start(segments[i + 1]) - 1 <= self.shipped and name != self._segment:
+                try:
+                    os.remove(os.path.join(self.log_dir, name))
+                except OSError:
+                    pass
+                self._offsets.pop(name, None)
+
+    def _prune(self):
+        """Drops bases past `keep_bases`, and log segments only those bases needed."""
+        bases = list_bases(self.replica_dir)
+        base_dir = os.path.join(self.replica_dir, "base")
+        for base in bases[:-self.keep_bases]:
+            os.remove(os.path.join(base_dir, f"{base['id']}.json"))
+            shutil.rmtree(os.path.join(base_dir, base["id"]), ignore_errors=True)
+        kept = bases[-self.keep_bases:]
+        if not kept:
+            return
+        oldest = kept[0]["position"]
+        log_dir = os.path.join(self.replica_dir, "log")
+        segments = list_segments(log_dir)
+        for i, name in enumerate(segments[:-1]):
+            if segment_start(segments[i + 1]) - 1 <= oldest:
+                os.remove(os.path.join(log_dir, name))
+
+    def _write_replica(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(os.path.dirname(path))
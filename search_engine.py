@@ -0,0 +1,293 @@
+# search_engine.py
+# In-memory search indexes: POS products (Arabic-aware prefix + trigram) and invoices.
+
+import heapq
+import re
+
+# Harakat, tanween, shadda, sukun, superscript alef and tatweel carry no meaning for search
+_IGNORED = re.compile("[\u064B-\u0652\u0670\u0640]")
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+
+
+def normalize(text):
+    """
+    Folds the spelling variants a cashier may type into one form:
+    alef/hamza forms -> ا, taa marbuta -> ه, alef maqsura/ئ -> ي, ؤ -> و,
+    diacritics and tatweel removed, Arabic-Indic digits -> ASCII, lowercase.
+    """
+    text = _IGNORED.sub("", str(text or "")).translate(_LETTERS).lower()
+    return " ".join(text.split())
+
+
+class ProductSearchIndex:
+    """
+    Search index over product name, id and barcode.
+
+    Every word of the normalized text is indexed under each of its prefixes
+    (so typing narrows results with one dict lookup per word) and under its
+    trigrams (so a fragment from the middle of a word still matches). It
+    follows the RecordIndex sync/add/remove contract: rebuilt once when the
+    products list object changes, otherwise maintained incrementally.
+    """
+
+    MAX_PREFIX = 24
+
+    def __init__(self):
+        self.source = None
+        self.prefixes = {}   # word prefix -> set(product id)
+        self.trigrams = {}   # trigram -> set(product id)
+        self.docs = {}       # product id -> (product, name, words, keys)
+
+    def sync(self, products):
+        if self.source is not products:
+            self.rebuild(products)
+
+    def rebuild(self, products):
+        self.prefixes, self.trigrams, self.docs = {}, {}, {}
+        for product in products:
+            self._add(product)
+        self.source = products
+
+    def add(self, product, products):
+        if self.source is not products:
+            self.rebuild(products)
+        else:
+            self._add(product)
+
+    def update(self, product, products):
+        """Re-indexes a product whose name or codes were edited in place."""
+        if self.source is not products:
+            self.rebuild(products)
+            return
+        self._discard(product.get('id'))
+        self._add(product)
+
+    def remove(self, product, products):
+        if self.source is not products:
+            self.rebuild(products)
+        else:
+            self._discard(product.get('id'))
+
+    def search(self, query, limit=50):
+        """
+        Products matching every word of `query`, best first.
+
+        Ranking: exact id/barcode, exact name, name prefix, word prefixes,
+        then fragments inside words; ties go to the shorter name.
+
+        Returns:
+            list: Product dicts (at most `limit`; all of them if limit is None).
+        """
+        words = normalize(query).split()
+        if not words:
+            products = [doc[0] for doc in self.docs.values()]
+            return products[:limit] if limit else products
+
+        # Fragment matches always rank last, so they are only looked up when
+        # word prefixes alone do not fill the page
+        candidates, infix = self._match(words, False)
+        if limit is None or len(candidates) < limit:
+            candidates, infix = self._match(words, True)
+
+        phrase = " ".join(words)
+        ranked = []
+        for pid in candidates:
+            product, name, _, keys = self.docs[pid]
+            if phrase in keys:
+                score = 0
+            elif name == phrase:
+                score = 1
+            elif name.startswith(phrase):
+                score = 2
+            elif pid not in infix:
+                score = 3
+            else:
+                score = 4
+            ranked.append((score, len(name), name, pid))
+        ranked = heapq.nsmallest(limit, ranked) if limit else sorted(ranked)
+        return [self.docs[r[3]][0] for r in ranked]
+
+    def _match(self, words, with_infix):
+        """Ids matching every word, and the subset matched only by a fragment."""
+        candidates = None
+        infix = set()
+        for word in words:
+            hits = self.prefixes.get(word[:self.MAX_PREFIX], set())
+            if len(word) > self.MAX_PREFIX:
+                hits = {pid for pid in hits if any(w.startswith(word) for w in self.docs[pid][2])}
+            if with_infix:
+                inner = self._infix(word) - hits
+                if inner:
+                    infix |= inner
+                    hits = hits | inner
+            candidates = set(hits) if candidates is None else candidates & hits
+            if not candidates:
+                break
+        return candidates or set(), infix
+
+    def _infix(self, word):
+        if len(word) < 3:
+            return set()
+        grams = [word[i:i + 3] for i in range(len(word) - 2)]
+        sets = [self.trigrams.get(g) for g in grams]
+        if not all(sets):
+            return set()
+        found = set.intersection(*sets)
+        return {pid for pid in found if any(word in w for w in self.docs[pid][2])}
+
+    def _add(self, product):
+        pid = product.get('id')
+        if pid is None:
+            return
+        name = normalize(product.get('name'))
+        keys = {normalize(product.get(f)) for f in ('id', 'barcode') if product.get(f)}
+        words = set(name.split()) | keys
+        self.docs[pid] = (product, name, words, keys)
+        for word in words:
+            for i in range(1, min(len(word), self.MAX_PREFIX) + 1):
+                self.prefixes.setdefault(word[:i], set()).add(pid)
+            for i in range(len(word) - 2):
+                self.trigrams.setdefault(word[i:i + 3], set()).add(pid)
+
+    def _discard(self, pid):
+        doc = self.docs.pop(pid, None)
+        if not doc:
+            return
+        for word in doc[2]:
+            for i in range(1, min(len(word), self.MAX_PREFIX) + 1):
+                self._drop(self.prefixes, word[:i], pid)
+            for i in range(len(word) - 2):
+                self._drop(self.trigrams, word[i:i + 3], pid)
+
+    def _drop(self, table, key, pid):
+        ids = table.get(key)
+        if ids is not None:
+            ids.discard(pid)
+            if not ids:
+                del table[key]
+
+
+class InvoiceSearchIndex:
+    """
+    Word-prefix index over sales for the invoices page.
+
+    Each sale is indexed under its invoice number (and its numeric tail, so
+    "17" finds INV-2026-0017), date (2026-03-05 and 05/03/2026), payment
+    method, and its customer's name and phone. Results come back newest
+    first. Customer details are looked up through `customer_lookup`, and
+    `update_customer` re-indexes only that customer's sales after an edit.
+    """
+
+    MAX_PREFIX = 24
+    WALK_IN = "زبون عام"
+
+    def __init__(self, customer_lookup):
+        self.customer_lookup = customer_lookup   # callable(customer_id) -> dict or None
+        self.source = None
+        self.prefixes = {}      # word prefix -> set(sale id)
+        self.docs = {}          # sale id -> (sale, words)
+        self.by_customer = {}   # customer id -> set(sale id)
+
+    def sync(self, sales):
+        if self.source is not sales:
+            self.rebuild(sales)
+
+    def rebuild(self, sales):
+        self.prefixes, self.docs, self.by_customer = {}, {}, {}
+        for sale in sales:
+            self._add(sale)
+        self.source = sales
+
+    # Unlike the other indexes, add/remove on a stale index only mark it for
+    # rebuild: it is built lazily on the first search, not on the checkout path.
+    def add(self, sale, sales):
+        if self.source is not sales:
+            self.source = None
+        else:
+            self._add(sale)
+
+    def remove(self, sale, sales):
+        if self.source is not sales:
+            self.source = None
+        else:
+            self._discard(sale.get('id'))
+
+    def update_customer(self, customer_id):
+        for sale_id in list(self.by_customer.get(customer_id, ())):
+            sale = self.docs[sale_id][0]
+            self._discard(sale_id)
+            self._add(sale)
+
+    def search(self, query):
+        """Sales matching every word of `query` (prefix match), newest first."""
+        words = normalize(query).split()
+        if not words:
+            hits = self.docs.keys()
+        else:
+            hits = None
+            for word in words:
+                ids = self.prefixes.get(word[:self.MAX_PREFIX], set())
+                if len(word) > self.MAX_PREFIX:
+                    ids = {sid for sid in ids if any(w.startswith(word) for w in self.docs[sid][1])}
+                hits = set(ids) if hits is None else hits & ids
+                if not hits:
+                    return []
+        sales = [self.docs[sid][0] for sid in hits]
+        sales.sort(key=lambda s: s.get('timestamp', ''), reverse=True)
+        return sales
+
+    def _words(self, sale):
+        words = set()
+        inv_no = normalize(sale.get('invoice_number'))
+        if inv_no:
+            words.add(inv_no)
+            parts = inv_no.split('-')
+            words.update('-'.join(parts[i:]) for i in range(1, len(parts)))
+            if parts[-1].isdigit():
+                words.add(parts[-1].lstrip('0') or '0')
+        date = str(sale.get('timestamp', ''))[:10]
+        if len(date) == 10:
+            y, m, d = date.split('-')
+            words.update((date, f"{d}/{m}/{y}"))
+        words.update(normalize(sale.get('payment_method')).split())
+        customer = self.customer_lookup(sale['customer_id']) if sale.get('customer_id') else None
+        if customer:
+            words.update(normalize(customer.get('name')).split())
+            words.update(normalize(customer.get('phone')).split())
+        else:
+            words.update(normalize(self.WALK_IN).split())
+        return words
+
+    def _add(self, sale):
+        sid = sale.get('id')
+        if sid is None:
+            return
+        words = self._words(sale)
+        self.docs[sid] = (sale, words)
+        if sale.get('customer_id'):
+            self.by_customer.setdefault(sale['customer_id'], set()).add(sid)
+        for word in words:
+            for i in range(1, min(len(word), self.MAX_PREFIX) + 1):
+                self.prefixes.setdefault(word[:i], set()).add(sid)
+
+    def _discard(self, sid):
+        doc = self.docs.pop(sid, None)
+        if not doc:
+            return
+        sale, words = doc
+        if sale.get('customer_id') in self.by_customer:
+            self.by_customer[sale['customer_id']].discard(sid)
+        for word in words:
+            for i in range(1, min(len(word), self.MAX_PREFIX) + 1):
+                ids = self.prefixes.get(word[:i])
+                if ids is not None:
+                    ids.discard(sid)
+                    if not ids:
+                        del self.prefixes[word[:i]]
@@ -0,0 +1,966 @@
+# storage_engine.py
+# Pluggable persistence backends used by DataManager (flat JSON files or SQLite).
+
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# Collection name -> primary key field
+COLLECTIONS = {
+    "products": "id",
+    "sales": "id",
+    "shifts": "id",
+    "customers": "id",
+    "users": "username",
+}
+
+# Collections whose snapshot is split into one partition per year
+PARTITIONED = {"sales"}
+
+SQLITE_DB_NAME = "smokedash.db"
+
+
+def partition_key(record):
+    """Year partition of a record ("2026"), taken from its ISO timestamp."""
+    return str(record.get("timestamp") or "")[:4] or "0000"
+
+
+def op_partition(op):
+    """
+    Partition touched by a journal op, or None if it cannot be told.
+
+    Deletes written before partitioning carry no partition; sale ids are
+    timestamps (YYYYmmdd...), so their prefix is used instead.
+    """
+    if op.get("partition"):
+        return op["partition"]
+    if op["op"] == "put":
+        return partition_key(op["record"])
+    key = str(op.get("key", ""))
+    return key[:4] if key[:4].isdigit() else None
+
+
+def partition_stats(records, detail=True):
+    """
+    Bounds and totals of one partition as stored in its manifest entry.
+
+    With `detail`, per-product quantity/revenue is included so reports over
+    closed years do not need to load their sales.
+    """
+    stamps = [r.get("timestamp", "") for r in records]
+    stats = {
+        "count": len(records),
+        "total": round(sum(r.get("total_amount", 0) for r in records), 2),
+        "first": min(stamps) if stamps else None,
+        "last": max(stamps) if stamps else None,
+    }
+    if detail:
+        products = {}
+        for r in records:
+            for item in r.get("items", []):
+                p = products.setdefault(item.get("product_id"), {"name": item.get("name"), "qty": 0, "rev": 0.0})
+                p["qty"] += item.get("quantity", 0)
+                p["rev"] += item.get("total", 0)
+        stats["products"] = products
+    return stats
+
+
+def atomic_write_json(path, data):
+    """
+    Writes JSON to a temp file, fsyncs it and renames it over `path`.
+
+    A power cut leaves either the old file or the new one, never a torn mix;
+    a leftover `.tmp` is dealt with by JsonStorage.recover().
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path))
+
+
+def fsync_dir(path):
+    """Makes a rename in `path` durable (no-op where directories can't be opened, e.g. Windows)."""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def quarantine(path):
+    """Moves an unreadable file aside (`<name>.corrupt-<time>`) so it is never overwritten."""
+    target = f"{path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+    os.replace(path, target)
+    return target
+
+
+def snapshot_files(data_dir, target_dir, copy=(), skip=()):
+    """
+    Point-in-time copy of the files under data_dir into target_dir.
+
+    Files are hard-linked where possible: every data file except the ones in
+    `copy` is only ever replaced by a rename (see atomic_write_json), so the
+    linked inode keeps the content it had at the time of the snapshot and
+    taking one costs the same whatever the data size. Files in `copy` are
+    changed in place (the journal is appended to) and are copied. Leftover
+    temp and lock files are not included.
+
+    Returns:
+        int: Number of files in the snapshot.
+    """
+    count = 0
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            if name.endswith((".tmp", ".lock")) or name in skip:
+                continue
+            src = os.path.join(root, name)
+            dst = os.path.join(target_dir, os.path.relpath(src, data_dir))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if name in copy:
+                shutil.copy2(src, dst)
+            else:
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    # Other volume, or a file system without hard links
+                    shutil.copy2(src, dst)
+            count += 1
+    return count
+
+
+def swap_data_dir(data_dir, staging_dir):
+    """
+    Puts staging_dir in the place of data_dir with two renames.
+
+    Both directories must be on the same file system (staging_dir is created
+    next to data_dir), so each rename is atomic. The old data is kept as
+    `<data_dir>.old` until the caller has opened the new one; a crash between
+    the renames is undone by recover_data_dir() at the next start.
+
+    Returns:
+        str: Path the previous data directory was moved to (None if there was none).
+    """
+    data_dir = os.path.normpath(data_dir)
+    old_dir = f"{data_dir}.old"
+    if not os.path.exists(data_dir):
+        os.replace(staging_dir, data_dir)
+        return None
+    shutil.rmtree(old_dir, ignore_errors=True)
+    os.replace(data_dir, old_dir)
+    try:
+        os.replace(staging_dir, data_dir)
+    except OSError:
+        os.replace(old_dir, data_dir)
+        raise
+    fsync_dir(os.path.dirname(os.path.abspath(data_dir)))
+    return old_dir
+
+
+def recover_data_dir(data_dir):
+    """
+    Finishes a swap_data_dir() cut short: puts the old data back if the new
+    directory never arrived, and drops the old copy once the new one is in place.
+    """
+    data_dir = os.path.normpath(data_dir)
+    old_dir = f"{data_dir}.old"
+    if not os.path.exists(old_dir):
+        return
+    if os.path.exists(data_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(old_dir, data_dir)
+        print(f"Restore was interrupted; kept the previous data in {data_dir}")
+
+
+class FileLock:
+    """Cross-process lock based on exclusive creation of a lock file."""
+
+    def __init__(self, path, timeout=10.0, stale_after=30.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    # A terminal that died while holding the lock leaves it behind
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not acquire lock {self.path}")
+                time.sleep(0.01)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
+
+
+class Journal:
+    """
+    Append-only, line-delimited log of record changes.
+
+    Every line is one batch: {"ops": [{"op": "put", "collection": ..., "record": {...}},
+    {"op": "del", "collection": ..., "key": ...}]}. Deletions are stored as
+    tombstones ("del") and only disappear when the log is compacted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = 0
+        # Collections with changes that are not folded into their snapshot yet
+        self.collections = set()
+        # (collection, partition) pairs touched, for partitioned collections
+        self.partitions = set()
+
+    def append(self, ops):
+        line = json.dumps({"ops": ops}, ensure_ascii=False)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+            # The batch is committed once it is on disk
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += 1
+        self._track(ops)
+
+    def _track(self, ops):
+        for op in ops:
+            self.collections.add(op.get("collection"))
+            if op.get("collection") in PARTITIONED:
+                self.partitions.add((op["collection"], op_partition(op)))
+
+    def read(self):
+        """Returns all batches in order. A torn line left by an interrupted append is skipped."""
+        batches = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        batches.append(json.loads(line)["ops"])
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        print(f"Skipping damaged journal line in {self.path}")
+        except FileNotFoundError:
+            pass
+        self.entries = len(batches)
+        self.collections = set()
+        self.partitions = set()
+        for ops in batches:
+            self._track(ops)
+        return batches
+
+    def recover(self):
+        """
+        Drops damaged lines, e.g. the torn tail of an append cut short by a
+        power failure, so the next append starts on a clean line.
+
+        Returns:
+            int: Number of lines dropped (kept in `journal.log.corrupt-<time>`).
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return 0
+        good, bad = [], []
+        for line in raw.split(b"\n"):
+            if not line.strip():
+                continue
+            try:
+                json.loads(line.decode('utf-8'))["ops"]
+                good.append(line)
+            except (ValueError, KeyError, TypeError):
+                bad.append(line)
+        if not bad and (not raw or raw.endswith(b"\n")):
+            return 0
+        if bad:
+            with open(f"{self.path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}", 'wb') as f:
+                f.write(b"\n".join(bad) + b"\n")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b"".join(line + b"\n" for line in good))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.read()
+        return len(bad)
+
+    def truncate(self):
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.entries = 0
+        self.collections = set()
+        self.partitions = set()
+
+
+def replay(records, batches, collection):
+    """Applies the journal batches touching `collection` on top of a snapshot list."""
+    pk = COLLECTIONS[collection]
+    positions = {r.get(pk): i for i, r in enumerate(records)}
+    deleted = set()
+    for ops in batches:
+        for op in ops:
+            if op.get("collection") != collection:
+                continue
+            if op["op"] == "put":
+                record = op["record"]
+                key = record.get(pk)
+                if key in positions and positions[key] not in deleted:
+                    records[positions[key]] = record
+                else:
+                    positions[key] = len(records)
+                    records.append(record)
+            elif op["op"] == "del" and op["key"] in positions:
+                deleted.add(positions.pop(op["key"]))
+    if deleted:
+        records = [r for i, r in enumerate(records) if i not in deleted]
+    return records
+
+
+class JsonStorage:
+    """
+    Stores every collection as one JSON file inside the data directory.
+
+    Record collections are not rewritten on every change: each commit is
+    appended to `journal.log` as a single line and the snapshot files are only
+    rewritten when the journal is compacted, so a commit costs the same no
+    matter how much history the shop has, and a checkout touching sales,
+    stock and debt lands on disk in one write. Settings are small and are
+    still written directly.
+
+    Sales are split into one snapshot per year (`sales/<year>.json`) with a
+    `sales/manifest.json` holding each year's bounds and totals, so a closed
+    year is only read when something asks for it.
+    """
+
+    name = "json"
+    JOURNALED = set(COLLECTIONS)
+
+    def __init__(self, data_dir, compact_threshold=1000):
+        self.data_dir = data_dir
+        self.files = {c: os.path.join(data_dir, f"{c}.json") for c in COLLECTIONS}
+        self.files["settings"] = os.path.join(data_dir, "settings.json")
+        self.partition_dirs = {c: os.path.join(data_dir, c) for c in PARTITIONED}
+        self.journal = Journal(os.path.join(data_dir, "journal.log"))
+        self.journal.read()
+        self.sequences_file = os.path.join(data_dir, "sequences.json")
+        # Fold the journal into the snapshots once it holds this many batches
+        self.compact_threshold = compact_threshold
+        # Files found unreadable and moved aside (see quarantine())
+        self.quarantined = []
+        for collection in PARTITIONED:
+            self._split_legacy(collection)
+
+    def recover(self):
+        """
+        Brings the data directory back to a consistent state after an
+        unclean shutdown. Run once at startup.
+
+        - a `.tmp` left by an interrupted atomic write is promoted if it is
+          complete, otherwise deleted (the original is still intact);
+        - a torn journal line (a checkout cut off mid-append) is dropped, so
+          that checkout is either fully there or not at all;
+        - batches still in the journal are folded into the snapshots. close()
+          always compacts, so pending batches mean the last session was cut
+          short.
+
+        Returns:
+            dict: {"temp_files", "torn_lines", "replayed", "ms"}.
+        """
+        start = time.perf_counter()
+        report = {"temp_files": 0, "torn_lines": 0, "replayed": 0}
+        dirs = [self.data_dir] + list(self.partition_dirs.values())
+        for tmp_path in [p for d in dirs for p in glob.glob(os.path.join(d, "*.json.tmp"))]:
+            try:
+                with open(tmp_path, 'r', encoding='utf-8') as f:
+                    json.load(f)
+                os.replace(tmp_path, tmp_path[:-len(".tmp")])
+            except (OSError, ValueError):
+                os.remove(tmp_path)
+            report["temp_files"] += 1
+        report["torn_lines"] = self.journal.recover()
+        report["replayed"] = len(self.journal.read())
+        if report["replayed"]:
+            self.compact()
+        report["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if report["temp_files"] or report["torn_lines"] or report["replayed"]:
+            print(f"Recovered data in {self.data_dir} ({report['ms']} ms): "
+                  f"{report['replayed']} journal batch(es) replayed, "
+                  f"{report['torn_lines']} torn line(s) dropped, {report['temp_files']} temp file(s) resolved")
+        return report
+
+    def exists(self, collection):
+        if collection in PARTITIONED:
+            return os.path.exists(self._manifest_path(collection))
+        return os.path.exists(self.files[collection])
+
+    def signature(self, collection):
+        """Cheap change detector (mtime/size of the snapshot and the journal)."""
+        if collection in PARTITIONED:
+            # Partition files are only rewritten together with the manifest
+            paths = [self._manifest_path(collection)]
+        else:
+            paths = [self.files[collection]]
+        if collection in self.JOURNALED:
+            paths.append(self.journal.path)
+        sig = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def size(self, collection):
+        """Approximate size of the collection in bytes (latest partition for partitioned ones)."""
+        path = self.files[collection]
+        if collection in PARTITIONED:
+            partitions = self._load_manifest(collection)
+            if not partitions:
+                return 0
+            path = self._partition_path(collection, max(partitions))
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def load(self, collection):
+        if collection in PARTITIONED:
+            data = []
+            for partition in sorted(self._load_manifest(collection)):
+                data.extend(self._load_json(self._partition_path(collection, partition), list))
+            return replay(data, self.journal.read(), collection)
+        default_type = dict if collection == "settings" else list
+        data = self._load_json(self.files[collection], default_type)
+        if collection in self.JOURNALED:
+            data = replay(data, self.journal.read(), collection)
+        return data
+
+    def load_partition(self, collection, partition):
+        """Records of one partition (e.g. sales of "2025"), journal changes included."""
+        return self._load_partition(collection, partition, self.journal.read())
+
+    def partitions(self, collection, detail=False):
+        """
+        Partitions of a collection with their manifest entry.
+
+        Partitions that so far only exist in the journal have an empty entry.
+
+        Args:
+            detail (bool): Keep the per-product figures of each entry.
+
+        Returns:
+            dict: partition -> {"count", "total", "first", "last"[, "products"]}.
+        """
+        partitions = self._load_manifest(collection)
+        if not detail:
+            for stats in partitions.values():
+                stats.pop("products", None)
+        for c, partition in self.journal.partitions:
+            if c == collection and partition:
+                partitions.setdefault(partition, {})
+        return partitions
+
+    def put(self, collection, record, records):
+        """Persists an inserted/updated record. `records` is the full list after the change."""
+        self.commit([{"op": "put", "collection": collection, "record": record}], {collection: records})
+
+    def remove(self, collection, key, records):
+        """Persists the removal of `key`. `records` is the full list after the change."""
+        self.commit([{"op": "del", "collection": collection, "key": key}], {collection: records})
+
+    def commit(self, ops, states):
+        """
+        Persists a batch of put/del ops as one journal line.
+
+        Args:
+            ops (list): Ops in the Journal format.
+            states (dict): Full record list after the change for every touched collection.
+        """
+        self.journal.append(ops)
+        if self.journal.entries >= self.compact_threshold:
+            self.compact(states)
+
+    def replace(self, collection, records):
+        if collection in PARTITIONED:
+            self._write_partitions(collection, records)
+            if collection in self.journal.collections:
+                # The new partitions supersede the pending ops for this collection
+                self.compact(skip=(collection,))
+        elif collection in self.journal.collections:
+            # Pending journal ops for this collection must not be replayed on top
+            self.compact({collection: records})
+        else:
+            self._save_json(self.files[collection], records)
+
+    def compact(self, states=None, skip=()):
+        """
+        Folds the journal into the snapshot files and empties it.
+
+        Args:
+            states (dict, optional): Known current record lists per collection;
+                collections not given are rebuilt from snapshot + journal.
+                Partitioned collections are always rebuilt per touched
+                partition, since the caller may only hold some of them.
+            skip (iterable, optional): Collections whose pending ops are dropped.
+        """
+        states = states or {}
+        batches = self.journal.read()
+        for collection in self.journal.collections & self.JOURNALED - set(skip):
+            if collection in PARTITIONED:
+                self._compact_partitions(collection, batches)
+                continue
+            records = states.get(collection)
+            if records is None:
+                records = replay(self._load_json(self.files[collection], list), batches, collection)
+            self._save_json(self.files[collection], records)
+        # Replaying a batch that is already in the snapshot is harmless, so a
+        # crash between the writes above and the truncate loses nothing.
+        self.journal.truncate()
+
+    def reserve_sequence(self, name, count, seed):
+        """
+        Atomically reserves `count` numbers from the named sequence.
+
+        Args:
+            name (str): Sequence name, e.g. "INV-2026".
+            count (int): How many numbers to reserve.
+            seed (callable): Returns the highest number already used; only
+                called the first time a sequence is seen.
+
+        Returns:
+            int: The first reserved number.
+        """
+        with FileLock(self.sequences_file + ".lock"):
+            sequences = self._load_json(self.sequences_file, dict)
+            if name not in sequences:
+                sequences[name] = seed()
+            first = sequences[name] + 1
+            sequences[name] += count
+            atomic_write_json(self.sequences_file, sequences)
+        return first
+
+    def snapshot(self, target_dir, write_lock):
+        """
+        Consistent copy of the data directory for a backup.
+
+        Writes are held off (`write_lock`) only while the files are linked and
+        the journal copied, so a compaction rewriting partitions and their
+        manifest is never caught half-way.
+        """
+        with write_lock:
+            return snapshot_files(self.data_dir, target_dir, copy={os.path.basename(self.journal.path)})
+
+    def close(self):
+        pass
+
+    def _partition_path(self, collection, partition):
+        return os.path.join(self.partition_dirs[collection], f"{partition}.json")
+
+    def _manifest_path(self, collection):
+        return os.path.join(self.partition_dirs[collection], "manifest.json")
+
+    def _load_manifest(self, collection):
+        return self._load_json(self._manifest_path(collection), dict).get("partitions", {})
+
+    def _save_manifest(self, collection, partitions):
+        self._save_json(self._manifest_path(collection), {"partitions": partitions})
+
+    def _load_partition(self, collection, partition, batches):
+        records = self._load_json(self._partition_path(collection, partition), list)
+        # Deletes of unknown partition are kept: removing a missing key is a no-op
+        batches = [[op for op in ops if op.get("collection") != collection
+                    or op_partition(op) in (partition, None)] for ops in batches]
+        return replay(records, batches, collection)
+
+    def _write_partitions(self, collection, records):
+        """Rewrites every partition (and the manifest) from a full record list."""
+        os.makedirs(self.partition_dirs[collection], exist_ok=True)
+        groups = {}
+        for record in records:
+            groups.setdefault(partition_key(record), []).append(record)
+        for partition, group in groups.items():
+            self._save_json(self._partition_path(collection, partition), group)
+        for partition in set(self._load_manifest(collection)) - set(groups):
+            try:
+                os.remove(self._partition_path(collection, partition))
+            except OSError:
+                pass
+        self._save_manifest(collection, {p: partition_stats(g) for p, g in groups.items()})
+
+    def _compact_partitions(self, collection, batches):
+        """Rewrites only the partitions the journal touched."""
+        os.makedirs(self.partition_dirs[collection], exist_ok=True)
+        manifest = self._load_manifest(collection)
+        dirty = {p for c, p in self.journal.partitions if c == collection}
+        if None in dirty:
+            dirty = (dirty - {None}) | set(manifest)
+        for partition in dirty:
+            records = self._load_partition(collection, partition, batches)
+            if records:
+                self._save_json(self._partition_path(collection, partition), records)
+                manifest[partition] = partition_stats(records)
+            elif partition in manifest:
+                try:
+                    os.remove(self._partition_path(collection, partition))
+                except OSError:
+                    pass
+                del manifest[partition]
+        self._save_manifest(collection, manifest)
+
+    def _split_legacy(self, collection):
+        """One-time split of a pre-partitioning `<collection>.json` into yearly files."""
+        legacy = self.files[collection]
+        if not os.path.exists(legacy) or self.exists(collection):
+            return
+        start = time.perf_counter()
+        records = self._load_json(legacy, list)
+        self._write_partitions(collection, records)
+        if os.path.exists(legacy):
+            os.replace(legacy, legacy + ".migrated")
+        print(f"Split {legacy} into {len(self._load_manifest(collection))} yearly partitions "
+              f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    def _load_json(self, file_path, default_type=list):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return default_type()
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # Never hand back an empty list for a damaged file: the next write
+            # would replace the history with it. Keep the bytes for recovery.
+            target = quarantine(file_path)
+            self.quarantined.append(target)
+            print(f"ERROR: {file_path} is damaged ({e}); moved to {target}. Restore it from a backup.")
+            return default_type()
+        if isinstance(data, default_type):
+            return data
+        return default_type()
+
+    def _save_json(self, file_path, data):
+        try:
+            atomic_write_json(file_path, data)
+        except Exception as e:
+            # Propagate: compaction must not truncate the journal after a failed write
+            print(f"Error saving {file_path}: {e}")
+            raise
+
+
+class SQLiteStorage:
+    """
+    Stores collections in a single SQLite database (WAL mode).
+
+    Each record is kept as a JSON document in the `data` column so the
+    dict-based API of DataManager is unchanged; the columns used for lookups
+    and reports are mirrored next to it and indexed.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+        "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        # products.id is the primary key, which gives it its index
+        "CREATE TABLE IF NOT EXISTS products (id TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        """CREATE TABLE IF NOT EXISTS sales (
+            id TEXT PRIMARY KEY,
+            invoice_number TEXT,
+            timestamp TEXT,
+            shift_id TEXT,
+            customer_id TEXT,
+            data TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS idx_sales_timestamp ON sales(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_shift_id ON sales(shift_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_invoice_number ON sales(invoice_number)",
+        """CREATE TABLE IF NOT EXISTS shifts (
+            id TEXT PRIMARY KEY,
+            username TEXT,
+            status TEXT,
+            data TEXT NOT NULL)""",
+        "CREATE TABLE IF NOT EXISTS customers (id TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    ]
+
+    # Extra indexed columns mirrored from the record for each table
+    COLUMNS = {
+        "products": [],
+        "sales": ["invoice_number", "timestamp", "shift_id", "customer_id"],
+        "shifts": ["username", "status"],
+        "customers": [],
+        "users": [],
+    }
+
+    def __init__(self, data_dir, db_name=SQLITE_DB_NAME):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, db_name)
+        self.lock = threading.RLock()
+        self.quarantined = []
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for stmt in self.SCHEMA:
+                self.conn.execute(stmt)
+
+    def exists(self, collection):
+        with self.lock:
+            if collection == "settings":
+                row = self.conn.execute("SELECT 1 FROM settings LIMIT 1").fetchone()
+            else:
+                row = self.conn.execute(f"SELECT 1 FROM {collection} LIMIT 1").fetchone()
+        return row is not None
+
+    def signature(self, collection):
+        """data_version changes whenever another connection commits to the database."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def size(self, collection):
+        with self.lock:
+            if collection == "settings":
+                row = self.conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM settings").fetchone()
+            else:
+                row = self.conn.execute(f"SELECT COALESCE(SUM(LENGTH(data)), 0) FROM {collection}").fetchone()
+        return row[0]
+
+    def load(self, collection):
+        with self.lock:
+            if collection == "settings":
+                rows = self.conn.execute("SELECT key, value FROM settings").fetchall()
+                return {k: json.loads(v) for k, v in rows}
+            rows = self.conn.execute(f"SELECT data FROM {collection} ORDER BY rowid").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def load_partition(self, collection, partition):
+        """Records of one year, read through the timestamp index."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT data FROM {collection} WHERE timestamp >= ? AND timestamp < ? ORDER BY rowid",
+                (partition, str(int(partition) + 1))).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def partitions(self, collection, detail=False):
+        """Per-year bounds and totals (see JsonStorage.partitions), computed by SQL."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT substr(timestamp, 1, 4), COUNT(*), "
+                f"COALESCE(SUM(json_extract(data, '$.total_amount')), 0), MIN(timestamp), MAX(timestamp) "
+                f"FROM {collection} GROUP BY 1").fetchall()
+            partitions = {y or "0000": {"count": n, "total": round(t, 2), "first": lo, "last": hi}
+                          for y, n, t, lo, hi in rows}
+            if detail:
+                items = self.conn.execute(
+                    f"SELECT substr(s.timestamp, 1, 4), json_extract(i.value, '$.product_id'), "
+                    f"MAX(json_extract(i.value, '$.name')), SUM(json_extract(i.value, '$.quantity')), "
+                    f"SUM(json_extract(i.value, '$.total')) "
+                    f"FROM {collection} s, json_each(s.data, '$.items') i GROUP BY 1, 2").fetchall()
+                for stats in partitions.values():
+                    stats["products"] = {}
+                for y, pid, name, qty, rev in items:
+                    partitions[y or "0000"]["products"][pid] = {"name": name, "qty": qty or 0, "rev": rev or 0.0}
+        return partitions
+
+    def put(self, collection, record, records=None):
+        with self.lock, self.conn:
+            self._upsert(collection, record)
+
+    def remove(self, collection, key, records=None):
+        with self.lock, self.conn:
+            self._delete(collection, key)
+
+    def commit(self, ops, states=None):
+        """Applies a batch of put/del ops (Journal format) in one SQL transaction."""
+        with self.lock, self.conn:
+            for op in ops:
+                if op["op"] == "put":
+                    self._upsert(op["collection"], op["record"])
+                else:
+                    self._delete(op["collection"], op["key"])
+
+    def replace(self, collection, records):
+        with self.lock, self.conn:
+            if collection == "settings":
+                self.conn.execute("DELETE FROM settings")
+                self.conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?)",
+                                      [(k, json.dumps(v, ensure_ascii=False)) for k, v in records.items()])
+                return
+            self.conn.execute(f"DELETE FROM {collection}")
+            for record in records:
+                self._upsert(collection, record)
+
+    def reserve_sequence(self, name, count, seed):
+        """Atomically reserves `count` numbers from the named sequence (see JsonStorage)."""
+        with self.lock:
+            # IMMEDIATE takes the write lock up front so terminals sharing the
+            # database never hand out the same block.
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()
+                current = row[0] if row else seed()
+                self.conn.execute("INSERT INTO sequences (name, value) VALUES (?, ?) "
+                                  "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                                  (name, current + count))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return current + 1
+
+    def recover(self):
+        """SQLite rolls its own WAL forward or back when the database is opened; nothing to do."""
+        return {"temp_files": 0, "torn_lines": 0, "replayed": 0, "ms": 0.0}
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                              "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    def compact(self, states=None):
+        """Checkpoints the WAL back into the main database file."""
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def snapshot(self, target_dir, write_lock):
+        """
+        Consistent copy of the data directory for a backup.
+
+        The database is copied with SQLite's backup API from a separate
+        connection: in WAL mode that is a read transaction, so commits carry
+        on while it runs. Other files (the JSON data kept after migration)
+        are linked or copied as in JsonStorage.
+        """
+        db_name = os.path.basename(self.db_path)
+        os.makedirs(target_dir, exist_ok=True)
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(os.path.join(target_dir, db_name))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        with write_lock:
+            return 1 + snapshot_files(self.data_dir, target_dir,
+                                      skip={db_name, f"{db_name}-wal", f"{db_name}-shm", f"{db_name}-journal"})
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _delete(self, collection, key):
+        pk = COLLECTIONS[collection]
+        self.conn.execute(f"DELETE FROM {collection} WHERE {pk} = ?", (key,))
+
+    def _upsert(self, collection, record):
+        pk = COLLECTIONS[collection]
+        cols = [pk] + self.COLUMNS[collection] + ["data"]
+        values = [record.get(c) for c in cols[:-1]] + [json.dumps(record, ensure_ascii=False)]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols[1:])
+        self.conn.execute(
+            f"INSERT INTO {collection} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+            f"ON CONFLICT({pk}) DO UPDATE SET {updates}",
+            values)
+
+
+def migrate_json_to_sqlite(data_dir, storage=None):
+    """
+    One-time import of the legacy data/*.json files into the SQLite database.
+
+    The JSON data is left in place so the shop can roll back. Running it
+    again is a no-op once the `migrated_from_json` marker is set.
+
+    Returns:
+        dict: Number of records imported per collection (empty if already migrated).
+    """
+    own_storage = storage is None
+    storage = storage or SQLiteStorage(data_dir)
+    try:
+        if storage.get_meta("migrated_from_json"):
+            return {}
+
+        source = JsonStorage(data_dir)
+        counts = {}
+        with storage.lock, storage.conn:
+            for collection in list(COLLECTIONS) + ["settings"]:
+                if not source.exists(collection):
+                    continue
+                records = source.load(collection)
+                if collection == "settings":
+                    storage.conn.execute("DELETE FROM settings")
+                    storage.conn.executemany(
+                        "INSERT INTO settings (key, value) VALUES (?, ?)",
+                        [(k, json.dumps(v, ensure_ascii=False)) for k, v in records.items()])
+                else:
+                    pk = COLLECTIONS[collection]
+                    for record in records:
+                        if record.get(pk) is None:
+                            continue
+                        storage._upsert(collection, record)
+                counts[collection] = len(records)
+            storage.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+        print(f"Migrated JSON data into {storage.db_path}: {counts}")
+        return counts
+    finally:
+        if own_storage:
+            storage.close()
+
+
+def create_storage(data_dir, engine=None):
+    """
+    Returns the storage backend for `data_dir`.
+
+    Args:
+        engine (str, optional): "json" or "sqlite". When omitted, SQLite is used
+            if a database already exists in the data directory, JSON otherwise.
+    """
+    if engine is None:
+        engine = "sqlite" if os.path.exists(os.path.join(data_dir, SQLITE_DB_NAME)) else "json"
+    if engine == "sqlite":
+        storage = SQLiteStorage(data_dir)
+        migrate_json_to_sqlite(data_dir, storage)
+        return storage
+    if engine == "json":
+        return JsonStorage(data_dir)
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+
+if __name__ == '__main__':
+    # One-time migration of the live data directory to SQLite.
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    print("--- Migrating JSON data to SQLite ---")
+    result = migrate_json_to_sqlite(target)
+    print(result or "Already migrated.")
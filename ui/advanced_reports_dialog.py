@@ -1,9 +1,10 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QTabWidget, QWidget, 
-                             QHBoxLayout, QPushButton, QLabel, QTableWidget, 
-                             QDateEdit, QSpinBox, QComboBox, QFrame, QTableWidgetItem)
+                             QHBoxLayout, QPushButton, QLabel, 
+                             QDateEdit, QSpinBox, QComboBox, QFrame)
 from PySide6.QtCore import QDate, Qt
 from components.style_engine import Colors, StyleEngine
 from components.chart_widget import SalesChart
+from components.record_table_model import Column, RecordTableView
 
 class AdvancedReportsDialog(QDialog):
     def __init__(self, db, parent=None):
@@ -98,8 +99,14 @@ class AdvancedReportsDialog(QDialog):
         
         # Content Split (Table + Placeholder for chart)
         content = QHBoxLayout()
-        self.daily_table = QTableWidget(0, 4)
-        self.daily_table.setHorizontalHeaderLabels(["التاريخ", "العمليات", "الإجمالي", "رقم الفاتورة"])
+        # Headers: Invoice #, Date, Items Count, Total, Payment
+        self.daily_table = RecordTableView([
+            Column("رقم الفاتورة", lambda s: str(s.get('invoice_number') or s['id'])),
+            Column("التوقيت", lambda s: s['timestamp'].replace('T', ' ').split('.')[0], sort_key=lambda s: s['timestamp']),
+            Column("عدد الأصناف", lambda s: str(len(s['items'])), sort_key=lambda s: len(s['items'])),
+            Column("الإجمالي", lambda s: f"{s['total_amount']:.2f}", sort_key=lambda s: s['total_amount']),
+            Column("الدفع", lambda s: s.get('payment_method', 'N/A')),
+        ])
         self.daily_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.daily_table.customContextMenuRequested.connect(self.show_context_menu)
         content.addWidget(self.daily_table, 1)
@@ -117,8 +124,13 @@ class AdvancedReportsDialog(QDialog):
         layout = QVBoxLayout(tab)
         layout.setContentsMargins(25, 25, 25, 25)
         
-        self.top_table = QTableWidget(0, 4)
-        self.top_table.setHorizontalHeaderLabels(["الصنف", "الكمية المباعة", "الإيرادات", "النسبة"])
+        self.top_total_rev = 0.0
+        self.top_table = RecordTableView([
+            Column("الصنف", lambda p: p['name']),
+            Column("الكمية المباعة", lambda p: str(p['qty']), sort_key=lambda p: p['qty']),
+            Column("الإيرادات", lambda p: f"{p['rev']:.2f}", sort_key=lambda p: p['rev']),
+            Column("النسبة", self.format_share, sort_key=lambda p: p['rev']),
+        ], key_field='name')
         layout.addWidget(self.top_table)
         
         self.refresh_top_products()
@@ -135,24 +147,8 @@ class AdvancedReportsDialog(QDialog):
             chart_data[d] = chart_data.get(d, 0) + s['total_amount']
         self.chart.set_data(chart_data)
 
-        self.daily_table.setRowCount(0)
-        # Headers: Invoice #, Date, Items Count, Total, Payment
-        self.daily_table.setColumnCount(5)
-        self.daily_table.setHorizontalHeaderLabels([
-             "رقم الفاتورة", "التوقيت", "عدد الأصناف", "الإجمالي", "الدفع"
-        ])
-        
-        for s in reversed(sales):
-            row = self.daily_table.rowCount()
-            self.daily_table.insertRow(row)
-            self.daily_table.setItem(row, 0, QTableWidgetItem(s.get('invoice_number', 'N/A')))
-            t_str = s['timestamp'].replace('T', ' ').split('.')[0]
-            self.daily_table.setItem(row, 1, QTableWidgetItem(t_str))
-            self.daily_table.setItem(row, 2, QTableWidgetItem(str(len(s['items']))))
-            self.daily_table.setItem(row, 3, QTableWidgetItem(f"{s['total_amount']:.2f}"))
-            self.daily_table.setItem(row, 4, QTableWidgetItem(s.get('payment_method', 'N/A')))
-            # Store full sale object in item data for printing
-            self.daily_table.item(row, 0).setData(Qt.UserRole, s)
+        # Newest first; the model keeps the full sale object for printing
+        self.daily_table.set_records(reversed(sales))
 
     def show_context_menu(self, pos):
         from PySide6.QtWidgets import QMenu
@@ -163,38 +159,18 @@ class AdvancedReportsDialog(QDialog):
             self.print_selected_invoice()
 
     def print_selected_invoice(self):
-        row = self.daily_table.currentRow()
-        if row < 0: return
-        sale_data = self.daily_table.item(row, 0).data(Qt.UserRole)
+        sale_data = self.daily_table.current_record()
         if sale_data:
-            from invoice_manager import InvoiceManager
             mw = self.parent()
-            if hasattr(mw, 'settings'):
-                mgr = InvoiceManager(self.db)
-                path = mgr.generate_pdf_invoice(sale_data, mw.settings)
-                if path:
-                    from PySide6.QtWidgets import QMessageBox
-                    QMessageBox.information(self, "تم", f"تم إعادة إصدار الفاتورة:\n{path}")
+            if hasattr(mw, 'reprint_receipt'):
+                mw.reprint_receipt(sale_data)
 
     def refresh_top_products(self):
-        sales = self.db.get_sales()
-        prod_stats = {}
-        for s in sales:
-            for item in s['items']:
-                pid = item['product_id']
-                if pid not in prod_stats: prod_stats[pid] = {'name': item['name'], 'qty': 0, 'rev': 0.0}
-                prod_stats[pid]['qty'] += item['quantity']
-                prod_stats[pid]['rev'] += item['total']
-        
+        prod_stats = self.db.get_sales_summary()['products']
         sorted_stats = sorted(prod_stats.values(), key=lambda x: x['rev'], reverse=True)
-        total_rev = sum(p['rev'] for p in sorted_stats)
-        
-        self.top_table.setRowCount(0)
-        for p in sorted_stats[:20]:
-            row = self.top_table.rowCount()
-            self.top_table.insertRow(row)
-            self.top_table.setItem(row, 0, QTableWidgetItem(p['name']))
-            self.top_table.setItem(row, 1, QTableWidgetItem(str(p['qty'])))
-            self.top_table.setItem(row, 2, QTableWidgetItem(f"{p['rev']:.2f}"))
-            perc = (p['rev'] / total_rev * 100) if total_rev > 0 else 0
-            self.top_table.setItem(row, 3, QTableWidgetItem(f"{perc:.1f}%"))
+        self.top_total_rev = sum(p['rev'] for p in sorted_stats)
+        self.top_table.set_records(sorted_stats[:20])
+
+    def format_share(self, p):
+        perc = (p['rev'] / self.top_total_rev * 100) if self.top_total_rev > 0 else 0
+        return f"{perc:.1f}%"
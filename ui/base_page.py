@@ -1,11 +1,15 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QScrollArea
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from components.style_engine import Colors, StyleEngine
+from event_bus import DATA_RELOADED
 
 class BasePage(QWidget):
     def __init__(self, main_window, title="", subtitle=""):
         super().__init__()
         self.main_window = main_window
+        # Nothing rendered yet: the first time the page is shown it refreshes
+        self.dirty = True
+        self._refresh_queued = False
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(30, 30, 30, 30)
         self.layout.setSpacing(20)
@@ -59,3 +63,29 @@ class BasePage(QWidget):
 
     def add_layout(self, layout):
         self.content_layout.addLayout(layout)
+
+    # --- Change tracking ---
+    def watch(self, *kinds):
+        """Subscribes `on_change` to the given DataManager event kinds (and to full reloads)."""
+        for kind in kinds + (DATA_RELOADED,):
+            self.main_window.db.events.subscribe(kind, self.on_change)
+
+    def on_change(self, event):
+        """Default reaction to a change: re-render, now if on screen, else when next shown."""
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        self.dirty = True
+        if self.isVisible() and not self._refresh_queued:
+            # One refresh per burst of events, after the action that caused them returns
+            self._refresh_queued = True
+            QTimer.singleShot(0, self.refresh_if_dirty)
+
+    def refresh_if_dirty(self):
+        self._refresh_queued = False
+        if self.dirty:
+            self.dirty = False
+            self.refresh()
+
+    def refresh(self):
+        pass
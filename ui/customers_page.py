@@ -1,7 +1,9 @@
-from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QHeaderView, QTableWidgetItem
+from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit
 import qtawesome as qta
 from ui.base_page import BasePage
 from components.style_engine import Colors
+from components.record_table_model import Column, RecordTableView
+from event_bus import CUSTOMER_CHANGED, CUSTOMER_DEBT_CHANGED
 
 class CustomersPage(BasePage):
     def __init__(self, main_window):
@@ -9,6 +11,7 @@ class CustomersPage(BasePage):
         subtitle = "إدارة علاقات العملاء، الديون، والمستحقات"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(CUSTOMER_CHANGED, CUSTOMER_DEBT_CHANGED)
 
     def setup_ui(self):
         # Actions Row
@@ -27,26 +30,33 @@ class CustomersPage(BasePage):
         self.debt_btn.setFixedWidth(180)
         self.debt_btn.clicked.connect(self.main_window.collect_debt_dialog)
         
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("تصفية العملاء بالاسم أو الهاتف...")
+        self.filter_input.setObjectName("searchField")
+        
+        actions_layout.addWidget(self.filter_input)
         actions_layout.addStretch()
         actions_layout.addWidget(self.debt_btn)
         actions_layout.addWidget(self.add_btn)
         self.add_layout(actions_layout)
         
         # Table
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["الاسم", "رقم الهاتف", "الدين الحالي", "تاريخ الانضمام"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table = RecordTableView([
+            Column("الاسم", lambda c: c['name']),
+            Column("رقم الهاتف", lambda c: c['phone']),
+            Column("الدين الحالي", lambda c: f"{c['debt']:.2f}", sort_key=lambda c: c['debt'],
+                   color=lambda c: Colors.DANGER if c['debt'] > 0 else None),
+            Column("تاريخ الانضمام", lambda c: c['created_at'][:10]),
+        ])
+        self.table.doubleClicked.connect(self.main_window.edit_customer_dialog)
+        self.filter_input.textChanged.connect(self.table.proxy.set_filter_text)
         self.add_widget(self.table)
 
+    def on_change(self, event):
+        if event.kind == CUSTOMER_DEBT_CHANGED:
+            self.table.source.update_record(event.record)
+        else:
+            self.mark_dirty()
+
     def refresh(self):
-        customers = self.main_window.db.get_customers()
-        self.table.setRowCount(0)
-        for c in customers:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(c['name']))
-            self.table.setItem(row, 1, QTableWidgetItem(c['phone']))
-            self.table.setItem(row, 2, QTableWidgetItem(f"{c['debt']:.2f}"))
-            self.table.setItem(row, 3, QTableWidgetItem(c['created_at'][:10]))
+        self.table.set_records(self.main_window.db.get_customers())
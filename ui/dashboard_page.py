@@ -4,6 +4,7 @@ from PySide6.QtGui import QColor, QBrush
 from ui.base_page import BasePage
 from components.stats_card import StatsCard
 from components.style_engine import Colors
+from event_bus import PRODUCT_CHANGED, SALE_ADDED, SALE_DELETED, SETTINGS_CHANGED, STOCK_CHANGED
 
 class DashboardPage(BasePage):
     def __init__(self, main_window):
@@ -11,6 +12,7 @@ class DashboardPage(BasePage):
         subtitle = "نظرة عامة على أداء المنظومة اليوم"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(SALE_ADDED, SALE_DELETED, PRODUCT_CHANGED, STOCK_CHANGED, SETTINGS_CHANGED)
         
     def setup_ui(self):
         # Stats Row
@@ -1,7 +1,9 @@
-from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QHeaderView, QTableWidgetItem
+from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit
 import qtawesome as qta
 from ui.base_page import BasePage
 from components.style_engine import Colors
+from components.record_table_model import Column, RecordTableView
+from event_bus import PRODUCT_CHANGED, STOCK_CHANGED
 
 class InventoryPage(BasePage):
     def __init__(self, main_window):
@@ -9,6 +11,7 @@ class InventoryPage(BasePage):
         subtitle = "إدارة المنتجات، المخزون، والأسعار"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(PRODUCT_CHANGED, STOCK_CHANGED)
 
     def setup_ui(self):
         # Actions Row
@@ -19,27 +22,33 @@ class InventoryPage(BasePage):
         self.add_btn.setFixedWidth(200)
         self.add_btn.clicked.connect(self.main_window.add_product_dialog)
         
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("تصفية الأصناف...")
+        self.filter_input.setObjectName("searchField")
+        
+        actions_layout.addWidget(self.filter_input)
         actions_layout.addStretch()
         actions_layout.addWidget(self.add_btn)
         self.add_layout(actions_layout)
         
         # Table
-        self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(["ID", "اسم الصنف", "الماركة", "السعر", "الكمية"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.itemDoubleClicked.connect(self.main_window.edit_product_dialog)
+        self.table = RecordTableView([
+            Column("ID", lambda p: p['id']),
+            Column("اسم الصنف", lambda p: p['name']),
+            Column("الماركة", lambda p: p.get('brand', '-')),
+            Column("السعر", lambda p: f"{p['price']:.2f}", sort_key=lambda p: p['price']),
+            Column("الكمية", lambda p: str(p['stock']), sort_key=lambda p: p['stock']),
+        ])
+        self.table.doubleClicked.connect(self.main_window.edit_product_dialog)
+        self.filter_input.textChanged.connect(self.table.proxy.set_filter_text)
         self.add_widget(self.table)
 
+    def on_change(self, event):
+        if event.kind == STOCK_CHANGED:
+            # Same product dict the table holds: repaint its row, no reload
+            self.table.source.update_record(event.record)
+        else:
+            self.mark_dirty()
+
     def refresh(self):
-        products = self.main_window.db.get_products()
-        self.table.setRowCount(0)
-        for p in products:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(p['id']))
-            self.table.setItem(row, 1, QTableWidgetItem(p['name']))
-            self.table.setItem(row, 2, QTableWidgetItem(p.get('brand', '-')))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{p['price']:.2f}"))
-            self.table.setItem(row, 4, QTableWidgetItem(str(p['stock'])))
+        self.table.set_records(self.main_window.db.get_products())
@@ -0,0 +1,181 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QPushButton,
+                             QDateEdit, QComboBox, QProgressBar, QFileDialog, QMessageBox)
+from PySide6.QtCore import QDate, Qt
+from components.job_queue import JobQueue
+
+class InvoiceExportDialog(QDialog):
+    """
+    Exports a range of invoices (by dates, shift or customer) to one merged
+    PDF or a zip. The export runs on a background job, so the window stays
+    responsive and the user can cancel it.
+    """
+
+    def __init__(self, main_window, parent=None):
+        super().__init__(parent)
+        self.main_window = main_window
+        self.db = main_window.db
+        self.job_id = None
+        self.cancel_requested = False
+        self.jobs = JobQueue(parent=self)
+        self.jobs.progress.connect(self.on_progress)
+        self.jobs.finished.connect(self.on_finished)
+        self.jobs.failed.connect(self.on_failed)
+        self.setWindowTitle("تصدير الفواتير")
+        self.setMinimumWidth(450)
+        self.setLayoutDirection(Qt.RightToLeft)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 25, 25, 25)
+
+        header = QLabel("تصدير مجموعة فواتير")
+        header.setObjectName("sectionHeader")
+        layout.addWidget(header)
+
+        form = QFormLayout()
+        form.setSpacing(12)
+
+        self.start_date = QDateEdit()
+        self.start_date.setCalendarPopup(True)
+        self.start_date.setDate(QDate.currentDate().addMonths(-1))
+        self.end_date = QDateEdit()
+        self.end_date.setCalendarPopup(True)
+        self.end_date.setDate(QDate.currentDate())
+        form.addRow("من:", self.start_date)
+        form.addRow("إلى:", self.end_date)
+
+        # A chosen shift replaces the date range
+        self.shift_combo = QComboBox()
+        self.shift_combo.addItem("كل الورديات", None)
+        for shift in sorted(self.db.get_shifts(), key=lambda s: s.get('start_time', ''), reverse=True):
+            start = str(shift.get('start_time', '')).replace('T', ' ')[:16]
+            self.shift_combo.addItem(f"{shift.get('username', '')} - {start}", shift['id'])
+        self.shift_combo.currentIndexChanged.connect(self.update_date_inputs)
+        form.addRow("الوردية:", self.shift_combo)
+
+        self.customer_combo = QComboBox()
+        self.customer_combo.addItem("كل العملاء", None)
+        for customer in self.db.get_customers():
+            self.customer_combo.addItem(customer['name'], customer['id'])
+        form.addRow("العميل:", self.customer_combo)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("ملف PDF واحد", "pdf")
+        self.format_combo.addItem("ملف مضغوط ZIP (فاتورة لكل ملف)", "zip")
+        form.addRow("الصيغة:", self.format_combo)
+        layout.addLayout(form)
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.setVisible(False)
+        layout.addWidget(self.progress)
+
+        self.status_lbl = QLabel("")
+        self.status_lbl.setObjectName("subtitleLabel")
+        layout.addWidget(self.status_lbl)
+
+        btns = QHBoxLayout()
+        self.export_btn = QPushButton("تصدير")
+        self.export_btn.setObjectName("posButton")
+        self.export_btn.setFixedHeight(40)
+        self.export_btn.clicked.connect(self.start_export)
+        self.cancel_btn = QPushButton("إغلاق")
+        self.cancel_btn.setObjectName("secondaryButton")
+        self.cancel_btn.setFixedHeight(40)
+        self.cancel_btn.clicked.connect(self.cancel_or_close)
+        btns.addWidget(self.export_btn)
+        btns.addWidget(self.cancel_btn)
+        layout.addLayout(btns)
+
+    def update_date_inputs(self):
+        by_shift = self.shift_combo.currentData() is not None
+        self.start_date.setEnabled(not by_shift)
+        self.end_date.setEnabled(not by_shift)
+
+    def start_export(self):
+        shift_id = self.shift_combo.currentData()
+        start = end = None
+        if shift_id is None:
+            start = self.start_date.date().toPython()
+            end = self.end_date.date().toPython()
+            if start > end:
+                QMessageBox.warning(self, "خطأ", "تاريخ البداية بعد تاريخ النهاية")
+                return
+        sales = self.main_window.invoice_mgr.select_invoices(start, end, shift_id, self.customer_combo.currentData())
+        if not sales:
+            QMessageBox.information(self, "تنبيه", "لا توجد فواتير مطابقة للتصدير")
+            return
+        # Looked up here: the export job must not touch the data manager
+        customers = {}
+        for cid in {s['customer_id'] for s in sales if s.get('customer_id')}:
+            customer = self.db.get_customer_by_id(cid)
+            if customer:
+                customers[cid] = dict(customer)
+
+        fmt = self.format_combo.currentData()
+        name = f"invoices_{sales[0]['timestamp'][:10]}_{sales[-1]['timestamp'][:10]}.{fmt}"
+        file_filter = "PDF (*.pdf)" if fmt == "pdf" else "ZIP (*.zip)"
+        path, _ = QFileDialog.getSaveFileName(self, "حفظ الفواتير", name, file_filter)
+        if not path:
+            return
+
+        self.cancel_requested = False
+        self.set_running(True)
+        self.status_lbl.setText(f"جاري تصدير {len(sales)} فاتورة...")
+        self.job_id = self.jobs.submit("تصدير الفواتير", self.run_export, sales, customers,
+                                     dict(self.main_window.settings), path, fmt)
+
+    def run_export(self, progress, sales, customers, settings, path, fmt):
+        # Runs on the job thread; the render work itself runs on worker processes
+        return self.main_window.invoice_mgr.export_invoices(sales, customers, settings, path, fmt, progress=progress,
+                                                            cancelled=lambda: self.cancel_requested)
+
+    def set_running(self, running):
+        self.progress.setVisible(running)
+        self.progress.setValue(0)
+        self.export_btn.setEnabled(not running)
+        for widget in (self.start_date, self.end_date, self.shift_combo, self.customer_combo, self.format_combo):
+            widget.setEnabled(not running)
+        if not running:
+            self.update_date_inputs()
+        self.cancel_btn.setText("إلغاء" if running else "إغلاق")
+
+    def cancel_or_close(self):
+        if self.job_id is None:
+            self.reject()
+            return
+        self.cancel_requested = True
+        self.cancel_btn.setEnabled(False)
+        self.status_lbl.setText("جاري الإلغاء...")
+
+    def on_progress(self, job_id, percent):
+        if job_id == self.job_id:
+            self.progress.setValue(percent)
+
+    def on_finished(self, job_id, result):
+        if job_id != self.job_id:
+            return
+        self.job_id = None
+        self.cancel_btn.setEnabled(True)
+        self.set_running(False)
+        success, msg = result
+        self.status_lbl.setText(msg)
+        if success:
+            QMessageBox.information(self, "تم", msg)
+
+    def on_failed(self, job_id, error):
+        if job_id != self.job_id:
+            return
+        self.job_id = None
+        self.cancel_btn.setEnabled(True)
+        self.set_running(False)
+        self.status_lbl.setText("")
+        QMessageBox.warning(self, "خطأ", f"فشل تصدير الفواتير:\n{error}")
+
+    def reject(self):
+        # Closing mid-export cancels it and waits for the workers to stop
+        if self.job_id is not None:
+            self.cancel_requested = True
+        self.jobs.shutdown(wait=True)
+        super().reject()
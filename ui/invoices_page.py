@@ -1,18 +1,24 @@
-from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, 
-                             QHeaderView, QTableWidgetItem, QFrame, QLineEdit, QMenu, QMessageBox, QDialog)
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
+                             QFrame, QLineEdit, QMenu, QMessageBox, QDialog)
+from PySide6.QtCore import Qt, QTimer
 from ui.base_page import BasePage
 from components.style_engine import Colors
 from components.stats_card import StatsCard
+from components.record_table_model import Column, RecordTableView
+from event_bus import CUSTOMER_CHANGED, SALE_ADDED, SALE_DELETED, SETTINGS_CHANGED
 from datetime import datetime
 
+# Wait for a pause in typing before searching
+SEARCH_DELAY_MS = 200
 
 class InvoicesPage(BasePage):
     def __init__(self, main_window):
         title = "الفواتير"
         subtitle = "إدارة وسجل الفواتير السابقة"
         super().__init__(main_window, title, subtitle)
+        self.all_sales = []
         self.setup_ui()
+        self.watch(SALE_ADDED, SALE_DELETED, CUSTOMER_CHANGED, SETTINGS_CHANGED)
         
     def setup_ui(self):
         # Stats Row
@@ -32,11 +38,21 @@ class InvoicesPage(BasePage):
         # Search & Filter
         top_layout = QHBoxLayout()
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("بحث برقم الفاتورة أو اسم العميل...")
+        self.search_input.setPlaceholderText("بحث برقم الفاتورة، العميل، الهاتف، طريقة الدفع أو التاريخ...")
         self.search_input.setObjectName("searchField")
-        self.search_input.textChanged.connect(self.filter_invoices)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.filter_invoices)
+        # Every keystroke restarts the timer, so only the last query runs
+        self.search_input.textChanged.connect(self.search_timer.start)
         
         top_layout.addWidget(self.search_input)
+
+        export_btn = QPushButton("تصدير مجمّع")
+        export_btn.setObjectName("inventoryButton")
+        export_btn.clicked.connect(self.open_export_dialog)
+        top_layout.addWidget(export_btn)
         
         self.layout.addLayout(top_layout)
         
@@ -47,14 +63,16 @@ class InvoicesPage(BasePage):
         table_panel.setObjectName("statsCard")
         panel_layout = QVBoxLayout(table_panel)
         
-        headers = ["رقم الفاتورة", "التاريخ", "العميل", "القيمة", "طريقة الدفع"]
-        self.table = QTableWidget(0, len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setAlternatingRowColors(True)
-        self.table.verticalHeader().setVisible(False)
+        # Cells are formatted only when painted, so 50k invoices cost one list of references
+        self.table = RecordTableView([
+            Column("رقم الفاتورة", lambda s: str(s.get('invoice_number') or s['id'])),
+            Column("التاريخ", lambda s: s['timestamp'].replace('T', ' ').split('.')[0],
+                   sort_key=lambda s: s['timestamp']),
+            Column("العميل", self.customer_name),
+            Column("القيمة", lambda s: f"{s['total_amount']:.2f}",
+                   sort_key=lambda s: s['total_amount'], color=lambda s: Colors.SUCCESS),
+            Column("طريقة الدفع", lambda s: s.get('payment_method', 'N/A')),
+        ])
         self.table.setAlternatingRowColors(True)
         self.table.verticalHeader().setVisible(False)
         
@@ -66,12 +84,8 @@ class InvoicesPage(BasePage):
         self.layout.addWidget(table_panel)
         
     def show_context_menu(self, pos):
-        item = self.table.itemAt(pos)
-        if not item: return
-        
-        row = item.row()
-        # Retrieve Invoice Number from UserRole to avoid string parsing issues
-        inv_id = str(self.table.item(row, 0).data(Qt.UserRole))
+        sale = self.table.record_at(self.table.indexAt(pos))
+        if not sale: return
         
         menu = QMenu(self)
         print_action = menu.addAction("طباعة الفاتورة 🖨️")
@@ -79,104 +93,70 @@ class InvoicesPage(BasePage):
         
         action = menu.exec(self.table.viewport().mapToGlobal(pos))
         if action == print_action:
-            self.reprint_invoice(inv_id)
+            self.reprint_invoice(sale)
         elif action == delete_action:
-            self.confirm_delete_invoice(inv_id)
+            self.confirm_delete_invoice(sale)
 
-    def confirm_delete_invoice(self, inv_id):
+    def confirm_delete_invoice(self, sale):
+        inv_id = sale.get('invoice_number') or sale['id']
         reply = QMessageBox.question(self, "تأكيد الحذف", 
                                    f"هل أنت متأكد من حذف الفاتورة رقم {inv_id}؟\nسيتم إرجاع المنتجات للمخزون وتعديل حساب العميل.",
                                    QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            success, msg = self.main_window.db.delete_sale(inv_id)
+            success, msg = self.main_window.db.delete_sale(sale['id'])
             if success:
                 QMessageBox.information(self, "تم", msg)
-                self.refresh()
             else:
                 QMessageBox.warning(self, "خطأ", msg)
 
 
-    def reprint_invoice(self, inv_id):
+    def reprint_invoice(self, sale):
         try:
-            # Find sale data
-            sales = self.main_window.db.get_sales()
-            sale = next((s for s in sales if str(s.get('invoice_number')) == inv_id), None)
-            
-            if sale:
-                pdf = self.main_window.invoice_mgr.generate_pdf_invoice(sale, self.main_window.settings)
-                if pdf:
-                    self.main_window.invoice_mgr.print_invoice(pdf)
-                    QMessageBox.information(self, "تم", "تم إرسال الفاتورة للطباعة")
-                else:
-                    QMessageBox.warning(self, "فشل", "فشل إنشاء ملف PDF للفاتورة")
-            else:
-                QMessageBox.warning(self, "خطأ", "لم يتم العثور على بيانات الفاتورة")
+            self.main_window.reprint_receipt(sale)
         except Exception as e:
             QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء الطباعة:\n{str(e)}")
 
+    def open_export_dialog(self):
+        from ui.invoice_export_dialog import InvoiceExportDialog
+        InvoiceExportDialog(self.main_window, self).exec()
+
+    def on_change(self, event):
+        if event.kind == SALE_DELETED and not self.dirty:
+            # Drop the one row instead of re-reading every invoice
+            self.table.source.remove_record(event.key)
+            self.all_sales = [s for s in self.all_sales if s.get('id') != event.key]
+            self.update_stats()
+        else:
+            self.mark_dirty()
+
     def refresh(self):
-        sales = self.main_window.db.get_sales()
-        # Sort by date desc
-        sales.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        # Update Stats
-        count = len(sales)
-        total = sum(s['total_amount'] for s in sales)
+        # All invoices, newest first (the index returns a new list, never the cached one)
+        self.all_sales = self.main_window.db.search_sales("")
+        self.update_stats()
+        self.filter_invoices()
+
+    def update_stats(self):
+        count = len(self.all_sales)
+        total = sum(s['total_amount'] for s in self.all_sales)
         currency = self.main_window.settings.get('currency', 'LYD')
         
         self.stat_count.update_value(str(count))
         self.stat_total.update_value(f"{total:.2f} {currency}")
-        
-        self.all_sales = sales # Store for filtering
-        self.populate_table(sales)
 
-    def populate_table(self, sales_list):
-        self.table.setRowCount(0)
-        for s in sales_list:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            
-            inv_num = str(s.get('invoice_number', 'N/A'))
-            
-            # Helper cells
-            item_id = QTableWidgetItem(inv_num)
-            item_id.setData(Qt.UserRole, inv_num) # STORE DATA HERE
-            self.table.setItem(row, 0, item_id)
-            
-            ts = s['timestamp'].replace('T', ' ').split('.')[0]
-            self.table.setItem(row, 1, QTableWidgetItem(ts))
-            
-            cust_name = "زبون عام"
-            if s.get('customer_id'):
-                cust = next((c for c in self.main_window.db.get_customers() if c['id'] == s['customer_id']), None)
-                if cust: cust_name = cust['name']
-            
-            self.table.setItem(row, 2, QTableWidgetItem(cust_name))
-            
-            amount_item = QTableWidgetItem(f"{s['total_amount']:.2f}")
-            amount_item.setForeground(Qt.green) # Make price green
-            self.table.setItem(row, 3, amount_item)
-            
-            self.table.setItem(row, 4, QTableWidgetItem(s.get('payment_method', 'N/A')))
+    def customer_name(self, sale):
+        if sale.get('customer_id'):
+            cust = self.main_window.db.get_customer_by_id(sale['customer_id'])
+            if cust: return cust['name']
+        return "زبون عام"
 
     def filter_invoices(self):
-        query = self.search_input.text().lower()
         if not hasattr(self, 'all_sales'): return
+        query = self.search_input.text().strip()
         
         if not query:
-            self.populate_table(self.all_sales)
+            self.table.set_records(self.all_sales)
             return
-            
-        filtered = []
-        for s in self.all_sales:
-            inv_no = str(s.get('invoice_number', '')).lower()
-            cust_name = ""
-            if s.get('customer_id'):
-                cust = next((c for c in self.main_window.db.get_customers() if c['id'] == s['customer_id']), None)
-                if cust: cust_name = cust['name'].lower()
-                
-            if query in inv_no or query in cust_name:
-                filtered.append(s)
-        
-        self.populate_table(filtered)
+        
+        # Token index: invoice no, customer name/phone, payment method, date
+        self.table.set_records(self.main_window.db.search_sales(query))
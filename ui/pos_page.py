@@ -1,8 +1,11 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QLineEdit, QTableWidget, QTableWidgetItem, QHeaderView, QPushButton, QSizePolicy, QGridLayout
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QLineEdit, QPushButton, QSizePolicy, QGridLayout
 from PySide6.QtCore import Qt, QSize
 import qtawesome as qta
 from ui.base_page import BasePage
 from components.style_engine import Colors, StyleEngine
+from components.barcode_scanner import BarcodeScanDetector
+from components.record_table_model import Column, RecordTableView
+from event_bus import PRODUCT_CHANGED, STOCK_CHANGED
 
 class POSPage(BasePage):
     def __init__(self, main_window):
@@ -10,6 +13,7 @@ class POSPage(BasePage):
         subtitle = "نظام البيع السريع وإدارة الفواتير"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(PRODUCT_CHANGED, STOCK_CHANGED)
 
     def setup_ui(self):
         main_h_layout = QHBoxLayout()
@@ -22,17 +26,21 @@ class POSPage(BasePage):
         
         search_box = QHBoxLayout()
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("🔎 بحث عن صنف...")
-        self.search_input.textChanged.connect(self.main_window.search_pos_products)
+        self.search_input.setPlaceholderText("🔎 بحث عن صنف أو مسح الباركود...")
+        # Scanner bursts go straight to the cart; typed text is searched after a short pause
+        self.scanner = BarcodeScanDetector(self.search_input)
+        self.scanner.search_requested.connect(lambda _: self.main_window.search_pos_products())
+        self.scanner.scanned.connect(self.main_window.scan_barcode)
+        self.scanner.submitted.connect(self.main_window.submit_pos_search)
         search_box.addWidget(self.search_input)
         col1_layout.addLayout(search_box)
         
-        self.products_table = QTableWidget(0, 3)
-        self.products_table.setHorizontalHeaderLabels(["الصنف", "السعر", "المخزون"])
-        self.products_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.products_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.products_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.products_table.itemDoubleClicked.connect(self.main_window.add_to_cart)
+        self.products_table = RecordTableView([
+            Column("الصنف", lambda p: p['name']),
+            Column("السعر", lambda p: f"{p['price']:.2f}", sort_key=lambda p: p['price']),
+            Column("المخزون", lambda p: str(p['stock']), sort_key=lambda p: p['stock']),
+        ])
+        self.products_table.doubleClicked.connect(self.main_window.add_to_cart)
         col1_layout.addWidget(self.products_table)
         
         main_h_layout.addWidget(col1, 3)
@@ -46,9 +54,11 @@ class POSPage(BasePage):
         cart_header.setObjectName("sectionHeader")
         col2_layout.addWidget(cart_header)
         
-        self.cart_table = QTableWidget(0, 3)
-        self.cart_table.setHorizontalHeaderLabels(["الصنف", "الكمية", "الإجمالي"])
-        self.cart_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.cart_table = RecordTableView([
+            Column("الصنف", lambda i: i['name']),
+            Column("الكمية", lambda i: str(i['quantity']), sort_key=lambda i: i['quantity']),
+            Column("الإجمالي", lambda i: f"{i['total']:.2f}", sort_key=lambda i: i['total']),
+        ], key_field='product_id', sortable=False)
         col2_layout.addWidget(self.cart_table)
         
         self.total_label = QLabel("الإجمالي: 0.00 LYD")
@@ -97,7 +107,13 @@ class POSPage(BasePage):
         
         self.add_layout(main_h_layout)
 
+    def on_change(self, event):
+        if event.kind == STOCK_CHANGED:
+            # After a checkout only the sold rows repaint; the results stay as they are
+            self.products_table.source.update_record(event.record)
+        else:
+            self.mark_dirty()
+
     def refresh(self):
-        # We'll call the search method which populates the table
-        pass
+        self.main_window.search_pos_products()
         pass
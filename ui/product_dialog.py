@@ -61,6 +61,10 @@ class ProductDialog(QDialog):
         
         self.barcode_input = QLineEdit()
         self.barcode_input.setPlaceholderText("الباركود العالمي...")
+
+        # Multi-pack codes, e.g. "6221234567890:10" for a carton of 10
+        self.pack_barcodes_input = QLineEdit()
+        self.pack_barcodes_input.setPlaceholderText("باركود:عدد الوحدات، ...")
         
         form.addRow("اسم الصنف:", self.name_input)
         form.addRow("الماركة:", self.brand_input)
@@ -68,6 +72,7 @@ class ProductDialog(QDialog):
         form.addRow("الكمية بالمخزن:", self.stock_input)
         form.addRow("حد التنبيه (الأدنى):", self.min_stock_input)
         form.addRow("كود الباركود:", self.barcode_input)
+        form.addRow("باركود العبوات:", self.pack_barcodes_input)
         
         content_layout.addLayout(form)
         
@@ -111,12 +116,25 @@ class ProductDialog(QDialog):
             self.stock_input.setValue(self.product_data.get('stock', 0))
             self.min_stock_input.setValue(self.product_data.get('min_stock', 10))
             self.barcode_input.setText(self.product_data.get('barcode', ''))
+            packs = self.product_data.get('pack_barcodes') or []
+            self.pack_barcodes_input.setText(", ".join(f"{p['code']}:{p.get('units', 1)}" for p in packs))
 
     def delete_product(self):
         reply = QMessageBox.question(self, "تأكيد الحذف", "هل أنت متأكد من حذف هذا المنتج نهائياً؟", QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
             self.done(2)
 
+    def parse_pack_barcodes(self):
+        packs = []
+        for entry in self.pack_barcodes_input.text().replace("،", ",").split(","):
+            code, _, units = entry.strip().partition(":")
+            if code.strip():
+                try:
+                    packs.append({"code": code.strip(), "units": max(int(units or 1), 1)})
+                except ValueError:
+                    continue
+        return packs
+
     def get_data(self):
         data = {
             "name": self.name_input.text(),
@@ -124,7 +142,8 @@ class ProductDialog(QDialog):
             "price": self.price_input.value(),
             "stock": self.stock_input.value(),
             "min_stock": self.min_stock_input.value(),
-            "barcode": self.barcode_input.text()
+            "barcode": self.barcode_input.text().strip(),
+            "pack_barcodes": self.parse_pack_barcodes()
         }
         if self.is_edit_mode and self.product_data:
             data['id'] = self.product_data['id']
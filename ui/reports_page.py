@@ -1,9 +1,12 @@
-from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFrame, QTableWidget, QTableWidgetItem, QHeaderView
+from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFrame
 import qtawesome as qta
 from PySide6.QtCore import Qt
 from datetime import datetime
 from ui.base_page import BasePage
 from components.style_engine import Colors
+from components.record_table_model import Column, RecordTableView
+from event_bus import (CUSTOMER_CHANGED, CUSTOMER_DEBT_CHANGED, SALE_ADDED, SALE_DELETED,
+                       SETTINGS_CHANGED, SHIFT_CLOSED, SHIFT_OPENED)
 
 class ReportsPage(BasePage):
     def __init__(self, main_window):
@@ -11,6 +14,8 @@ class ReportsPage(BasePage):
         subtitle = "تقارير المبيعات، الفواتير، والتحليلات المتقدمة"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(SALE_ADDED, SALE_DELETED, CUSTOMER_CHANGED, CUSTOMER_DEBT_CHANGED,
+                   SHIFT_OPENED, SHIFT_CLOSED, SETTINGS_CHANGED)
 
     def setup_ui(self):
         # Top Section: Financial Summary
@@ -74,14 +79,11 @@ class ReportsPage(BasePage):
         self.add_layout(actions_layout)
         
         # Bottom Section: Top Products Summary (Compact)
-        self.top_summary_table = QTableWidget(0, 2)
-        self.top_summary_table.setHorizontalHeaderLabels([
-            self.main_window.lang.get_text("top_selling"),
-            self.main_window.lang.get_text("revenue")
-        ])
-        self.top_summary_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.top_summary_table = RecordTableView([
+            Column(self.main_window.lang.get_text("top_selling"), lambda p: p['name']),
+            Column(self.main_window.lang.get_text("revenue"), lambda p: f"{p['rev']:.2f}", sort_key=lambda p: p['rev']),
+        ], key_field='name')
         self.top_summary_table.setFixedHeight(200)
-        self.top_summary_table.setEditTriggers(QTableWidget.NoEditTriggers)
         
         self.add_widget(self.top_summary_table)
 
@@ -90,20 +92,22 @@ class ReportsPage(BasePage):
         shift_header.setObjectName("sectionHeader")
         self.add_widget(shift_header)
         
-        self.shift_history_table = QTableWidget(0, 5)
-        self.shift_history_table.setHorizontalHeaderLabels([
-            "الموظف", "البدء", "الإغلاق", "النقد الافتتاحي", "المبيعات"
+        self.shift_history_table = RecordTableView([
+            Column("الموظف", lambda s: s['username']),
+            Column("البدء", lambda s: self.format_time(s['start_time']), sort_key=lambda s: s['start_time']),
+            Column("الإغلاق", lambda s: self.format_time(s['end_time']), sort_key=lambda s: s['end_time'] or ""),
+            Column("النقد الافتتاحي", lambda s: f"{s.get('start_cash', 0):.2f}", sort_key=lambda s: s.get('start_cash', 0)),
+            Column("المبيعات", lambda s: f"{s.get('total_sales', 0):.2f}", sort_key=lambda s: s.get('total_sales', 0)),
         ])
-        self.shift_history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.shift_history_table.setFixedHeight(200)
-        self.shift_history_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.add_widget(self.shift_history_table)
         
         self.layout.addStretch()
 
     def refresh(self):
-        sales = self.main_window.db.get_sales()
-        total_rev = sum(s['total_amount'] for s in sales)
+        # Totals come from the per-year summaries, so closed years stay unloaded
+        summary = self.main_window.db.get_sales_summary()
+        total_rev = summary['total']
         
         customers = self.main_window.db.get_customers()
         total_debt = sum(c['debt'] for c in customers)
@@ -114,35 +118,12 @@ class ReportsPage(BasePage):
         self.total_debt_lbl.setText(f"{self.main_window.lang.get_text('total_debt')}: {total_debt:.2f} {currency}")
         
         # Top 5 products
-        prod_stats = {}
-        for s in sales:
-            for item in s['items']:
-                pid = item['product_id']
-                if pid not in prod_stats: prod_stats[pid] = {'name': item['name'], 'rev': 0.0}
-                prod_stats[pid]['rev'] += item['total']
-        
-        sorted_stats = sorted(prod_stats.values(), key=lambda x: x['rev'], reverse=True)
-        self.top_summary_table.setRowCount(0)
-        for p in sorted_stats[:5]:
-            row = self.top_summary_table.rowCount()
-            self.top_summary_table.insertRow(row)
-            self.top_summary_table.setItem(row, 0, QTableWidgetItem(p['name']))
-            self.top_summary_table.setItem(row, 1, QTableWidgetItem(f"{p['rev']:.2f}"))
+        sorted_stats = sorted(summary['products'].values(), key=lambda x: x['rev'], reverse=True)
+        self.top_summary_table.set_records(sorted_stats[:5])
 
-        # Populate Shift History
+        # Populate Shift History (closed shifts, newest first)
         shifts = self.main_window.db.get_shifts()
-        self.shift_history_table.setRowCount(0)
-        for s in reversed(shifts):
-            if s['status'] == 'closed':
-                row = self.shift_history_table.rowCount()
-                self.shift_history_table.insertRow(row)
-                self.shift_history_table.setItem(row, 0, QTableWidgetItem(s['username']))
-                
-                # Format times
-                start = datetime.fromisoformat(s['start_time']).strftime("%Y-%m-%d %H:%M")
-                end = datetime.fromisoformat(s['end_time']).strftime("%Y-%m-%d %H:%M") if s['end_time'] else "-"
-                
-                self.shift_history_table.setItem(row, 1, QTableWidgetItem(start))
-                self.shift_history_table.setItem(row, 2, QTableWidgetItem(end))
-                self.shift_history_table.setItem(row, 3, QTableWidgetItem(f"{s.get('start_cash', 0):.2f}"))
-                self.shift_history_table.setItem(row, 4, QTableWidgetItem(f"{s.get('total_sales', 0):.2f}"))
+        self.shift_history_table.set_records([s for s in reversed(shifts) if s['status'] == 'closed'])
+
+    def format_time(self, iso):
+        return datetime.fromisoformat(iso).strftime("%Y-%m-%d %H:%M") if iso else "-"
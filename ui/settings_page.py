@@ -4,6 +4,9 @@ from PySide6.QtCore import Qt
 from ui.base_page import BasePage
 from components.style_engine import Colors
 
+# Setting that holds the target of each receipt sink (the default printer needs none)
+PRINT_TARGET_KEYS = {"directory": "print_dir", "device": "print_device", "network": "print_address"}
+
 class SettingsPage(BasePage):
     def __init__(self, main_window):
         title = main_window.lang.get_text("settings")
@@ -93,8 +96,39 @@ class SettingsPage(BasePage):
         self.auto_print_chk.setChecked(self.main_window.settings.get('auto_print', False))
         self.auto_print_chk.toggled.connect(self.update_auto_print_setting)
         
+        # Thermal printers take ESC/POS directly: no PDF, no OS print dialog
+        self.escpos_chk = QCheckBox("طباعة حرارية مباشرة (ESC/POS) بدلاً من PDF")
+        self.escpos_chk.setChecked(self.main_window.settings.get('receipt_format') == "escpos")
+        self.escpos_chk.toggled.connect(self.update_receipt_format_setting)
+
+        # Where receipts go
+        self.print_sink_combo = QComboBox()
+        self.print_sink_combo.addItem("الطابعة الافتراضية", "printer")
+        self.print_sink_combo.addItem("حفظ في مجلد (بدون طابعة)", "directory")
+        self.print_sink_combo.addItem("منفذ الطابعة (مثل /dev/usb/lp0)", "device")
+        self.print_sink_combo.addItem("طابعة شبكة (IP:9100)", "network")
+        self.print_sink_combo.setFixedHeight(40)
+        index = self.print_sink_combo.findData(self.main_window.settings.get('print_sink', 'printer'))
+        if index >= 0: self.print_sink_combo.setCurrentIndex(index)
+        self.print_sink_combo.currentIndexChanged.connect(self.update_print_sink_setting)
+
+        print_target_layout = QHBoxLayout()
+        self.print_dir_btn = QPushButton(" اختر المجلد")
+        self.print_dir_btn.setIcon(qta.icon("fa5s.folder-open", color="#062C21"))
+        self.print_dir_btn.setObjectName("actionButton")
+        self.print_dir_btn.setFixedSize(140, 35)
+        self.print_dir_btn.clicked.connect(self.select_print_dir)
+        self.print_target_input = QLineEdit()
+        self.print_target_input.editingFinished.connect(self.save_print_target)
+        print_target_layout.addWidget(self.print_dir_btn)
+        print_target_layout.addWidget(self.print_target_input)
+        self.show_print_target()
+
         print_layout.addWidget(print_header)
         print_layout.addWidget(self.auto_print_chk)
+        print_layout.addWidget(self.escpos_chk)
+        print_layout.addWidget(self.print_sink_combo)
+        print_layout.addLayout(print_target_layout)
         self.add_widget(print_group)
         
         # 4. Backup & Maintenance
@@ -115,6 +149,29 @@ class SettingsPage(BasePage):
         self.backup_btn.setFixedHeight(50)
         self.backup_btn.clicked.connect(self.main_window.create_manual_backup)
         bl.addWidget(self.backup_btn)
+        self.restore_btn = QPushButton(" استعادة نسخة احتياطية")
+        self.restore_btn.setIcon(qta.icon("fa5s.undo", color="#062C21"))
+        self.restore_btn.setObjectName("inventoryButton")
+        self.restore_btn.setFixedHeight(50)
+        self.restore_btn.clicked.connect(self.main_window.restore_backup)
+        bl.addWidget(self.restore_btn)
+
+        # Continuous copy of every change to a second drive
+        self.replica_btn = QPushButton(" مجلد النسخ المتزامن")
+        self.replica_btn.setIcon(qta.icon("fa5s.hdd", color="#062C21"))
+        self.replica_btn.setObjectName("actionButton")
+        self.replica_btn.setFixedHeight(40)
+        self.replica_btn.clicked.connect(self.select_replica_dir)
+        self.replica_lbl = QLabel(self.main_window.settings.get('replica_dir') or "غير مفعّل")
+        self.replica_lbl.setObjectName("subtitleLabel")
+        self.restore_time_btn = QPushButton(" استعادة إلى وقت محدد")
+        self.restore_time_btn.setIcon(qta.icon("fa5s.history", color="#062C21"))
+        self.restore_time_btn.setObjectName("inventoryButton")
+        self.restore_time_btn.setFixedHeight(40)
+        self.restore_time_btn.clicked.connect(self.main_window.restore_to_time)
+        bl.addWidget(self.replica_btn)
+        bl.addWidget(self.replica_lbl)
+        bl.addWidget(self.restore_time_btn)
         
         # Update
         update_group = QFrame()
@@ -153,5 +210,48 @@ class SettingsPage(BasePage):
         self.main_window.settings['auto_print'] = checked
         self.main_window.db.save_settings(self.main_window.settings)
 
+    def update_receipt_format_setting(self, checked):
+        self.main_window.settings['receipt_format'] = "escpos" if checked else "pdf"
+        self.main_window.db.save_settings(self.main_window.settings)
+
+    def show_print_target(self):
+        sink = self.print_sink_combo.currentData()
+        key = PRINT_TARGET_KEYS.get(sink)
+        self.print_dir_btn.setVisible(sink == "directory")
+        self.print_target_input.setVisible(key is not None)
+        self.print_target_input.setReadOnly(sink == "directory")
+        self.print_target_input.setPlaceholderText("192.168.1.50:9100" if sink == "network" else "/dev/usb/lp0")
+        self.print_target_input.setText(self.main_window.settings.get(key, "printed" if sink == "directory" else "") if key else "")
+
+    def update_print_sink_setting(self, index):
+        self.main_window.settings['print_sink'] = self.print_sink_combo.itemData(index)
+        self.main_window.db.save_settings(self.main_window.settings)
+        self.show_print_target()
+        self.main_window.update_print_sink()
+
+    def save_print_target(self):
+        key = PRINT_TARGET_KEYS.get(self.print_sink_combo.currentData())
+        if key and key != "print_dir":
+            self.main_window.settings[key] = self.print_target_input.text().strip()
+            self.main_window.db.save_settings(self.main_window.settings)
+            self.main_window.update_print_sink()
+
+    def select_print_dir(self):
+        dirname = QFileDialog.getExistingDirectory(self, "اختر مجلد الفواتير")
+        if dirname:
+            self.main_window.settings['print_dir'] = dirname
+            self.print_target_input.setText(dirname)
+            self.main_window.db.save_settings(self.main_window.settings)
+            self.main_window.update_print_sink()
+
+    def select_replica_dir(self):
+        dirname = QFileDialog.getExistingDirectory(self, "اختر مجلد النسخ المتزامن (قرص آخر أو ذاكرة USB)")
+        if dirname:
+            self.main_window.settings['replica_dir'] = dirname
+            self.replica_lbl.setText(dirname)
+            self.main_window.db.save_settings(self.main_window.settings)
+            self.main_window.start_replication()
+            self.main_window.update_replica_status()
+
     def refresh(self):
         pass
@@ -2,6 +2,7 @@ from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTa
 from PySide6.QtCore import Qt
 from ui.base_page import BasePage
 from components.style_engine import Colors
+from event_bus import USER_CHANGED
 
 class UserPermissionsPage(BasePage):
     def __init__(self, main_window):
@@ -9,6 +10,7 @@ class UserPermissionsPage(BasePage):
         subtitle = "إدارة صلاحيات الوصول وحسابات الموظفين"
         super().__init__(main_window, title, subtitle)
         self.setup_ui()
+        self.watch(USER_CHANGED)
 
     def setup_ui(self):
         main_h_layout = QHBoxLayout()